@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'apps.games.apps.GamesConfig',
 ]
@@ -50,8 +51,14 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.games.middleware.QueryProfilingMiddleware',
 ]
 
+# Query profiling (see apps.games.middleware.QueryProfilingMiddleware)
+QUERY_PROFILING = config('QUERY_PROFILING', default=False, cast=bool)
+QUERY_PROFILING_HEADER = 'X-Profile-Queries'
+QUERY_PROFILING_THRESHOLD = config('QUERY_PROFILING_THRESHOLD', default=20, cast=int)
+
 ROOT_URLCONF = 'Diffly.urls'
 
 TEMPLATES = [
@@ -65,6 +72,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'apps.games.context_processors.catalog',
             ],
         },
     },
@@ -73,6 +81,9 @@ TEMPLATES = [
 WSGI_APPLICATION = 'Diffly.wsgi.application'
 ASGI_APPLICATION = 'Diffly.asgi.application'
 
+# Serve the pages with the async views of apps.games.async_views, for ASGI deployments (uvicorn)
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -87,6 +98,38 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Page data and rendered fragments live in the per-process LRU 'default' cache and are keyed on the catalog
+# version (see apps.games.cache). The version itself is kept in the file based 'catalog' cache so a finished
+# scrape invalidates every web worker at once.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'diffly',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=5000, cast=int),
+        },
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CATALOG_CACHE_DIR', default=str(BASE_DIR / '.cache' / 'catalog')),
+        'TIMEOUT': None,
+    },
+}
+
+# Seconds shared caches may keep JSON API responses
+API_CACHE_MAX_AGE = config('API_CACHE_MAX_AGE', default=300, cast=int)
+
+# Currency the prices of all regions are converted to for comparison, with the ExchangeRate table
+PRICE_COMPARISON_CURRENCY = config('PRICE_COMPARISON_CURRENCY', default='USD')
+
+# Region code the savings of the price comparison are measured against
+HOME_REGION = config('HOME_REGION', default='US')
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -132,6 +175,30 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'query_profile': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': config('QUERY_PROFILING_LOG', default=str(BASE_DIR / 'query_profile.log')),
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'diffly.queries': {
+            'handlers': ['query_profile'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
     SESSION_COOKIE_SECURE = True
@@ -1,8 +1,17 @@
 from django.contrib import admin
+from django.db import transaction
 
-from .models import Platform, Region, Price, GameImage, Game
+from .cache import bump_catalog_version
+from .catalog import refresh_catalog
+from .models import (
+    ExchangeRate, Platform, Region, Price, PriceHistory, GameImage, Game, NotificationOutbox, PriceDropEvent, Watchlist,
+)
 
 
+def rates_changed():
+    Game.refresh_normalized_prices()
+    transaction.on_commit(bump_catalog_version)
+
 class PriceInline(admin.TabularInline):
     model = Price
     extra = 0
@@ -11,11 +20,74 @@ class GameImageInline(admin.TabularInline):
     model = GameImage
     extra = 0
 
+class PriceHistoryAdmin(admin.ModelAdmin):
+    list_display = ('game', 'region', 'base_price', 'current_price', 'observed_at')
+    list_filter = ('region',)
+    list_select_related = ('game', 'region')
+    raw_id_fields = ('game',)
+
+class PriceDropEventAdmin(admin.ModelAdmin):
+    list_display = ('game', 'region', 'previous_price', 'current_price', 'detected_at', 'matched_at')
+    list_filter = ('region',)
+    list_select_related = ('game', 'region')
+    raw_id_fields = ('game',)
+
+class WatchlistAdmin(admin.ModelAdmin):
+    list_display = ('user', 'game', 'region', 'threshold', 'created_at')
+    list_select_related = ('user', 'game', 'region')
+    raw_id_fields = ('user', 'game')
+
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('user', 'event', 'created_at', 'sent_at')
+    list_select_related = ('user', 'event__game', 'event__region')
+    raw_id_fields = ('user', 'watch', 'event')
+
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ('currency_code', 'date', 'rate', 'updated_at')
+    list_filter = ('currency_code',)
+
+    # Reprice the games for the cheapest price ordering, as load_exchange_rates does
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        rates_changed()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        rates_changed()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        rates_changed()
+
 class GameAdmin(admin.ModelAdmin):
     inlines = [PriceInline, GameImageInline]
     list_filter = ('title',)
     search_fields = ('title', 'product_id')
+    # Derived from the prices and images
+    readonly_fields = ('primary_image_url', 'max_discount_percentage', 'is_on_sale_anywhere', 'min_normalized_price')
+
+    # The home page lists are materialized, recompute them with the edited game and its prices. Prices
+    # deleted in the inline send no Price.save(), so the deal columns are recomputed here, and the card
+    # image from the edited images.
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        Game.refresh_deals([form.instance.pk])
+        Game.refresh_primary_images([form.instance.pk])
+        refresh_catalog()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        refresh_catalog()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        refresh_catalog()
 
 admin.site.register(Game, GameAdmin)
 admin.site.register(Platform)
 admin.site.register(Region)
+admin.site.register(PriceHistory, PriceHistoryAdmin)
+admin.site.register(ExchangeRate, ExchangeRateAdmin)
+admin.site.register(PriceDropEvent, PriceDropEventAdmin)
+admin.site.register(Watchlist, WatchlistAdmin)
+admin.site.register(NotificationOutbox, NotificationOutboxAdmin)
@@ -0,0 +1,48 @@
+"""
+Price drop alerts. The scraper pipeline records a PriceDropEvent for every price it lowers. At the end of
+the crawl, match_price_drops() matches the new events against the Watchlist entries and queues a
+NotificationOutbox row for every entry whose threshold an event crossed, for a sender to deliver.
+
+Matching runs from the events: each event finds its entries with a range scan of the (game, region,
+threshold) index, so the cost follows the number of events and matches, whatever the number of watchers.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.games.models import NotificationOutbox, PriceDropEvent
+
+MATCH_BATCH_SIZE = 1000
+
+
+def crossed_thresholds(event_ids):
+    """``(event, watch, user)`` of the watch entries whose threshold the events crossed: the previous price
+    was above it and the new price is at or below it, so a price lingering under a threshold is only
+    notified once."""
+    return PriceDropEvent.objects.filter(
+        pk__in=event_ids,
+        game__watchers__region=F('region'),
+        game__watchers__threshold__gte=F('current_price'),
+        game__watchers__threshold__lt=F('previous_price'),
+    ).values_list('pk', 'game__watchers', 'game__watchers__user')
+
+
+def match_price_drops(batch_size=MATCH_BATCH_SIZE):
+    """Queue the notifications of the events not matched yet, a batch of events per transaction. Returns
+    the number of notifications queued."""
+    queued = 0
+    while True:
+        with transaction.atomic():
+            event_ids = list(
+                PriceDropEvent.objects.filter(matched_at=None).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not event_ids:
+                return queued
+            notifications = [
+                NotificationOutbox(user_id=user_id, watch_id=watch_id, event_id=event_id)
+                for event_id, watch_id, user_id in crossed_thresholds(event_ids)
+            ]
+            # Ignoring conflicts keeps a rerun over the same events from queuing duplicates
+            NotificationOutbox.objects.bulk_create(notifications, ignore_conflicts=True)
+            PriceDropEvent.objects.filter(pk__in=event_ids).update(matched_at=timezone.now())
+        queued += len(notifications)
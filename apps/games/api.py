@@ -0,0 +1,166 @@
+"""
+Read-only JSON API over the same querysets as the HTML views.
+
+Lists are paginated with cursors (see apps.games.pagination), responses carry strong ETags derived from the
+catalog version for lists and from ``Game.updated_at`` and ``Price.last_updated`` for a game, so a matching
+``If-None-Match`` gets a 304 before anything is serialized, and ``Cache-Control`` lets a reverse proxy cache
+them.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.db import connections
+from django.db.models import Count, Max
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
+
+from apps.games.cache import catalog_version
+from apps.games.filters import filter_games
+from apps.games.models import Game, Price
+from apps.games.pagination import KeysetPaginator, order_by_keys
+from apps.games.search import search_games, search_sort_keys
+from apps.games.views import list_sort_keys
+
+GAME_FIELDS = [
+    'id',
+    'product_id',
+    'title',
+    'release_date',
+    'developer_name',
+    'publisher_name',
+    'primary_image_url',
+    'max_discount_percentage',
+    'is_on_sale_anywhere',
+]
+
+DEFAULT_LIMIT = 30
+MAX_LIMIT = 100
+
+public_cache = cache_control(public=True, max_age=settings.API_CACHE_MAX_AGE)
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params={'separators': (',', ':')})
+
+
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def catalog_etag(request, *args, **kwargs):
+    """ETag of list and search responses: the request and the catalog version, which every crawl, rates load
+    and single write starts anew. Computed without a query, whatever the size of the catalog."""
+    return make_etag(request.get_full_path(), catalog_version())
+
+
+def game_etag(request, pk, *args, **kwargs):
+    """ETag of a game's responses: the request and the latest change to the game or its prices."""
+    state = Game.objects.filter(pk=pk).annotate(
+        prices_updated=Max('prices__last_updated'), prices_count=Count('prices'),
+    ).values_list('updated_at', 'prices_updated', 'prices_count').first()
+    if state is None:
+        return None
+    return make_etag(request.get_full_path(), *state)
+
+
+def page_of_games(request, queryset, keys):
+    """Serialize a cursor page of ``queryset``, which must be ordered by ``keys``."""
+    try:
+        limit = min(int(request.GET.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        return json_response({'error': f'limit must be an integer between 1 and {MAX_LIMIT}'}, status=400)
+
+    sort_fields = [key.field for key in keys if key.field not in GAME_FIELDS]
+    paginator = KeysetPaginator(queryset.values(*GAME_FIELDS, *sort_fields), keys, limit)
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidPage as e:
+        return json_response({'error': str(e)}, status=400)
+
+    results = []
+    for row in page.object_list:
+        for field in sort_fields:
+            del row[field]
+        results.append(row)
+
+    next_url = None
+    if page.has_next():
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        next_url = f'{request.path}?{params.urlencode()}'
+
+    return json_response({'count': paginator.count, 'next': next_url, 'results': results})
+
+
+def serialize_price(price):
+    return {
+        'region': price.region.code,
+        'currency': price.region.currency_code,
+        'base_price': price.base_price,
+        'current_price': price.current_price,
+        'discount_percentage': price.discount_percentage,
+        'is_on_sale': price.is_on_sale,
+        'last_updated': price.last_updated,
+    }
+
+
+@require_GET
+@public_cache
+@condition(etag_func=catalog_etag)
+def game_list(request):
+    """Games with the filters and orderings of the HTML list: ``discounted``, ``release_year`` and
+    ``ordering``."""
+    keys = list_sort_keys(request.GET)
+    queryset = order_by_keys(filter_games(Game.objects.listed(), request.GET), keys)
+    return page_of_games(request, queryset, keys)
+
+
+@require_GET
+@public_cache
+@condition(etag_func=catalog_etag)
+def game_search(request):
+    """Games matching the ``q`` parameter, best match first."""
+    query = request.GET.get('q')
+    if not query:
+        return json_response({'count': 0, 'next': None, 'results': []})
+    queryset = search_games(Game.objects.listed(), query)
+    return page_of_games(request, queryset, search_sort_keys(query, connections[queryset.db].vendor))
+
+
+@require_GET
+@public_cache
+@condition(etag_func=game_etag)
+def game_detail(request, pk):
+    """A game with its description, images and prices in every region."""
+    game = get_object_or_404(Game.objects.listed().prefetch_related('images').with_prices(), pk=pk)
+
+    data = {field: getattr(game, field) for field in GAME_FIELDS}
+    data['description'] = game.description
+    data['short_description'] = game.short_description
+    data['images'] = [
+        {'type': image.image_type, 'url': image.url, 'width': image.width, 'height': image.height}
+        for image in game.images.all()
+    ]
+    data['prices'] = [serialize_price(price) for price in game.prices.all()]
+    return json_response(data)
+
+
+@require_GET
+@public_cache
+@condition(etag_func=game_etag)
+def game_prices(request, pk):
+    """Prices of a game by region, optionally limited to the comma separated region codes in ``region``."""
+    prices = Price.objects.filter(game_id=pk).select_related('region').order_by('region__code', 'pk')
+    regions = request.GET.get('region')
+    if regions:
+        prices = prices.filter(region__code__in=[code.strip().upper() for code in regions.split(',')])
+
+    prices = list(prices)
+    if not prices and not Game.objects.filter(pk=pk).exists():
+        raise Http404('No game matches the given query.')
+    return json_response({'game': pk, 'prices': [serialize_price(price) for price in prices]})
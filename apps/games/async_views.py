@@ -0,0 +1,92 @@
+"""
+Async versions of the page views, routed instead of apps.games.views when ``ASYNC_VIEWS`` is on, for
+serving with an ASGI server such as uvicorn.
+
+Queries run through the async ORM and templates are rendered by the ASGI handler in a worker thread. The
+views reuse the querysets, orderings and templates of their sync versions, so both return the same pages.
+
+Independent queries are awaited together with asyncio.gather(). The async ORM runs them with the thread
+sensitive sync_to_async(), so on Django 5.2 they take turns on the request's database connection, but the
+event loop stays free for other requests while they run.
+"""
+from django.core.paginator import InvalidPage
+from django.http import Http404
+from django.template.response import TemplateResponse
+
+from apps.games import views
+from apps.games.cache import aget_or_set
+from apps.games.catalog import ahome_context
+from apps.games.models import Game
+from apps.games.pagination import KeysetPaginator, acached_count
+from apps.games.pricing import acompare_prices
+
+
+async def index(request):
+    return TemplateResponse(request, 'games/index.html', await aget_or_set('home', ahome_context))
+
+
+async def as_list(queryset):
+    """Evaluate ``queryset`` with the async ORM."""
+    return [row async for row in queryset]
+
+
+class AsyncPaginationMixin:
+    """
+    Paginate a ListView with the async ORM: the cached count and the page rows are fetched in
+    apaginate_queryset() before the sync get_context_data() builds the context around them.
+    """
+    count = None
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        self.paginated = await self.apaginate_queryset(self.object_list, self.get_paginate_by(self.object_list))
+        return self.render_to_response(self.get_context_data())
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        paginator = super().get_paginator(queryset, per_page, **kwargs)
+        # Paginator.count is a cached property, setting it saves the sync COUNT query
+        paginator.count = self.count
+        return paginator
+
+    async def apaginate_queryset(self, queryset, page_size):
+        self.count = await acached_count(queryset)
+        paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+        page.object_list = await as_list(page.object_list)
+        return paginator, page, page.object_list, is_paginated
+
+    def paginate_queryset(self, queryset, page_size):
+        return self.paginated
+
+
+class GameListView(AsyncPaginationMixin, views.GameListView):
+    async def get(self, request, *args, **kwargs):
+        return self.canonical_redirect(request) or await super().get(request, *args, **kwargs)
+
+    async def apaginate_queryset(self, queryset, page_size):
+        if not self.keyset_requested():
+            return await super().apaginate_queryset(queryset, page_size)
+
+        paginator = KeysetPaginator(queryset, self.sort_keys, page_size)
+        paginator.count = await acached_count(queryset)
+        try:
+            page = await paginator.apage(self.request.GET.get('cursor'))
+        except InvalidPage as e:
+            raise Http404(str(e))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
+class GameDetailView(views.GameDetailView):
+    async def get(self, request, *args, **kwargs):
+        try:
+            self.object = await self.get_queryset().aget(pk=self.kwargs[self.pk_url_kwarg])
+        except Game.DoesNotExist:
+            raise Http404('No game found matching the query')
+        self.comparison = await acompare_prices(self.object)
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+    def get_comparison(self):
+        return self.comparison
+
+
+class SearchView(AsyncPaginationMixin, views.SearchView):
+    pass
@@ -0,0 +1,41 @@
+import time
+
+from django.core.cache import cache, caches
+
+CATALOG_VERSION_KEY = 'catalog_version'
+
+
+def catalog_version():
+    """Version of the scraped catalog, changed every time a scrape finishes."""
+    return caches['catalog'].get(CATALOG_VERSION_KEY, 0)
+
+
+async def acatalog_version():
+    return await caches['catalog'].aget(CATALOG_VERSION_KEY, 0)
+
+
+def bump_catalog_version():
+    """Start a new catalog version. Entries cached for older versions are never read again and get
+    evicted from the LRU cache, so nothing has to be deleted."""
+    version = time.time_ns()
+    caches['catalog'].set(CATALOG_VERSION_KEY, version, timeout=None)
+    return version
+
+
+def get_or_set(key, default, version=None):
+    """Return the value cached under ``key`` for the current catalog version, calling ``default`` to
+    compute and store it on a miss."""
+    if version is None:
+        version = catalog_version()
+    return cache.get_or_set(key, default, timeout=None, version=version)
+
+
+async def aget_or_set(key, default, version=None):
+    """Async version of get_or_set(), ``default`` is a coroutine function."""
+    if version is None:
+        version = await acatalog_version()
+    value = await cache.aget(key, version=version)
+    if value is None:
+        value = await default()
+        await cache.aset(key, value, timeout=None, version=version)
+    return value
@@ -0,0 +1,104 @@
+"""
+Home page data materialized at the end of every crawl: the catalog totals in the CatalogStats row and the
+latest releases and biggest discounts in FeaturedGame rows. The home page reads them back with two indexed
+queries instead of counting three tables and sorting games and their prices.
+"""
+import asyncio
+
+from django.db import transaction
+from django.db.models import Func, Subquery
+from django.utils import timezone
+
+from apps.games.models import CatalogStats, FeaturedGame, Game, Platform, Region
+
+FEATURED_SIZE = 4
+
+STATS_PK = 1
+
+
+def count_of(queryset):
+    """Scalar subquery counting the rows of ``queryset``, to compute several counts in one statement."""
+    # A plain COUNT function rather than Count(), which would group the rows by primary key
+    return Subquery(queryset.order_by().annotate(count=Func('pk', function='COUNT')).values('count'))
+
+
+def latest_releases():
+    return Game.objects.listed().exclude(
+        release_date__exact=None
+    ).filter(
+        release_date__lte=timezone.now()
+    ).order_by('-release_date')[:FEATURED_SIZE]
+
+
+def discounted_games():
+    return Game.objects.listed().filter(
+        is_on_sale_anywhere=True
+    ).with_prices(
+        is_on_sale=True
+    ).order_by('-max_discount_percentage', 'id')[:FEATURED_SIZE]
+
+
+def featured(section, position, game, price=None):
+    row = FeaturedGame(
+        section=section,
+        position=position,
+        game=game,
+        title=game.title,
+        summary=game.short_description or game.description,
+        primary_image_url=game.primary_image_url,
+        release_date=game.release_date,
+    )
+    if price is not None:
+        row.currency_symbol = price.region.currency_symbol
+        row.base_price = price.base_price
+        row.current_price = price.current_price
+        row.discount_percentage = price.discount_percentage
+    return row
+
+
+def refresh_catalog():
+    """Recompute the catalog totals and the home page lists."""
+    rows = [
+        featured(FeaturedGame.LATEST, position, game)
+        for position, game in enumerate(latest_releases())
+    ]
+    for position, game in enumerate(discounted_games()):
+        # Prices are ordered biggest discount first
+        prices = list(game.prices.all())
+        rows.append(featured(FeaturedGame.DISCOUNTED, position, game, prices[0] if prices else None))
+
+    with transaction.atomic():
+        CatalogStats.objects.get_or_create(pk=STATS_PK)
+        CatalogStats.objects.filter(pk=STATS_PK).update(
+            total_games=count_of(Game.objects.listed()),
+            total_regions=count_of(Region.objects.all()),
+            total_platforms=count_of(Platform.objects.all()),
+            refreshed_at=timezone.now(),
+        )
+        FeaturedGame.objects.all().delete()
+        FeaturedGame.objects.bulk_create(rows)
+
+
+def context(stats, rows):
+    stats = stats or CatalogStats()
+    return {
+        'latest_releases': [row for row in rows if row.section == FeaturedGame.LATEST],
+        'discounted_games': [row for row in rows if row.section == FeaturedGame.DISCOUNTED],
+        'total_games': stats.total_games,
+        'total_regions': stats.total_regions,
+        'total_platforms': stats.total_platforms,
+    }
+
+
+def home_context():
+    """Context of the home page, read from the tables maintained by refresh_catalog()."""
+    return context(CatalogStats.objects.filter(pk=STATS_PK).first(), list(FeaturedGame.objects.all()))
+
+
+async def ahome_context():
+    """Async version of home_context(), running both reads concurrently."""
+    async def rows():
+        return [row async for row in FeaturedGame.objects.all()]
+
+    stats, rows = await asyncio.gather(CatalogStats.objects.filter(pk=STATS_PK).afirst(), rows())
+    return context(stats, rows)
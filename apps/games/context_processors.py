@@ -0,0 +1,6 @@
+from apps.games.cache import catalog_version
+
+
+def catalog(request):
+    """Expose the catalog version to templates, used as part of the ``{% cache %}`` fragment keys."""
+    return {'catalog_version': catalog_version()}
@@ -0,0 +1,154 @@
+"""
+Filters of the game list, one per query parameter, applied by filter_games().
+
+Every filter compares a plain indexed column with a constant or a range, never a function of the column, so
+the predicate can be answered from an index. ``index`` names that index, and the tests check that the query
+plan of each filter uses it. Invalid values are ignored, as an empty parameter is.
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Q
+
+from apps.games.models import Price
+
+
+def parse_bool(value):
+    if value not in ('true', 'false'):
+        raise ValueError(value)
+    return value == 'true'
+
+
+def parse_year(value):
+    year = int(value)
+    if not 1 <= year < 9999:
+        raise ValueError(value)
+    return year
+
+
+def parse_decimal(value):
+    number = Decimal(value)
+    if not number.is_finite():
+        raise ValueError(value)
+    return number
+
+
+class Filter(ABC):
+    """Base of the filters, which define ``params``, the query parameters they read with the first one
+    enabling the filter, and ``index``, the index serving their predicate."""
+
+    def parse(self, value):
+        return value
+
+    @abstractmethod
+    def predicate(self, value, params):
+        """Q of the games matching the parsed ``value`` of the first parameter, and the other ``params``."""
+
+    def apply(self, queryset, params):
+        value = params.get(self.params[0])
+        if not value:
+            return queryset
+        try:
+            return queryset.filter(self.predicate(self.parse(value), params))
+        except (ValueError, ArithmeticError):
+            return queryset
+
+
+@dataclass(frozen=True)
+class ValueFilter(Filter):
+    """``lookup`` against the parsed value of ``param``, e.g. ``max_discount_percentage__gte``."""
+    param: str
+    lookup: str
+    index: str
+    parser: object = str
+
+    @property
+    def params(self):
+        return (self.param,)
+
+    def parse(self, value):
+        return self.parser(value)
+
+    def predicate(self, value, params):
+        return Q(**{self.lookup: value})
+
+
+@dataclass(frozen=True)
+class BooleanFilter(Filter):
+    """``field`` equal to the ``true`` or ``false`` of ``param``."""
+    param: str
+    field: str
+    index: str
+
+    @property
+    def params(self):
+        return (self.param,)
+
+    def parse(self, value):
+        return parse_bool(value)
+
+    def predicate(self, value, params):
+        # An explicit comparison: Django writes field=True as the bare column, which SQLite cannot search an
+        # index for
+        return Q(**{f'{self.field}__in': [value]})
+
+
+@dataclass(frozen=True)
+class YearFilter(Filter):
+    """Dates within a calendar year, as a range on the column rather than EXTRACT(YEAR FROM column)."""
+    param: str
+    field: str
+    index: str
+
+    @property
+    def params(self):
+        return (self.param,)
+
+    def parse(self, value):
+        return parse_year(value)
+
+    def predicate(self, year, params):
+        return Q(**{f'{self.field}__gte': date(year, 1, 1), f'{self.field}__lt': date(year + 1, 1, 1)})
+
+
+class RegionPriceFilter(Filter):
+    """Games with a price in the ``region`` (code), optionally between ``min_price`` and ``max_price`` in the
+    region's currency. The matching prices are searched as a range of the region's prices, then joined to
+    the games by primary key. An invalid bound is ignored on its own, keeping the region."""
+    params = ('region', 'min_price', 'max_price')
+    index = 'games_price_region_price_idx'
+    bounds = {'min_price': 'current_price__gte', 'max_price': 'current_price__lte'}
+
+    def predicate(self, region, params):
+        prices = Price.objects.filter(region__code=region)
+        for param, lookup in self.bounds.items():
+            if not params.get(param):
+                continue
+            try:
+                prices = prices.filter(**{lookup: parse_decimal(params[param])})
+            except (ValueError, ArithmeticError):
+                pass
+        return Q(pk__in=prices.values('game'))
+
+
+FILTERS = [
+    BooleanFilter('discounted', 'is_on_sale_anywhere', 'games_game_on_sale_idx'),
+    ValueFilter('min_discount', 'max_discount_percentage__gte', 'games_game_discount_idx', parse_decimal),
+    YearFilter('release_year', 'release_date', 'games_game_release_idx'),
+    ValueFilter('released_after', 'release_date__gte', 'games_game_release_idx', date.fromisoformat),
+    ValueFilter('released_before', 'release_date__lte', 'games_game_release_idx', date.fromisoformat),
+    RegionPriceFilter(),
+    ValueFilter('publisher', 'publisher_name', 'games_game_publisher_idx'),
+    ValueFilter('developer', 'developer_name', 'games_game_developer_idx'),
+]
+
+FILTER_PARAMS = [param for game_filter in FILTERS for param in game_filter.params]
+
+
+def filter_games(queryset, params):
+    """Apply the list filters in the query ``params`` to a games queryset."""
+    for game_filter in FILTERS:
+        queryset = game_filter.apply(queryset, params)
+    return queryset
@@ -0,0 +1,183 @@
+import json
+import re
+
+from django.apps import apps
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+
+from apps.games.alerts import crossed_thresholds
+from apps.games.catalog import STATS_PK, discounted_games, latest_releases
+from apps.games.filters import filter_games
+from apps.games.models import CatalogStats, FeaturedGame, Game, GameImage, PriceDropEvent
+from apps.games.pagination import KeysetPaginator, encode_cursor, key_value, order_by_keys
+from apps.games.pricing import comparison_queryset, with_cheapest_region
+from apps.games.search import search_games
+from apps.games.views import ORDERINGS
+
+PAGE_SIZE = 30
+
+# Tables small enough for a sequential scan to be the right plan
+SMALL_TABLES = ['games_catalogstats', 'games_exchangerate', 'games_featuredgame', 'games_platform', 'games_region', 'games_store']
+
+# Indexes created by migrations outside of Meta.indexes, PostgreSQL only
+RAW_INDEXES = {
+    'games_game': ['games_game_title_trgm', 'games_game_title_upper_trgm', 'games_game_release_desc_idx'],
+}
+
+SQLITE_STEP = re.compile(r'^(?P<op>SCAN|SEARCH) (?P<table>\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX (?P<index>\w+))?')
+
+
+def list_queryset(**params):
+    """Games of GameListView for the query ``params``, ordered."""
+    queryset = filter_games(Game.objects.listed(), params)
+    return order_by_keys(queryset, ORDERINGS[params.get('ordering', '-release_date')])
+
+
+def prices_of(games, **filters):
+    """The prices prefetch that with_prices() runs for ``games``."""
+    prefetch = Game.objects.with_prices(**filters)._prefetch_related_lookups[0]
+    return prefetch.queryset.filter(game__in=games)
+
+
+def view_querysets(query):
+    """``(name, queryset)`` of the queries run by the pages, with the parameters of typical requests."""
+    querysets = []
+    for ordering, keys in ORDERINGS.items():
+        queryset = list_queryset(ordering=ordering)
+        querysets.append((f'list ordering={ordering}', queryset[:PAGE_SIZE]))
+        # The next cursor page, seeking past the first page
+        first_page = list(queryset[:PAGE_SIZE])
+        if first_page:
+            cursor = encode_cursor([key_value(first_page[-1], key.field) for key in keys])
+            paginator = KeysetPaginator(queryset, keys, PAGE_SIZE)
+            querysets.append((f'list ordering={ordering} cursor', paginator.page_queryset(cursor)))
+
+    querysets += [
+        ('list discounted=true', list_queryset(discounted='true')[:PAGE_SIZE]),
+        ('list release_year', list_queryset(release_year='2020')[:PAGE_SIZE]),
+        ('list min_discount', list_queryset(min_discount='50')[:PAGE_SIZE]),
+        ('list region price', list_queryset(region='US', min_price='5', max_price='20')[:PAGE_SIZE]),
+        ('list publisher', list_queryset(publisher='Xbox Game Studios')[:PAGE_SIZE]),
+        ('list cheapest region', with_cheapest_region(list_queryset())[:PAGE_SIZE]),
+        ('search', search_games(Game.objects.listed(), query)[:PAGE_SIZE]),
+    ]
+
+    page = list(list_queryset().values_list('pk', flat=True)[:PAGE_SIZE])
+    querysets += [
+        ('list prices', prices_of(page)),
+        ('game detail', Game.objects.filter(pk=page[0] if page else 0)),
+        ('game detail images', GameImage.objects.filter(game__in=page[:1])),
+        ('game detail prices', comparison_queryset(page[0] if page else 0)),
+        ('home stats', CatalogStats.objects.filter(pk=STATS_PK)),
+        ('home featured', FeaturedGame.objects.all()),
+        ('refresh latest releases', latest_releases()),
+        ('refresh discounted games', discounted_games()),
+        ('refresh discounted prices', prices_of(page, is_on_sale=True)),
+    ]
+
+    pending = PriceDropEvent.objects.filter(matched_at=None).order_by('pk').values_list('pk', flat=True)
+    querysets += [
+        ('price drops pending', pending[:1000]),
+        ('price drops matching', crossed_thresholds(list(pending[:1000]))),
+    ]
+    return querysets
+
+
+def postgresql_plan(queryset):
+    """Steps of the executed plan: node type, table, index, rows and buffer counts."""
+    plan = json.loads(queryset.explain(format='json', analyze=True, buffers=True))[0]
+    steps = []
+    nodes = [plan['Plan']]
+    while nodes:
+        node = nodes.pop()
+        nodes.extend(node.get('Plans', []))
+        steps.append({
+            'node': node['Node Type'],
+            'table': node.get('Relation Name'),
+            'index': node.get('Index Name'),
+            'rows': node.get('Actual Rows'),
+            'buffers': node.get('Shared Hit Blocks', 0) + node.get('Shared Read Blocks', 0),
+        })
+    return steps, plan['Execution Time']
+
+
+def sqlite_plan(queryset):
+    """Steps of the query plan. SQLite only plans, so there are no rows, buffers or times."""
+    steps = []
+    for line in queryset.explain().splitlines():
+        # Each line is "<id> <parent> <unused> <detail>"
+        detail = line.split(' ', 3)[-1]
+        match = SQLITE_STEP.match(detail)
+        if match:
+            index = match['index'] or ('primary key' if 'PRIMARY KEY' in detail else None)
+            seq = match['op'] == 'SCAN' and index is None
+            steps.append({'node': 'Seq Scan' if seq else 'Index Scan', 'table': match['table'],
+                          'index': index, 'rows': None, 'buffers': None})
+        elif detail.startswith('USE TEMP B-TREE'):
+            steps.append({'node': 'Sort', 'table': None, 'index': None, 'rows': None, 'buffers': None})
+    return steps, None
+
+
+def missing_indexes():
+    """``(table, index)`` of the indexes declared by the models or migrations but absent from the database."""
+    missing = []
+    with connection.cursor() as cursor:
+        for model in apps.get_app_config('games').get_models():
+            table = model._meta.db_table
+            existing = connection.introspection.get_constraints(cursor, table)
+            expected = [index.name for index in model._meta.indexes]
+            if connection.vendor == 'postgresql':
+                expected += RAW_INDEXES.get(table, [])
+            missing += [(table, name) for name in expected if name not in existing]
+    return missing
+
+
+class Command(BaseCommand):
+    help = (
+        'Explain the queries of the pages with EXPLAIN (ANALYZE, BUFFERS) on PostgreSQL, or EXPLAIN QUERY PLAN '
+        'on SQLite, and report sequential scans, sorts and indexes missing from the database. Plans depend '
+        'on the data and the table statistics, so run it against a production sized database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', default='halo', help='Search term of the search queries (default: halo)')
+        parser.add_argument('--allow', nargs='*', default=SMALL_TABLES, metavar='TABLE',
+                            help='Tables where sequential scans are expected (default: the small tables)')
+        parser.add_argument('--fail', action='store_true',
+                            help='Exit with an error on sequential scans or missing indexes, for CI')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'postgresql':
+            explain, plan_options = postgresql_plan, {'analyze': True, 'buffers': True}
+        elif connection.vendor == 'sqlite':
+            explain, plan_options = sqlite_plan, {}
+        else:
+            raise CommandError(f'Unsupported database: {connection.vendor}')
+
+        problems = 0
+        for name, queryset in view_querysets(options['query']):
+            steps, duration = explain(queryset)
+            seq_scans = [step for step in steps if step['node'] == 'Seq Scan' and step['table'] not in options['allow']]
+            problems += len(seq_scans)
+
+            indexes = sorted({step['index'] for step in steps if step['index']})
+            line = f'{name}: ' + (', '.join(indexes) if indexes else 'no index')
+            if duration is not None:
+                line += f' ({duration:.2f} ms, {sum(step["buffers"] for step in steps)} buffers)'
+            if any(step['node'] == 'Sort' for step in steps):
+                line += ', sort'
+            self.stdout.write(line)
+            for step in seq_scans:
+                rows = f' ({step["rows"]} rows)' if step['rows'] is not None else ''
+                self.stdout.write(self.style.WARNING(f'  seq scan on {step["table"]}{rows}'))
+            if options['verbosity'] > 1:
+                self.stdout.write(queryset.explain(**plan_options))
+
+        for table, index in missing_indexes():
+            problems += 1
+            self.stdout.write(self.style.ERROR(f'missing index {index} on {table}'))
+
+        if problems and options['fail']:
+            raise CommandError(f'{problems} sequential scans or missing indexes')
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('No sequential scans on large tables'))
@@ -0,0 +1,258 @@
+import csv
+import gzip
+import json
+import math
+from pathlib import Path
+
+from django.core.management import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, make_aware
+
+from apps.games.models import Game, GameImage, Price, Region
+from apps.games.pricing import normalize_amounts, rates_on
+
+# Exported tables: model and the timestamp filtered by --since. Images have no timestamp of their own but
+# are rewritten together with their game, regions are small and always exported in full.
+TABLES = {
+    'game': (Game, 'updated_at'),
+    'price': (Price, 'last_updated'),
+    'region': (Region, None),
+    'image': (GameImage, 'game__updated_at'),
+}
+
+FORMATS = ['ndjson', 'csv', 'parquet']
+
+
+def columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+class PriceNormalizer:
+    """Appends ``normalized_current_price`` to price rows, the current price in the PRICE_COMPARISON_CURRENCY
+    at the latest exchange rates, converted a chunk at a time by normalize_amounts(). Needs numpy."""
+    column = 'normalized_current_price'
+
+    def __init__(self, fields):
+        self.region = fields.index('region_id')
+        self.price = fields.index('current_price')
+        self.currencies = dict(Region.objects.values_list('pk', 'currency_code'))
+        self.rates = rates_on()
+
+    def __call__(self, rows):
+        normalized = normalize_amounts(
+            [row[self.price] for row in rows], [self.currencies[row[self.region]] for row in rows], self.rates,
+        )
+        return [(*row, None if math.isnan(value) else value) for row, value in zip(rows, normalized.tolist())]
+
+
+class NDJSONWriter:
+    extension = 'ndjson'
+
+    def __init__(self, file, model, extra=()):
+        self.file = file
+        self.columns = columns(model) + list(extra)
+
+    def write(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(dict(zip(self.columns, row)), cls=DjangoJSONEncoder, separators=(',', ':')))
+            self.file.write('\n')
+
+    def close(self):
+        pass
+
+
+class CSVWriter:
+    extension = 'csv'
+
+    def __init__(self, file, model, extra=()):
+        self.writer = csv.writer(file)
+        self.writer.writerow(columns(model) + list(extra))
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        pass
+
+
+class ParquetWriter:
+    """Zstandard compressed Parquet, one row group per chunk. Needs the optional pyarrow package. The
+    ``extra`` columns are floats."""
+    extension = 'parquet'
+
+    def __init__(self, file, model, extra=()):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.columns = columns(model) + list(extra)
+        self.schema = pa.schema([
+            (field.attname, self.arrow_type(field)) for field in model._meta.concrete_fields
+        ] + [(column, pa.float64()) for column in extra])
+        self.writer = pq.ParquetWriter(file, self.schema, compression='zstd')
+
+    def arrow_type(self, field):
+        pa = self.pa
+        if isinstance(field, models.DecimalField):
+            return pa.decimal128(field.max_digits, field.decimal_places)
+        if isinstance(field, models.DateTimeField):
+            return pa.timestamp('us', tz='UTC')
+        if isinstance(field, models.DateField):
+            return pa.date32()
+        if isinstance(field, models.BooleanField):
+            return pa.bool_()
+        if isinstance(field, (models.IntegerField, models.AutoField, models.ForeignKey)):
+            return pa.int64()
+        return pa.string()
+
+    def write(self, rows):
+        data = {column: list(values) for column, values in zip(self.columns, zip(*rows))}
+        self.writer.write_table(self.pa.Table.from_pydict(data, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {
+    'ndjson': NDJSONWriter,
+    'csv': CSVWriter,
+    'parquet': ParquetWriter,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream tables to NDJSON, CSV or Parquet files in bounded memory. With --since only rows changed '
+        'after the watermark are exported, and the watermark for the next run is printed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'tables',
+            nargs='*',
+            help=f"Tables to export: {', '.join(TABLES)} (default: all)",
+        )
+        parser.add_argument(
+            '-f',
+            '--format',
+            choices=FORMATS,
+            default='ndjson',
+            help='Output format (default: ndjson)',
+        )
+        parser.add_argument(
+            '-o',
+            '--output',
+            default='.',
+            help='Directory the files are written to (default: current directory)',
+        )
+        parser.add_argument(
+            '--since',
+            help='Only export rows updated at or after this ISO 8601 datetime',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows fetched and written at a time (default: 2000)',
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Gzip NDJSON and CSV files. Parquet files are always compressed.',
+        )
+        parser.add_argument(
+            '--normalize',
+            action='store_true',
+            help='Add a normalized_current_price column to prices, in PRICE_COMPARISON_CURRENCY at the latest '
+                 'exchange rates. Needs the numpy package.',
+        )
+
+    def handle(self, *args, **options):
+        tables = options['tables'] or list(TABLES)
+        unknown = [table for table in tables if table not in TABLES]
+        if unknown:
+            raise CommandError(f"Unknown tables: {', '.join(unknown)}")
+
+        export_format = options['format']
+        chunk_size = options['chunk_size']
+        output = Path(options['output'])
+
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError(f"Invalid --since datetime: {options['since']}")
+            if is_naive(since):
+                since = make_aware(since)
+
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        if export_format == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise CommandError('Parquet export requires the pyarrow package')
+        if options['normalize']:
+            try:
+                import numpy  # noqa: F401
+            except ImportError:
+                raise CommandError('--normalize requires the numpy package')
+
+        output.mkdir(parents=True, exist_ok=True)
+
+        for table in tables:
+            model, timestamp = TABLES[table]
+            queryset = model.objects.order_by('pk')
+            if since and timestamp:
+                queryset = queryset.filter(**{f'{timestamp}__gte': since})
+
+            path, count, watermark = self.export(
+                queryset, model, timestamp, output / table, export_format, options['gzip'], chunk_size,
+                options['normalize'] and model is Price,
+            )
+            message = f'Exported {count} {table} rows to {path}'
+            if watermark:
+                message += f' (watermark: {watermark.isoformat()})'
+            self.stdout.write(self.style.SUCCESS(message))
+
+    def export(self, queryset, model, timestamp, stem, export_format, compress, chunk_size, normalize=False):
+        """Write ``queryset`` chunk by chunk, with the normalized prices of PriceNormalizer if ``normalize``.
+        Returns the file path, the row count and the latest timestamp exported, the --since value of the next
+        incremental export."""
+        writer_class = WRITERS[export_format]
+        path = stem.with_suffix(f'.{writer_class.extension}')
+        if compress and export_format != 'parquet':
+            path = path.with_name(path.name + '.gz')
+            file = gzip.open(path, 'wt', encoding='utf-8', newline='')
+        elif export_format == 'parquet':
+            file = open(path, 'wb')
+        else:
+            file = open(path, 'w', encoding='utf-8', newline='')
+
+        fields = columns(model)
+        normalizer = PriceNormalizer(fields) if normalize else None
+        watermark_index = fields.index(timestamp) if timestamp in fields else None
+        count = 0
+        watermark = None
+
+        with file:
+            writer = writer_class(file, model, [normalizer.column] if normalizer else [])
+            chunk = []
+            # iterator() streams rows with a server-side cursor on PostgreSQL
+            for row in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+                chunk.append(row)
+                if watermark_index is not None and (watermark is None or row[watermark_index] > watermark):
+                    watermark = row[watermark_index]
+                if len(chunk) >= chunk_size:
+                    writer.write(normalizer(chunk) if normalizer else chunk)
+                    count += len(chunk)
+                    chunk = []
+            if chunk:
+                writer.write(normalizer(chunk) if normalizer else chunk)
+                count += len(chunk)
+            writer.close()
+
+        return path, count, watermark
@@ -0,0 +1,81 @@
+import csv
+import json
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.games.cache import bump_catalog_version
+from apps.games.models import ExchangeRate, Game
+
+FIELDS = ['currency_code', 'date', 'rate']
+
+
+def read_rows(path):
+    """Rows of a CSV file with a header or of a JSON array of objects, both with the FIELDS."""
+    with open(path, encoding='utf-8', newline='') as file:
+        if path.suffix == '.json':
+            rows = json.load(file)
+            if not isinstance(rows, list):
+                raise CommandError(f'{path}: expected a JSON array of rates')
+            return rows
+        if path.suffix == '.csv':
+            return list(csv.DictReader(file))
+    raise CommandError(f'{path}: unsupported file type, use .csv or .json')
+
+
+def parse_rate(row, number):
+    """ExchangeRate of a row, ``number`` being its position for the error messages."""
+    if not isinstance(row, dict) or any(not row.get(field) for field in FIELDS):
+        raise CommandError(f"Rate {number}: {', '.join(FIELDS)} are required")
+    try:
+        rate = ExchangeRate(
+            currency_code=str(row['currency_code']).strip().upper(),
+            date=date.fromisoformat(str(row['date']).strip()),
+            rate=Decimal(str(row['rate']).strip()),
+        )
+    except (ValueError, InvalidOperation) as e:
+        raise CommandError(f'Rate {number}: {e}')
+    if len(rate.currency_code) != 3 or not rate.rate.is_finite() or rate.rate <= 0:
+        raise CommandError(f'Rate {number}: invalid currency code or rate')
+    return rate
+
+
+class Command(BaseCommand):
+    help = (
+        'Load dated exchange rates from local CSV or JSON files with currency_code, date and rate columns, the '
+        'rate being the units of the currency per unit of PRICE_COMPARISON_CURRENCY. Existing rates of the same '
+        'currency and date are replaced. The cheapest price of every game is then recomputed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', type=Path, help='CSV or JSON files of rates')
+
+    def handle(self, *args, **options):
+        rates = {}
+        for path in options['paths']:
+            if not path.is_file():
+                raise CommandError(f'{path}: no such file')
+            for number, row in enumerate(read_rows(path), 1):
+                rate = parse_rate(row, number)
+                # The last file wins for a currency and date
+                rates[rate.currency_code, rate.date] = rate
+
+        with transaction.atomic():
+            ExchangeRate.objects.bulk_create(
+                rates.values(),
+                update_conflicts=True,
+                unique_fields=['currency_code', 'date'],
+                update_fields=['rate', 'updated_at'],
+            )
+            games = Game.refresh_normalized_prices()
+        bump_catalog_version()
+
+        currencies = {currency for currency, _ in rates}
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {len(rates)} rates of {len(currencies)} currencies against '
+            f'{settings.PRICE_COMPARISON_CURRENCY}, repriced {games} games'
+        ))
@@ -1,5 +1,8 @@
+import os
+
 from django.core.management import BaseCommand, CommandError
 
+from apps.games.models import Region
 from scrapers.factory import ScraperFactory
 
 
@@ -15,17 +18,52 @@ class Command(BaseCommand):
             default=3,
             help='Number of pages to scrape (default: 3)',
         )
+        parser.add_argument(
+            '-r',
+            '--regions',
+            type=lambda value: [region.strip() for region in value.split(',') if region.strip()],
+            help='Comma-separated store locales to scrape, e.g. en-US,tr-TR (default: all regions in the database)',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Skip products whose metadata, images and price did not change since the last crawl',
+        )
+        archive = parser.add_mutually_exclusive_group()
+        archive.add_argument(
+            '--record',
+            metavar='ARCHIVE',
+            help='Record all responses to a zip archive',
+        )
+        archive.add_argument(
+            '--replay',
+            metavar='ARCHIVE',
+            help='Replay a recorded archive instead of downloading, with no network access and no delays',
+        )
 
     def handle(self, *args, **options):
         platform = options['platform']
         scrape_type = options['type']
         max_pages = options['pages']
+        incremental = options['incremental']
+        regions = options['regions']
+        record = options['record']
+        replay = options['replay']
+
+        if replay and not os.path.isfile(replay):
+            raise CommandError(f"Replay archive not found: {replay}")
+
+        if regions:
+            known = set(Region.objects.filter(locale__in=regions).values_list('locale', flat=True))
+            unknown = [region for region in regions if region not in known]
+            if unknown:
+                raise CommandError(f"Unknown regions: {', '.join(unknown)}")
 
         try:
             scraper = ScraperFactory.get(platform, scrape_type)
         except ValueError as e:
             raise CommandError(e)
 
-        scraper.run(max_pages=max_pages)
+        scraper.run(max_pages=max_pages, incremental=incremental, regions=regions, record=record, replay=replay)
 
         self.stdout.write(self.style.SUCCESS(f'Scraping {platform}/{scrape_type} for {max_pages} pages complete.'))
\ No newline at end of file
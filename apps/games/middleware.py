@@ -0,0 +1,149 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('diffly.queries')
+
+
+class QueryProfile:
+    """Database execute wrapper recording the queries of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            # The SQL still has its placeholders, so it fingerprints the query whatever the parameters
+            self.statements[sql] += 1
+
+    def duplicates(self):
+        """``(sql, count)`` of the statements executed more than once, most repeated first."""
+        return [(sql, count) for sql, count in self.statements.most_common() if count > 1]
+
+
+class QueryProfilingMiddleware:
+    """
+    Profile the database queries of a request: query count, database time, duplicated statements (the
+    N+1 signature) and template render time. Results are returned in a ``Server-Timing`` header and
+    logged to the ``diffly.queries`` logger, as a warning when the request runs more than
+    ``QUERY_PROFILING_THRESHOLD`` queries.
+
+    Enabled for every request by ``QUERY_PROFILING``, or per request with the ``QUERY_PROFILING_HEADER``
+    request header when ``DEBUG`` is on or the user is staff. Works with both sync and async views.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def requested(request):
+        header = settings.QUERY_PROFILING_HEADER
+        return bool(header and request.headers.get(header))
+
+    def enabled(self, request):
+        if settings.QUERY_PROFILING:
+            return True
+        if not self.requested(request):
+            return False
+        user = getattr(request, 'user', None)
+        return settings.DEBUG or bool(user and user.is_staff)
+
+    async def aenabled(self, request):
+        if settings.QUERY_PROFILING:
+            return True
+        if not self.requested(request):
+            return False
+        if settings.DEBUG:
+            return True
+        # The lazy request.user cannot be evaluated in async code, AuthenticationMiddleware adds auser()
+        auser = getattr(request, 'auser', None)
+        return bool(auser and (await auser()).is_staff)
+
+    @staticmethod
+    def install(stack, profile):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(profile))
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled(request):
+            return self.get_response(request)
+
+        profile = QueryProfile()
+        request._query_profile_template = 0.0
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            self.install(stack, profile)
+            response = self.get_response(request)
+        return self.report(request, response, profile, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not await self.aenabled(request):
+            return await self.get_response(request)
+
+        profile = QueryProfile()
+        request._query_profile_template = 0.0
+        start = time.perf_counter()
+        # Connections are thread local and async ORM calls run in the request's thread sensitive worker, so
+        # the wrappers are installed from that thread
+        with ExitStack() as stack:
+            await sync_to_async(self.install)(stack, profile)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        return self.report(request, response, profile, time.perf_counter() - start)
+
+    def report(self, request, response, profile, total):
+        template = request._query_profile_template
+        duplicates = profile.duplicates()
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={profile.duration * 1000:.2f};desc="{profile.count} queries"',
+            f'dup;desc="{sum(count - 1 for _, count in duplicates)} duplicated"',
+            f'tpl;dur={template * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+        flagged = profile.count > settings.QUERY_PROFILING_THRESHOLD
+        logger.log(logging.WARNING if flagged else logging.INFO, json.dumps({
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'queries': profile.count,
+            'db_ms': round(profile.duration * 1000, 2),
+            'template_ms': round(template * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'duplicates': [{'sql': sql[:300], 'count': count} for sql, count in duplicates[:5]],
+            'over_threshold': flagged,
+        }))
+        return response
+
+    def process_template_response(self, request, response):
+        """Time the rendering of template responses, which happens after the view returns."""
+        if hasattr(request, '_query_profile_template'):
+            start = time.perf_counter()
+
+            def rendered(response):
+                request._query_profile_template += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:02
+
+from itertools import islice
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+FIELDS = ['game_id', 'platform_id', 'region_id', 'store_id', 'base_price', 'current_price', 'discount_percentage']
+
+
+def seed_price_history(apps, schema_editor):
+    """One history row per existing price, observed when it was last updated, as history is only written on
+    change and the first change would otherwise lose the price it replaces."""
+    Price = apps.get_model('games', 'Price')
+    PriceHistory = apps.get_model('games', 'PriceHistory')
+    rows = Price.objects.order_by('pk').values_list(*FIELDS, 'last_updated').iterator(chunk_size=BATCH_SIZE)
+    while batch := list(islice(rows, BATCH_SIZE)):
+        PriceHistory.objects.bulk_create(
+            PriceHistory(**dict(zip(FIELDS, row)), observed_at=last_updated) for *row, last_updated in batch
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0005_alter_game_title'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('base_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('current_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('discount_percentage', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('observed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='games.game')),
+                ('platform', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='games.platform')),
+                ('region', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='games.region')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='games.store')),
+            ],
+            options={
+                'verbose_name_plural': 'price history',
+                'indexes': [models.Index(fields=['game', 'region', 'observed_at'], name='games_price_history_idx')],
+            },
+        ),
+        migrations.RunPython(seed_price_history, migrations.RunPython.noop),
+    ]
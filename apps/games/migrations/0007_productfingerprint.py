@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0006_pricehistory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.CharField(max_length=12)),
+                ('region', models.CharField(max_length=10)),
+                ('digest', models.CharField(max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('product_id', 'region')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:05
+
+from django.db import migrations, models
+
+LOCALES = {
+    'US': 'en-US',
+    'TR': 'tr-TR',
+}
+
+
+def set_locales(apps, schema_editor):
+    Region = apps.get_model('games', 'Region')
+    for code, locale in LOCALES.items():
+        Region.objects.filter(code=code).update(locale=locale)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0007_productfingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='region',
+            name='locale',
+            field=models.CharField(blank=True, help_text='Xbox Store locale, e.g. en-US', max_length=10),
+        ),
+        migrations.RunPython(set_locales, migrations.RunPython.noop),
+    ]
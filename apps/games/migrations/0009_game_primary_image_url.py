@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:06
+
+from django.db import migrations, models
+from django.db.models import Case, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+PRIMARY_TYPES = ['box_art', 'poster', 'hero_art']
+
+
+def set_primary_image_urls(apps, schema_editor):
+    Game = apps.get_model('games', 'Game')
+    GameImage = apps.get_model('games', 'GameImage')
+    priority = Case(*[When(image_type=image_type, then=Value(index)) for index, image_type in enumerate(PRIMARY_TYPES)])
+    Game.objects.update(
+        primary_image_url=Coalesce(
+            Subquery(
+                GameImage.objects.filter(
+                    game=OuterRef('pk'),
+                    image_type__in=PRIMARY_TYPES,
+                ).order_by(priority).values('url')[:1]
+            ),
+            Value(''),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0008_region_locale'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='primary_image_url',
+            field=models.URLField(blank=True, default=''),
+        ),
+        migrations.RunPython(set_primary_image_urls, migrations.RunPython.noop),
+    ]
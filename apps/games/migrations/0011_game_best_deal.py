@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:09
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Exists, Max, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def set_best_deals(apps, schema_editor):
+    Game = apps.get_model('games', 'Game')
+    Price = apps.get_model('games', 'Price')
+    prices = Price.objects.filter(game=OuterRef('pk')).order_by().values('game')
+    Game.objects.update(
+        max_discount_percentage=Coalesce(
+            Subquery(prices.annotate(value=Max('discount_percentage')).values('value')),
+            Value(Decimal('0')),
+        ),
+        min_current_price=Subquery(prices.annotate(value=Min('current_price')).values('value')),
+        is_on_sale_anywhere=Exists(Price.objects.filter(game=OuterRef('pk'), is_on_sale=True, discount_percentage__gt=0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0010_game_title_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='is_on_sale_anywhere',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='max_discount_percentage',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='min_current_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['-max_discount_percentage', 'id'], name='games_game_discount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['is_on_sale_anywhere', '-max_discount_percentage'], name='games_game_on_sale_idx'),
+        ),
+        migrations.RunPython(set_best_deals, migrations.RunPython.noop),
+    ]
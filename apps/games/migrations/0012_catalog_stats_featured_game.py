@@ -0,0 +1,92 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def materialize_home(apps, schema_editor):
+    """First refresh of the home page tables, later ones run at the end of every crawl."""
+    CatalogStats = apps.get_model('games', 'CatalogStats')
+    FeaturedGame = apps.get_model('games', 'FeaturedGame')
+    Game = apps.get_model('games', 'Game')
+    Platform = apps.get_model('games', 'Platform')
+    Price = apps.get_model('games', 'Price')
+    Region = apps.get_model('games', 'Region')
+
+    listed = Game.objects.exclude(title__isnull=True).exclude(title__exact='')
+    CatalogStats.objects.create(
+        pk=1,
+        total_games=listed.count(),
+        total_regions=Region.objects.count(),
+        total_platforms=Platform.objects.count(),
+        refreshed_at=timezone.now(),
+    )
+
+    def featured(section, position, game, **fields):
+        return FeaturedGame(
+            section=section, position=position, game=game, title=game.title,
+            summary=game.short_description or game.description, primary_image_url=game.primary_image_url,
+            release_date=game.release_date, **fields,
+        )
+
+    latest = listed.exclude(release_date=None).filter(release_date__lte=timezone.now()).order_by('-release_date')[:4]
+    rows = [featured('latest', position, game) for position, game in enumerate(latest)]
+    discounted = listed.filter(is_on_sale_anywhere=True).order_by('-max_discount_percentage', 'id')[:4]
+    for position, game in enumerate(discounted):
+        price = Price.objects.filter(game=game, is_on_sale=True).select_related('region').order_by(
+            '-discount_percentage', 'current_price', 'pk'
+        ).first()
+        fields = {}
+        if price is not None:
+            fields = {
+                'currency_symbol': price.region.currency_symbol, 'base_price': price.base_price,
+                'current_price': price.current_price, 'discount_percentage': price.discount_percentage,
+            }
+        rows.append(featured('discounted', position, game, **fields))
+    FeaturedGame.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0011_game_best_deal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_games', models.PositiveIntegerField(default=0)),
+                ('total_regions', models.PositiveIntegerField(default=0)),
+                ('total_platforms', models.PositiveIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'catalog stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='FeaturedGame',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(choices=[('latest', 'Latest releases'), ('discounted', 'Discounted games')], max_length=20)),
+                ('position', models.PositiveSmallIntegerField()),
+                ('title', models.CharField()),
+                ('summary', models.TextField(blank=True)),
+                ('primary_image_url', models.URLField(blank=True, default='')),
+                ('release_date', models.DateField(blank=True, null=True)),
+                ('currency_symbol', models.CharField(blank=True, max_length=5)),
+                ('base_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('current_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('discount_percentage', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='games.game')),
+            ],
+            options={
+                'ordering': ['section', 'position'],
+                'constraints': [models.UniqueConstraint(fields=('section', 'position'), name='games_featured_position_unique')],
+            },
+        ),
+        migrations.RunPython(materialize_home, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:30
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+from apps.games.operations import AddIndexConcurrently
+
+# Descending release date ordering of the game list and the latest releases, NULLs last. SQLite cannot index
+# NULLS LAST, so it is PostgreSQL only and created here rather than in Game.Meta.indexes.
+RELEASE_DESC_INDEX = 'games_game_release_desc_idx'
+
+
+def create_release_desc_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {RELEASE_DESC_INDEX} ON games_game (release_date DESC NULLS LAST, id)'
+    )
+
+
+def drop_release_desc_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {RELEASE_DESC_INDEX}')
+
+
+class Migration(migrations.Migration):
+    # The indexes are built CONCURRENTLY on PostgreSQL, which cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('games', '0012_catalog_stats_featured_game'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='game',
+            index=models.Index(django.db.models.functions.text.Lower('title'), models.F('id'), name='games_game_title_lower_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='game',
+            index=models.Index(fields=['release_date', 'id'], name='games_game_release_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='price',
+            index=models.Index(condition=models.Q(('is_on_sale', True)), fields=['game', '-discount_percentage'], name='games_price_on_sale_idx'),
+        ),
+        migrations.RunPython(create_release_desc_index, drop_release_desc_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:31
+
+from django.db import migrations, models
+
+from apps.games.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # The indexes are built CONCURRENTLY on PostgreSQL, which cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('games', '0013_hot_path_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='game',
+            index=models.Index(fields=['publisher_name'], name='games_game_publisher_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='game',
+            index=models.Index(fields=['developer_name'], name='games_game_developer_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='price',
+            index=models.Index(fields=['region', 'current_price', 'game'], name='games_price_region_price_idx'),
+        ),
+    ]
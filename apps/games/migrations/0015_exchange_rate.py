@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0014_list_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency_code', models.CharField(max_length=3, unique=True)),
+                ('rate', models.DecimalField(decimal_places=6, max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(condition=models.Q(('rate__gt', 0)), name='games_exchangerate_rate_positive')],
+            },
+        ),
+    ]
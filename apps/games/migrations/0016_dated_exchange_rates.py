@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:52
+
+from decimal import Decimal
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, F, Min, OuterRef, Subquery, Value, When
+from django.db.models.functions import Round
+
+
+def set_min_normalized_prices(apps, schema_editor):
+    Game = apps.get_model('games', 'Game')
+    Price = apps.get_model('games', 'Price')
+    ExchangeRate = apps.get_model('games', 'ExchangeRate')
+    rate = Case(
+        When(region__currency_code=settings.PRICE_COMPARISON_CURRENCY, then=Value(Decimal(1))),
+        default=Subquery(
+            ExchangeRate.objects.filter(currency_code=OuterRef('region__currency_code')).order_by('-date').values('rate')[:1]
+        ),
+        output_field=models.DecimalField(decimal_places=6, max_digits=16),
+    )
+    normalized = Round(F('current_price') / rate, 2, output_field=models.DecimalField(decimal_places=2, max_digits=16))
+    prices = Price.objects.filter(game=OuterRef('pk')).order_by().values('game')
+    Game.objects.update(min_normalized_price=Subquery(prices.annotate(value=Min(normalized)).values('value')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0015_exchange_rate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exchangerate',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='exchangerate',
+            name='currency_code',
+            field=models.CharField(max_length=3),
+        ),
+        migrations.AddConstraint(
+            model_name='exchangerate',
+            constraint=models.UniqueConstraint(fields=('currency_code', 'date'), name='games_exchangerate_unique'),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='min_normalized_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=16, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['min_normalized_price', 'id'], name='games_game_min_price_idx'),
+        ),
+        migrations.RunPython(set_min_normalized_prices, migrations.RunPython.noop),
+    ]
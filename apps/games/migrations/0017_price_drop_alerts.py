@@ -0,0 +1,79 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0016_dated_exchange_rates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceDropEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('previous_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('current_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('detected_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('matched_at', models.DateTimeField(blank=True, null=True)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_drops', to='games.game')),
+                ('region', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='games.region')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Watchlist',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('threshold', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('game', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='watchers', to='games.game')),
+                ('region', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='games.region')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watchlist', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'watchlist entry',
+                'verbose_name_plural': 'watchlist entries',
+            },
+        ),
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='games.pricedropevent')),
+                ('watch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='games.watchlist')),
+            ],
+            options={
+                'verbose_name': 'notification',
+                'verbose_name_plural': 'notification outbox',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='pricedropevent',
+            index=models.Index(condition=models.Q(('matched_at', None)), fields=['id'], name='games_pricedrop_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchlist',
+            index=models.Index(fields=['game', 'region', 'threshold'], name='games_watchlist_match_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='watchlist',
+            constraint=models.UniqueConstraint(fields=('user', 'game', 'region'), name='games_watchlist_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationoutbox',
+            index=models.Index(condition=models.Q(('sent_at', None)), fields=['id'], name='games_notification_unsent_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notificationoutbox',
+            constraint=models.UniqueConstraint(fields=('watch', 'event'), name='games_notification_unique'),
+        ),
+    ]
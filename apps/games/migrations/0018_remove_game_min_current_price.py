@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:01
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0017_price_drop_alerts'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='game',
+            name='min_current_price',
+        ),
+    ]
@@ -1,7 +1,12 @@
 from decimal import Decimal
 
+from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.db.models import Case, Exists, F, Max, Min, OuterRef, Prefetch, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Lower, Now, Round
+from django.db.models.lookups import Exact
+from django.utils import timezone
 
 
 class Platform(models.Model):
@@ -11,6 +16,24 @@ class Platform(models.Model):
         return self.name
 
 
+class GameQuerySet(models.QuerySet):
+    def listed(self):
+        """Games with a title, the ones shown on the site."""
+        return self.exclude(title__isnull=True).exclude(title__exact="")
+
+    def with_prices(self, **filters):
+        """Prefetch prices with their region, biggest discount and then lowest price first. The ordering
+        lets ``game.prices.first`` in templates read from the prefetch cache instead of querying."""
+        return self.prefetch_related(
+            Prefetch(
+                'prices',
+                queryset=Price.objects.filter(**filters).select_related('region').order_by(
+                    '-discount_percentage', 'current_price', 'pk'
+                ),
+            )
+        )
+
+
 class Game(models.Model):
     title = models.CharField()
     description = models.TextField(blank=True)
@@ -24,12 +47,85 @@ class Game(models.Model):
         related_name='games',
     )
     product_id = models.CharField(max_length=12, unique=True, blank=True, null=True)
+    primary_image_url = models.URLField(blank=True, default='')
+
+    # Best deal over all prices of the game, maintained by refresh_deals()
+    max_discount_percentage = models.DecimalField(decimal_places=2, max_digits=5, default=0)
+    is_on_sale_anywhere = models.BooleanField(default=False)
+    # Lowest current price in the PRICE_COMPARISON_CURRENCY, at the latest exchange rates
+    min_normalized_price = models.DecimalField(decimal_places=2, max_digits=16, null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = GameQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-max_discount_percentage', 'id'], name='games_game_discount_idx'),
+            models.Index(fields=['is_on_sale_anywhere', '-max_discount_percentage'], name='games_game_on_sale_idx'),
+            # The title orderings of the game list, ascending and, scanned backwards, descending
+            models.Index(Lower('title'), F('id'), name='games_game_title_lower_idx'),
+            # The ascending release date ordering and the release year filter, which runs as a date range.
+            # The descending one, NULLs last, is the PostgreSQL only games_game_release_desc_idx of
+            # migration 0013, SQLite cannot index NULLS LAST.
+            models.Index(fields=['release_date', 'id'], name='games_game_release_idx'),
+            models.Index(fields=['publisher_name'], name='games_game_publisher_idx'),
+            models.Index(fields=['developer_name'], name='games_game_developer_idx'),
+            models.Index(fields=['min_normalized_price', 'id'], name='games_game_min_price_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
+    @classmethod
+    def update_changed(cls, games, **values):
+        """UPDATE the columns of ``values``, ``{field: expression}``, of the ``games`` where one of them
+        changes, and their updated_at, which QuerySet.update() leaves alone, for the incremental exports.
+        Returns the number of games changed."""
+        changed = Q()
+        for field, value in values.items():
+            column = F(field)
+            if cls._meta.get_field(field).null:
+                # NULL compares as -1, below any price
+                column, value = Coalesce(column, Value(Decimal('-1'))), Coalesce(value, Value(Decimal('-1')))
+            changed |= ~Q(Exact(column, value))
+        return games.filter(changed).update(updated_at=Now(), **values)
+
+    @classmethod
+    def refresh_deals(cls, game_ids):
+        """Recompute the best deal columns of the given games from their prices in a single UPDATE."""
+        prices = Price.objects.filter(game=OuterRef('pk')).order_by().values('game')
+        cls.update_changed(
+            cls.objects.filter(pk__in=game_ids),
+            max_discount_percentage=Coalesce(
+                Subquery(prices.annotate(value=Max('discount_percentage')).values('value')),
+                Value(Decimal('0')),
+            ),
+            is_on_sale_anywhere=Exists(
+                Price.objects.filter(game=OuterRef('pk'), is_on_sale=True, discount_percentage__gt=0)
+            ),
+            min_normalized_price=cls.min_normalized_price_subquery(),
+        )
+
+    @classmethod
+    def refresh_normalized_prices(cls):
+        """Recompute min_normalized_price of every game in a single UPDATE, after the exchange rates change.
+        Returns the number of games repriced."""
+        return cls.update_changed(cls.objects.all(), min_normalized_price=cls.min_normalized_price_subquery())
+
+    @staticmethod
+    def min_normalized_price_subquery():
+        prices = Price.objects.filter(game=OuterRef('pk')).order_by().values('game')
+        return Subquery(prices.annotate(value=Min(ExchangeRate.normalize('current_price'))).values('value'))
+
+    @classmethod
+    def refresh_primary_images(cls, game_ids):
+        """Recompute primary_image_url of the given games from their images in a single UPDATE."""
+        cls.update_changed(
+            cls.objects.filter(pk__in=game_ids), primary_image_url=Coalesce(GameImage.primary_url_subquery(), Value(''))
+        )
+
 
 class GameImage(models.Model):
     IMAGE_TYPES = [
@@ -39,6 +135,8 @@ class GameImage(models.Model):
         ('screenshot', 'Screenshot'),
         ('logo', 'Logo'),
     ]
+    # Image types used as the card image of a game, best first
+    PRIMARY_TYPES = ['box_art', 'poster', 'hero_art']
 
     game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='images')
     image_type = models.CharField(max_length=20, choices=IMAGE_TYPES)
@@ -52,10 +150,24 @@ class GameImage(models.Model):
     def __str__(self):
         return f"{self.game.title} - {self.get_image_type_display()}"
 
+    @classmethod
+    def primary_url_subquery(cls, game_ref='pk'):
+        """Subquery with the URL of the best primary image of the game referenced by ``game_ref``."""
+        priority = Case(
+            *[When(image_type=image_type, then=Value(index)) for index, image_type in enumerate(cls.PRIMARY_TYPES)]
+        )
+        return Subquery(
+            cls.objects.filter(
+                game=OuterRef(game_ref),
+                image_type__in=cls.PRIMARY_TYPES,
+            ).order_by(priority).values('url')[:1]
+        )
+
 
 class Region(models.Model):
     name = models.CharField(max_length=100)
     code = models.CharField(max_length=10, unique=True)
+    locale = models.CharField(max_length=10, blank=True, help_text='Xbox Store locale, e.g. en-US')
     currency_code = models.CharField(max_length=3)
     currency_symbol = models.CharField(max_length=5)
 
@@ -63,6 +175,49 @@ class Region(models.Model):
         return f"{self.name} ({self.currency_code})"
 
 
+class ExchangeRate(models.Model):
+    """Units of a currency per unit of the PRICE_COMPARISON_CURRENCY on a date, used to compare the prices
+    of different regions in one currency. Loaded with the load_exchange_rates command."""
+    currency_code = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.DecimalField(decimal_places=6, max_digits=16)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Also the index of the rate lookups, the latest date of a currency first when scanned backwards
+            models.UniqueConstraint(fields=['currency_code', 'date'], name='games_exchangerate_unique'),
+            models.CheckConstraint(condition=Q(rate__gt=0), name='games_exchangerate_rate_positive'),
+        ]
+
+    def __str__(self):
+        return f"{self.currency_code} {self.rate} ({self.date:%Y-%m-%d})"
+
+    @classmethod
+    def rate_expression(cls, currency_code, on=None):
+        """
+        Rate of the currency in the ``currency_code`` field: the latest one, or the latest on or before the
+        date ``on``. 1 for the comparison currency and NULL when there is no rate.
+        """
+        rates = cls.objects.filter(currency_code=OuterRef(currency_code))
+        if on is not None:
+            rates = rates.filter(date__lte=on)
+        return Case(
+            When(**{currency_code: settings.PRICE_COMPARISON_CURRENCY}, then=Value(Decimal(1))),
+            default=Subquery(rates.order_by('-date').values('rate')[:1]),
+            output_field=models.DecimalField(decimal_places=6, max_digits=16),
+        )
+
+    @classmethod
+    def normalize(cls, field, currency_code='region__currency_code', on=None):
+        """Amount ``field`` in the comparison currency, rounded to cents."""
+        return Round(
+            F(field) / cls.rate_expression(currency_code, on),
+            2,
+            output_field=models.DecimalField(decimal_places=2, max_digits=16),
+        )
+
+
 class GamePlatform(models.Model):
     platform = models.ForeignKey(Platform, on_delete=models.CASCADE)
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
@@ -109,6 +264,15 @@ class Price(models.Model):
 
     class Meta:
         unique_together = ('game', 'platform', 'region', 'store')
+        indexes = [
+            # Best deals of games on sale: the with_prices(is_on_sale=True) prefetch and the
+            # is_on_sale_anywhere subquery of Game.refresh_deals()
+            models.Index(
+                fields=['game', '-discount_percentage'], condition=Q(is_on_sale=True), name='games_price_on_sale_idx',
+            ),
+            # Price ranges within a region, the region filter of the game list
+            models.Index(fields=['region', 'current_price', 'game'], name='games_price_region_price_idx'),
+        ]
 
     def __str__(self):
         currency = self.region.currency_symbol
@@ -117,11 +281,173 @@ class Price(models.Model):
         else:
             return f"{self.game.title} - {currency}{self.base_price}"
 
-    def save(self, *args, **kwargs):
+    def update_sale_status(self):
+        """Derive is_on_sale and discount_percentage from the base and current price."""
         if self.current_price < self.base_price:
             self.is_on_sale = True
             self.discount_percentage = round(
                 (self.base_price - self.current_price) / self.base_price * 100
             )
+        else:
+            self.is_on_sale = False
+            self.discount_percentage = 0
+
+    def save(self, *args, **kwargs):
+        self.update_sale_status()
 
         super().save(*args, **kwargs)
+        Game.refresh_deals([self.game_id])
+
+
+class PriceHistory(models.Model):
+    """Append-only log of price changes. A row is only written when the base or current price of a
+    (game, platform, region, store) differs from the last observed one."""
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='price_history')
+    platform = models.ForeignKey(Platform, on_delete=models.CASCADE)
+    region = models.ForeignKey(Region, on_delete=models.CASCADE)
+    store = models.ForeignKey(Store, on_delete=models.CASCADE)
+    base_price = models.DecimalField(decimal_places=2, max_digits=10)
+    current_price = models.DecimalField(decimal_places=2, max_digits=10)
+    discount_percentage = models.DecimalField(decimal_places=2, max_digits=5, default=0)
+    observed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = 'price history'
+        indexes = [
+            models.Index(fields=['game', 'region', 'observed_at'], name='games_price_history_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.game.title} - {self.region.currency_symbol}{self.current_price} ({self.observed_at:%Y-%m-%d})"
+
+
+class ProductFingerprint(models.Model):
+    """Hash of the last scraped metadata, images and price of a product in a region. Incremental crawls
+    skip items whose fingerprint has not changed."""
+    product_id = models.CharField(max_length=12)
+    region = models.CharField(max_length=10)
+    digest = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('product_id', 'region')
+
+    def __str__(self):
+        return f"{self.product_id} ({self.region})"
+
+
+class CatalogStats(models.Model):
+    """Catalog totals shown on the home page. A single row, refreshed by apps.games.catalog.refresh_catalog()
+    at the end of every crawl."""
+    total_games = models.PositiveIntegerField(default=0)
+    total_regions = models.PositiveIntegerField(default=0)
+    total_platforms = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'catalog stats'
+
+    def __str__(self):
+        return f"{self.total_games} games ({self.refreshed_at:%Y-%m-%d %H:%M})" if self.refreshed_at else "Never refreshed"
+
+
+class FeaturedGame(models.Model):
+    """A card of a home page list with everything it displays, so the home page reads the lists without
+    joining prices. Materialized by apps.games.catalog.refresh_catalog() at the end of every crawl."""
+    LATEST = 'latest'
+    DISCOUNTED = 'discounted'
+    SECTIONS = [
+        (LATEST, 'Latest releases'),
+        (DISCOUNTED, 'Discounted games'),
+    ]
+
+    section = models.CharField(max_length=20, choices=SECTIONS)
+    position = models.PositiveSmallIntegerField()
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='+')
+    title = models.CharField()
+    # Short description, or the description when there is none
+    summary = models.TextField(blank=True)
+    primary_image_url = models.URLField(blank=True, default='')
+    release_date = models.DateField(null=True, blank=True)
+    # Best deal of discounted games
+    currency_symbol = models.CharField(max_length=5, blank=True)
+    base_price = models.DecimalField(decimal_places=2, max_digits=10, null=True, blank=True)
+    current_price = models.DecimalField(decimal_places=2, max_digits=10, null=True, blank=True)
+    discount_percentage = models.DecimalField(decimal_places=2, max_digits=5, default=0)
+
+    class Meta:
+        ordering = ['section', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['section', 'position'], name='games_featured_position_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_section_display()} #{self.position}: {self.title}"
+
+
+class PriceDropEvent(models.Model):
+    """A lower current price of a game in a region, recorded by the scraper pipeline when it overwrites the
+    price. Events are matched against the watchlists once by apps.games.alerts.match_price_drops()."""
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='price_drops')
+    region = models.ForeignKey(Region, on_delete=models.CASCADE)
+    previous_price = models.DecimalField(decimal_places=2, max_digits=10)
+    current_price = models.DecimalField(decimal_places=2, max_digits=10)
+    detected_at = models.DateTimeField(default=timezone.now)
+    matched_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Events not matched yet, the work queue of match_price_drops()
+            models.Index(fields=['id'], condition=Q(matched_at=None), name='games_pricedrop_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.game.title} - {self.region.currency_symbol}{self.previous_price} → {self.current_price}"
+
+
+class Watchlist(models.Model):
+    """A game a user watches in a region, to be notified when its price drops to ``threshold`` or below."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='watchlist')
+    # Indexed by games_watchlist_match_idx
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='watchers', db_index=False)
+    region = models.ForeignKey(Region, on_delete=models.CASCADE)
+    # In the currency of the region
+    threshold = models.DecimalField(decimal_places=2, max_digits=10)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'watchlist entry'
+        verbose_name_plural = 'watchlist entries'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'game', 'region'], name='games_watchlist_unique'),
+        ]
+        indexes = [
+            # The entries a drop event crosses the threshold of, a range within a game and region
+            models.Index(fields=['game', 'region', 'threshold'], name='games_watchlist_match_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.game.title} ≤ {self.region.currency_symbol}{self.threshold}"
+
+
+class NotificationOutbox(models.Model):
+    """A price drop notification to deliver to a user, written by match_price_drops(). The sender marks
+    delivered notifications with ``sent_at``."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    watch = models.ForeignKey(Watchlist, on_delete=models.CASCADE, related_name='notifications')
+    event = models.ForeignKey(PriceDropEvent, on_delete=models.CASCADE, related_name='notifications')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'notification'
+        verbose_name_plural = 'notification outbox'
+        constraints = [
+            models.UniqueConstraint(fields=['watch', 'event'], name='games_notification_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['id'], condition=Q(sent_at=None), name='games_notification_unsent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.event}"
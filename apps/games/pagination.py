@@ -0,0 +1,183 @@
+import base64
+import binascii
+import hashlib
+import json
+from dataclasses import dataclass
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+
+from apps.games.cache import aget_or_set, get_or_set
+
+
+def count_key(queryset):
+    return 'count:' + hashlib.md5(str(queryset.order_by().query).encode()).hexdigest()
+
+
+def cached_count(queryset):
+    """Row count of ``queryset``, cached until the next catalog version. The catalog only changes when a
+    scrape finishes, so the count is exact between scrapes."""
+    if queryset.query.is_empty():
+        # none() has no SQL to key on
+        return 0
+    return get_or_set(count_key(queryset), queryset.count)
+
+
+async def acached_count(queryset):
+    """Async version of cached_count()."""
+    if queryset.query.is_empty():
+        return 0
+    return await aget_or_set(count_key(queryset), queryset.acount)
+
+
+class CachedCountPaginator(Paginator):
+    """Page number paginator that takes the total from cached_count() instead of a COUNT per request."""
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list)
+
+
+@dataclass(frozen=True)
+class SortKey:
+    """One column of a keyset ordering. ``expression`` is annotated as ``field`` when the ordering is not a
+    plain model field. NULL values are only supported when sorted last."""
+    field: str
+    descending: bool = False
+    nulls_last: bool = False
+    expression: object = None
+
+    def order_by(self):
+        if self.descending:
+            return F(self.field).desc(nulls_last=self.nulls_last or None)
+        return F(self.field).asc(nulls_last=self.nulls_last or None)
+
+    def equal(self, value):
+        if value is None:
+            return Q(**{f'{self.field}__isnull': True})
+        return Q(**{self.field: value})
+
+    def after(self, value):
+        """Rows sorting strictly after ``value`` on this key."""
+        if value is None:
+            # Nothing sorts after NULL when NULLs come last
+            return Q(pk__in=[])
+        lookup = 'lt' if self.descending else 'gt'
+        condition = Q(**{f'{self.field}__{lookup}': value})
+        if self.nulls_last:
+            condition |= Q(**{f'{self.field}__isnull': True})
+        return condition
+
+
+def key_value(row, field):
+    """Value of a sort key on a model instance or a ``values()`` row."""
+    if isinstance(row, dict):
+        return row[field]
+    return getattr(row, field)
+
+
+def order_by_keys(queryset, keys):
+    """Annotate and order ``queryset`` by the sort keys."""
+    annotations = {key.field: key.expression for key in keys if key.expression is not None}
+    if annotations:
+        queryset = queryset.annotate(**annotations)
+    return queryset.order_by(*[key.order_by() for key in keys])
+
+
+def encode_cursor(values):
+    data = json.dumps([None if value is None else str(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidPage('Invalid cursor')
+    if not isinstance(values, list):
+        raise InvalidPage('Invalid cursor')
+    return values
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, next_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+
+    def __repr__(self):
+        return f'<Keyset page of {len(self.object_list)}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return False
+
+    def has_other_pages(self):
+        return self.has_next()
+
+
+class KeysetPaginator:
+    """Cursor paginator seeking past the last row of the previous page instead of using OFFSET, so every
+    page costs one query of ``per_page + 1`` rows at any depth.
+
+    ``object_list`` must be ordered by ``keys`` (see order_by_keys()), and the keys must end with a unique
+    key, the primary key, to make the ordering total. The cursor is an opaque token holding the key values
+    of the last row of a page.
+    """
+    keyset = True
+
+    def __init__(self, object_list, keys, per_page):
+        self.object_list = object_list
+        self.keys = keys
+        self.per_page = int(per_page)
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list)
+
+    def seek(self, values):
+        """Rows after the row with the given key values."""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for key, value in zip(self.keys, values):
+            condition |= equal & key.after(value)
+            equal &= key.equal(value)
+        return self.object_list.filter(condition)
+
+    def page_queryset(self, cursor):
+        """Rows of the page starting after ``cursor``, plus one telling whether there is a next page."""
+        queryset = self.object_list
+        if cursor:
+            values = decode_cursor(cursor)
+            if len(values) != len(self.keys):
+                raise InvalidPage('Invalid cursor')
+            try:
+                queryset = self.seek(values)
+            except (ValidationError, ValueError, TypeError):
+                # A cursor value that does not fit its column
+                raise InvalidPage('Invalid cursor')
+        return queryset[:self.per_page + 1]
+
+    def build_page(self, rows):
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            last = rows[-1]
+            next_cursor = encode_cursor([key_value(last, key.field) for key in self.keys])
+        return KeysetPage(rows, self, next_cursor)
+
+    def page(self, cursor=None):
+        return self.build_page(list(self.page_queryset(cursor)))
+
+    async def apage(self, cursor=None):
+        return self.build_page([row async for row in self.page_queryset(cursor)])
@@ -0,0 +1,120 @@
+"""
+Cross-region price comparison in the PRICE_COMPARISON_CURRENCY.
+
+Prices are normalized to the comparison currency in SQL with the rates of the ExchangeRate table, so the
+regions of a game are ranked by the database in the query that fetches them, and a list page gets the
+cheapest region of all its games in its own query. Prices in a currency without a rate are listed but not
+ranked. Large price sets, as exports and analytics read them, are normalized in Python by
+normalize_amounts(), one vectorized NumPy pass per batch.
+"""
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db.models import DecimalField, F, OuterRef, Subquery
+
+from apps.games.models import ExchangeRate, Price
+
+NORMALIZED_PRICE = DecimalField(decimal_places=2, max_digits=16)
+
+
+def with_normalized_prices(prices, on=None):
+    """Annotate a prices queryset with ``normalized_current_price``, at the latest rates or the rates of the
+    date ``on``."""
+    return prices.annotate(normalized_current_price=ExchangeRate.normalize('current_price', on=on))
+
+
+def comparison_queryset(game):
+    """Prices of ``game`` with their region, cheapest in the comparison currency first."""
+    return with_normalized_prices(Price.objects.filter(game=game)).select_related('region').order_by(
+        F('normalized_current_price').asc(nulls_last=True), 'current_price', 'pk'
+    )
+
+
+@dataclass
+class PriceComparison:
+    """Prices of a game in every region, ``prices`` ranked cheapest first by their
+    ``normalized_current_price``."""
+    prices: list
+    currency: str
+    home_region: str
+
+    @property
+    def cheapest(self):
+        price = self.prices[0] if self.prices else None
+        return price if price is not None and price.normalized_current_price is not None else None
+
+    @property
+    def home(self):
+        return next((price for price in self.prices if price.region.code == self.home_region), None)
+
+    @property
+    def savings(self):
+        """What buying in the cheapest region saves over the home region, in the comparison currency."""
+        cheapest, home = self.cheapest, self.home
+        if cheapest is None or home is None or home.normalized_current_price is None:
+            return None
+        return home.normalized_current_price - cheapest.normalized_current_price
+
+    @property
+    def savings_percentage(self):
+        savings = self.savings
+        if not savings:
+            return savings
+        return round(savings / self.home.normalized_current_price * 100)
+
+
+def comparison(prices):
+    return PriceComparison(prices, settings.PRICE_COMPARISON_CURRENCY, settings.HOME_REGION)
+
+
+def compare_prices(game):
+    """Compare the prices of ``game`` across regions, in one query."""
+    return comparison(list(comparison_queryset(game)))
+
+
+async def acompare_prices(game):
+    """Async version of compare_prices()."""
+    return comparison([price async for price in comparison_queryset(game)])
+
+
+def with_cheapest_region(games):
+    """
+    Annotate a games queryset with the code of the region where each game is cheapest, ``cheapest_region``,
+    its price there, ``cheapest_price``, and in the home region, ``home_price``, both in the comparison
+    currency. The annotations are subqueries of the games query, so a page of games costs no extra query.
+    """
+    prices = with_normalized_prices(Price.objects.filter(game=OuterRef('pk'))).exclude(normalized_current_price=None)
+    cheapest = prices.order_by('normalized_current_price', 'current_price', 'pk')
+    home = cheapest.filter(region__code=settings.HOME_REGION)
+    return games.annotate(
+        cheapest_region=Subquery(cheapest.values('region__code')[:1]),
+        cheapest_price=Subquery(cheapest.values('normalized_current_price')[:1], output_field=NORMALIZED_PRICE),
+        home_price=Subquery(home.values('normalized_current_price')[:1], output_field=NORMALIZED_PRICE),
+    )
+
+
+def rates_on(on=None):
+    """``{currency_code: rate}`` of the latest rates, or the latest on or before the date ``on``, in one
+    query."""
+    latest = ExchangeRate.objects.filter(currency_code=OuterRef('currency_code'))
+    if on is not None:
+        latest = latest.filter(date__lte=on)
+    rates = ExchangeRate.objects.filter(date=Subquery(latest.order_by('-date').values('date')[:1]))
+    return {
+        settings.PRICE_COMPARISON_CURRENCY: 1,
+        **dict(rates.values_list('currency_code', 'rate')),
+    }
+
+
+def normalize_amounts(amounts, currency_codes, rates):
+    """
+    Amounts in the comparison currency, as a float64 NumPy array rounded to cents, of the ``amounts`` in
+    ``currency_codes``, two sequences of the same length, at the ``rates`` of rates_on(). Amounts in a
+    currency without a rate are NaN. Needs the optional numpy package.
+    """
+    import numpy as np
+
+    codes, inverse = np.unique(np.asarray(currency_codes, dtype=str), return_inverse=True)
+    # One division per currency, then a single gather and multiply over all the amounts
+    factors = np.array([1 / float(rates[code]) if code in rates else np.nan for code in codes])
+    return np.round(np.asarray(amounts, dtype=np.float64) * factors[inverse], 2)
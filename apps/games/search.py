@@ -0,0 +1,31 @@
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from apps.games.pagination import SortKey, order_by_keys
+
+
+def search_sort_keys(query, vendor):
+    """Sort keys of search results: similarity to ``query`` on PostgreSQL, then title and primary key."""
+    keys = [SortKey('title_lower', expression=Lower('title')), SortKey('pk')]
+    if vendor == 'postgresql':
+        keys.insert(0, SortKey('rank', descending=True, expression=TrigramWordSimilarity(query, 'title')))
+    return keys
+
+
+def search_games(queryset, query):
+    """
+    Filter and rank games by title.
+
+    On PostgreSQL titles are matched with pg_trgm word similarity, which tolerates typos, or as a
+    substring, and ranked by similarity. Both conditions are served by the trigram GIN indexes on
+    ``games_game``. Other databases, such as SQLite in tests, fall back to a case-insensitive substring
+    match ordered by title.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        queryset = queryset.filter(Q(title__trigram_word_similar=query) | Q(title__icontains=query))
+    else:
+        queryset = queryset.filter(title__icontains=query)
+    return order_by_keys(queryset, search_sort_keys(query, vendor))
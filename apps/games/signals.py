@@ -0,0 +1,43 @@
+"""
+Start a new catalog version when games, prices or images are saved or deleted one at a time, as the admin
+does, so the cached pages and card fragments show the change. A transaction writing several rows, as the
+cascade of a game deletion, bumps the version once. The pipeline writes in bulk, which sends no signals, and
+bumps the version once when the crawl ends.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.games.cache import bump_catalog_version
+from apps.games.models import Game, GameImage, Price
+
+
+class CatalogBump:
+    """on_commit() callback starting a new catalog version. It marks itself as run so that callbacks run
+    before the transaction ends, as captureOnCommitCallbacks(execute=True) does, leave later writes to queue
+    their own bump."""
+
+    def __init__(self):
+        self.run = False
+
+    def __call__(self):
+        self.run = True
+        bump_catalog_version()
+
+
+@receiver([post_save, post_delete], sender=Game)
+@receiver([post_save, post_delete], sender=Price)
+@receiver([post_save, post_delete], sender=GameImage)
+def catalog_changed(sender, using=None, **kwargs):
+    # A bump queued in the same savepoint commits or rolls back with this write. Callbacks of a rolled back
+    # savepoint are dropped from run_on_commit, so that bump is then queued again. Atomic blocks without a
+    # savepoint, as the cascade of a deletion runs in, record None and roll back with their savepoint.
+    connection = transaction.get_connection(using)
+    savepoints = set(connection.savepoint_ids) - {None}
+    if any(
+        isinstance(callback, CatalogBump) and not callback.run and sids - {None} == savepoints
+        for sids, callback, _ in connection.run_on_commit
+    ):
+        return
+    # After the commit, a request running in between would cache the old rows under the new version
+    transaction.on_commit(CatalogBump(), using=using)
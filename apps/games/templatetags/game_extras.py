@@ -1,5 +1,7 @@
 from django import template
 
+from apps.games.models import GameImage
+
 register = template.Library()
 
 
@@ -11,13 +13,16 @@ def best_image(images):
     2. poster
     3. hero_art
     Returns None if no image is available (template handles fallback UI).
+
+    The images are iterated once in Python, so a prefetched ``game.images.all`` costs no query.
+    Prefer ``game.primary_image_url``, which the scrape pipeline keeps up to date.
     """
     if not images:
         return None
 
-    for image_type in ["box_art", "poster", "hero_art"]:
-        img = images.filter(image_type=image_type).first()
-        if img:
-            return img.url
+    urls = {img.image_type: img.url for img in images}
+    for image_type in GameImage.PRIMARY_TYPES:
+        if image_type in urls:
+            return urls[image_type]
 
-    return None
\ No newline at end of file
+    return None
@@ -1,3 +1,1346 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
+from unittest.mock import Mock, patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from scrapy.exceptions import DropItem
+from scrapy.statscollectors import StatsCollector
+
+from apps.games import async_views
+from apps.games.alerts import crossed_thresholds, match_price_drops
+from apps.games.cache import bump_catalog_version, catalog_version
+from apps.games.catalog import refresh_catalog
+from apps.games.filters import FILTERS, filter_games
+from apps.games.middleware import QueryProfilingMiddleware
+from apps.games.models import (
+    CatalogStats, ExchangeRate, FeaturedGame, Game, GameImage, GamePlatform, NotificationOutbox, Platform, Price,
+    PriceDropEvent, PriceHistory, ProductFingerprint, Region, Store, Watchlist,
+)
+from apps.games.pricing import compare_prices, rates_on, with_cheapest_region, with_normalized_prices
+from apps.games.search import search_games
+from apps.games.templatetags.game_extras import best_image
+from apps.games.urls import page_urls
+from apps.games.views import ORDERINGS, GameListView, SearchView
+from scrapers.xbox.xbox.items import XboxItem
+from scrapers.xbox.xbox.pipelines import DjangoModelPipeline, FingerprintPipeline, item_fingerprint
+from scrapers.xbox.xbox.spiders.game import GameSpider
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'catalog': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-catalog'},
+}
+
+
+def clear_caches():
+    for alias in TEST_CACHES:
+        caches[alias].clear()
+
+
+def make_item(product_id, region='en-US', title=None, base=60, current=60, images=None):
+    item = XboxItem()
+    item['region'] = region
+    item['product_id'] = product_id
+    item['game_title'] = title or f'Game {product_id}'
+    item['game_description'] = f'Desc {product_id}'
+    item['game_short_description'] = ''
+    item['game_developer_name'] = 'Dev'
+    item['game_publisher_name'] = 'Pub'
+    item['game_release_date'] = '2024-11-25T05:00:00.0000000Z'
+    item['images'] = images if images is not None else {
+        'boxArt': {'url': f'https://img/{product_id}/box', 'width': 100, 'height': 100},
+        'poster': {'url': f'https://img/{product_id}/poster', 'width': 100, 'height': 150},
+    }
+    item['price_base'] = base
+    item['price_current'] = current
+    return item
+
+
+class PipelineTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Platform.objects.create(name='Xbox')
+        Region.objects.create(name='United States', code='US', locale='en-US', currency_code='USD', currency_symbol='$')
+        Region.objects.create(name='Turkey', code='TR', locale='tr-TR', currency_code='TRY', currency_symbol='₺')
+
+    def setUp(self):
+        self.spider = GameSpider()
+
+    async def make_pipeline(self, **kwargs):
+        pipeline = DjangoModelPipeline(**kwargs)
+        await sync_to_async(pipeline.dimensions.warm)()
+        return pipeline
+
+    async def run_items(self, pipeline, items):
+        for item in items:
+            await pipeline.process_item(item, self.spider)
+        await pipeline.flush(self.spider)
+
+
+class CatalogTestCase(TestCase):
+    """Platform, store and the US and TR regions that the catalog tests price their games in."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.platform = Platform.objects.create(name='Xbox')
+        cls.store = Store.objects.create(name='Xbox Store', base_url='https://www.xbox.com')
+        cls.us = Region.objects.create(name='United States', code='US', currency_code='USD', currency_symbol='$')
+        cls.tr = Region.objects.create(name='Turkey', code='TR', currency_code='TRY', currency_symbol='₺')
+
+
+class DjangoModelPipelineTest(PipelineTestCase):
+    async def test_items_are_buffered_until_batch_size(self):
+        """Items stay in the buffer until the batch is full."""
+        pipeline = await self.make_pipeline(batch_size=3, flush_interval=3600)
+
+        await pipeline.process_item(make_item('1'), self.spider)
+        await pipeline.process_item(make_item('2'), self.spider)
+        self.assertEqual(await Game.objects.acount(), 0)
+
+        await pipeline.process_item(make_item('3'), self.spider)
+        self.assertEqual(await Game.objects.acount(), 3)
+        self.assertEqual(pipeline.buffer, [])
+
+    async def test_flush_on_interval(self):
+        """An elapsed flush interval writes the buffer even if the batch is not full."""
+        pipeline = await self.make_pipeline(batch_size=100, flush_interval=0)
+
+        await pipeline.process_item(make_item('1'), self.spider)
+        self.assertEqual(await Game.objects.acount(), 1)
+
+    async def test_batch_writes_all_models(self):
+        """A flushed batch creates games, platforms, images and prices."""
+        pipeline = await self.make_pipeline(batch_size=100)
+        await self.run_items(pipeline, [make_item('1', base=80, current=60), make_item('2')])
+
+        game = await Game.objects.aget(product_id='1')
+        self.assertEqual(game.title, 'Game 1')
+        self.assertEqual(await GamePlatform.objects.acount(), 2)
+        self.assertEqual(await GameImage.objects.filter(game=game).acount(), 2)
+
+        price = await Price.objects.aget(game=game)
+        self.assertEqual(price.current_price, Decimal('60'))
+        self.assertTrue(price.is_on_sale)
+        self.assertEqual(price.discount_percentage, 25)
+
+    async def test_stats_count_created_and_updated(self):
+        """Counters report creates and updates per region, like per-item writes would."""
+        pipeline = await self.make_pipeline(batch_size=100)
+        await self.run_items(pipeline, [
+            make_item('1'),
+            make_item('1', region='tr-TR', base=900, current=900),
+            make_item('2'),
+        ])
+
+        self.assertEqual(pipeline.stats['en-US']['games'], {'crt': 2, 'upd': 0})
+        self.assertEqual(pipeline.stats['tr-TR']['games'], {'crt': 0, 'upd': 1})
+        self.assertEqual(pipeline.stats['en-US']['prices'], {'crt': 2, 'upd': 0})
+        self.assertEqual(pipeline.stats['tr-TR']['prices'], {'crt': 1, 'upd': 0})
+        self.assertEqual(pipeline.stats['en-US']['images'], 4)
+
+        await self.run_items(pipeline, [make_item('1', title='Game 1 Remastered', base=80, current=40)])
+
+        self.assertEqual(pipeline.stats['en-US']['games'], {'crt': 2, 'upd': 1})
+        self.assertEqual(pipeline.stats['en-US']['prices'], {'crt': 2, 'upd': 1})
+        game = await Game.objects.aget(product_id='1')
+        self.assertEqual(game.title, 'Game 1 Remastered')
+        self.assertEqual(await Price.objects.acount(), 3)
+
+    async def test_invalid_price_is_skipped(self):
+        """An item without a price is written without it, and does not fail the rest of its batch."""
+        pipeline = await self.make_pipeline(batch_size=100)
+        unpriced = make_item('2')
+        unpriced['price_current'] = None
+        await self.run_items(pipeline, [make_item('1'), unpriced, make_item('3')])
+
+        self.assertEqual(await Game.objects.acount(), 3)
+        priced = Price.objects.order_by('game__product_id').values_list('game__product_id', flat=True)
+        self.assertEqual([product_id async for product_id in priced], ['1', '3'])
+        self.assertEqual(pipeline.stats['en-US']['games'], {'crt': 3, 'upd': 0})
+
+    async def test_failed_batch(self):
+        """A batch that fails is rolled back without counting its writes, and reported as failed items."""
+        crawler_stats = StatsCollector(Mock())
+        pipeline = await self.make_pipeline(batch_size=100, crawler_stats=crawler_stats)
+        with patch.object(DjangoModelPipeline, 'write_prices', side_effect=DatabaseError('deadlock')), \
+                self.assertLogs(self.spider.logger.logger, 'ERROR'):
+            await self.run_items(pipeline, [make_item('1'), make_item('1', region='tr-TR'), make_item('2')])
+
+        self.assertEqual(await Game.objects.acount(), 0)
+        self.assertEqual(dict(pipeline.stats), {})
+        self.assertEqual(crawler_stats.get_value('pipeline/failed_items'), 3)
+
+        await self.run_items(pipeline, [make_item('1')])
+        self.assertEqual(pipeline.stats['en-US']['games'], {'crt': 1, 'upd': 0})
+        self.assertEqual(crawler_stats.get_value('pipeline/failed_items'), 3)
+
+    async def test_price_back_to_base_clears_sale(self):
+        """An upserted price that is no longer discounted is no longer on sale."""
+        pipeline = await self.make_pipeline(batch_size=100)
+        await self.run_items(pipeline, [make_item('1', base=80, current=60)])
+        await self.run_items(pipeline, [make_item('1', base=80, current=80)])
+
+        price = await Price.objects.aget()
+        self.assertFalse(price.is_on_sale)
+        self.assertEqual(price.discount_percentage, 0)
+
+    async def test_region_map_comes_from_region_table(self):
+        """Items are mapped to regions by Region.locale and unknown locales are dropped."""
+        await Region.objects.acreate(name='Germany', code='DE', locale='de-DE', currency_code='EUR', currency_symbol='€')
+        pipeline = await self.make_pipeline(batch_size=100)
+
+        await self.run_items(pipeline, [make_item('1', region='de-DE')])
+        self.assertEqual(await Price.objects.filter(region__code='DE').acount(), 1)
+
+        with self.assertRaises(DropItem):
+            await pipeline.process_item(make_item('1', region='fr-FR'), self.spider)
+
+    async def test_non_us_region_does_not_overwrite_metadata(self):
+        """Game metadata and images only come from the US region."""
+        pipeline = await self.make_pipeline(batch_size=100)
+        await self.run_items(pipeline, [make_item('1', title='Oyun 1', region='tr-TR')])
+
+        game = await Game.objects.aget(product_id='1')
+        self.assertEqual(game.title, '')
+        self.assertEqual(await GameImage.objects.acount(), 0)
+        self.assertEqual(await Price.objects.filter(region__code='TR').acount(), 1)
+
+
+class PriceHistoryTest(PipelineTestCase):
+    async def test_history_only_records_changes(self):
+        """A history row is written for new prices and price changes, not for unchanged prices."""
+        pipeline = await self.make_pipeline(batch_size=100)
+        await self.run_items(pipeline, [make_item('1', base=80, current=80)])
+        await self.run_items(pipeline, [make_item('1', base=80, current=80)])
+        self.assertEqual(await PriceHistory.objects.acount(), 1)
+
+        await self.run_items(pipeline, [make_item('1', base=80, current=60)])
+        history = [row async for row in PriceHistory.objects.order_by('observed_at', 'pk')]
+        self.assertEqual([row.current_price for row in history], [Decimal('80'), Decimal('60')])
+        self.assertEqual(history[-1].discount_percentage, 25)
+
+    async def test_history_per_region(self):
+        """Each region keeps its own history."""
+        pipeline = await self.make_pipeline(batch_size=100)
+        await self.run_items(pipeline, [
+            make_item('1', base=80, current=80),
+            make_item('1', region='tr-TR', base=900, current=900),
+        ])
+
+        self.assertEqual(await PriceHistory.objects.filter(region__code='US').acount(), 1)
+        self.assertEqual(await PriceHistory.objects.filter(region__code='TR').acount(), 1)
+
+
+class DimensionCacheTest(PipelineTestCase):
+    def test_warm_cache_skips_lookup_queries(self):
+        """Once warmed, batches do not query platforms, regions or stores again."""
+        pipeline = DjangoModelPipeline(batch_size=100)
+        pipeline.dimensions.warm()
+        pipeline.write_batch([(make_item('1'), 'US', None), (make_item('1', region='tr-TR'), 'TR', None)])
+
+        with CaptureQueriesContext(connection) as queries:
+            pipeline.write_batch([(make_item('2'), 'US', None), (make_item('2', region='tr-TR'), 'TR', None)])
+
+        lookups = [
+            query['sql'] for query in queries.captured_queries
+            if any(f'FROM "games_{table}"' in query['sql'] for table in ('platform', 'region', 'store'))
+        ]
+        self.assertEqual(lookups, [])
+        self.assertEqual(Price.objects.count(), 4)
+
+    def test_cache_miss_creates_row(self):
+        """A row missing from the cache is created once and then served from the cache."""
+        pipeline = DjangoModelPipeline(batch_size=100)
+        pipeline.dimensions.warm()
+
+        store = pipeline.dimensions.store('de-DE', 'DE', pipeline.dimensions.platform('Xbox'))
+        self.assertEqual(store.name, 'Xbox Store DE')
+        self.assertTrue(Store.objects.filter(name='Xbox Store DE', platforms__name='Xbox').exists())
+        self.assertEqual(pipeline.dimensions.region('DE').code, 'DE')
+
+        with self.assertNumQueries(0):
+            pipeline.dimensions.store('de-DE', 'DE', pipeline.dimensions.platform('Xbox'))
+            pipeline.dimensions.region('DE')
+
+
+class FingerprintPipelineTest(PipelineTestCase):
+    def test_fingerprint_is_stable(self):
+        """Equal content gives equal fingerprints and any content change gives a new one."""
+        self.assertEqual(item_fingerprint(make_item('1')), item_fingerprint(make_item('1')))
+        self.assertNotEqual(item_fingerprint(make_item('1')), item_fingerprint(make_item('1', current=50)))
+
+    async def test_written_items_store_fingerprints(self):
+        """Fingerprints are saved together with the batch."""
+        fingerprints = FingerprintPipeline()
+        pipeline = await self.make_pipeline(batch_size=100)
+        item = fingerprints.process_item(make_item('1'), self.spider)
+        await self.run_items(pipeline, [item])
+
+        stored = await ProductFingerprint.objects.aget(product_id='1', region='en-US')
+        self.assertEqual(stored.digest, item_fingerprint(make_item('1')))
+
+    async def test_incremental_drops_unchanged_items(self):
+        """In incremental mode only items that changed since the last crawl reach the model pipeline."""
+        pipeline = await self.make_pipeline(batch_size=100)
+        first = FingerprintPipeline()
+        await self.run_items(pipeline, [
+            first.process_item(make_item('1'), self.spider),
+            first.process_item(make_item('2'), self.spider),
+        ])
+
+        spider = GameSpider(incremental='true')
+        second = FingerprintPipeline()
+        await sync_to_async(second.load_fingerprints)()
+
+        with self.assertRaises(DropItem):
+            second.process_item(make_item('1'), spider)
+        changed = second.process_item(make_item('2', current=30), spider)
+        self.assertEqual(changed['product_id'], '2')
+
+
+class PrimaryImageTest(PipelineTestCase):
+    async def test_pipeline_maintains_primary_image_url(self):
+        """The pipeline stores the best card image on the game."""
+        pipeline = await self.make_pipeline(batch_size=100)
+        await self.run_items(pipeline, [
+            make_item('1'),
+            make_item('2', images={'superHeroArt': {'url': 'https://img/2/hero', 'width': 1, 'height': 1}}),
+            make_item('3', images={}),
+        ])
+
+        urls = {game.product_id: game.primary_image_url async for game in Game.objects.all()}
+        self.assertEqual(urls, {'1': 'https://img/1/box', '2': 'https://img/2/hero', '3': ''})
+
+    def test_best_image_uses_prefetched_images(self):
+        """The best_image filter picks from prefetched images without querying."""
+        game = Game.objects.create(title='Game', product_id='1')
+        GameImage.objects.create(game=game, image_type='hero_art', url='https://img/hero')
+        GameImage.objects.create(game=game, image_type='poster', url='https://img/poster')
+        game = Game.objects.prefetch_related('images').get(pk=game.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(best_image(game.images.all()), 'https://img/poster')
+        self.assertIsNone(best_image([]))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ViewQueryCountTest(CatalogTestCase):
+    """Page rendering must cost a constant number of queries, whatever the page size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i in range(40):
+            game = Game.objects.create(
+                title=f'Game {i}',
+                product_id=str(i),
+                release_date=f'20{10 + i % 15}-01-01',
+                primary_image_url=f'https://img/{i}/box',
+            )
+            GameImage.objects.create(game=game, image_type='box_art', url=f'https://img/{i}/box')
+            for region in [cls.us, cls.tr]:
+                Price.objects.create(
+                    game=game, platform=cls.platform, region=region, store=cls.store,
+                    base_price=Decimal('80'), current_price=Decimal('60' if i % 2 else '80'),
+                )
+
+    def setUp(self):
+        clear_caches()
+
+    def count_queries(self, url, view_class, paginate_by):
+        clear_caches()
+        with patch.object(view_class, 'paginate_by', paginate_by), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url, view_class, expected):
+        small = self.count_queries(url, view_class, 5)
+        large = self.count_queries(url, view_class, 30)
+        self.assertEqual((small, large), (expected, expected), url)
+
+    def test_game_list(self):
+        for params in ['', '?ordering=title', '?ordering=discount', '?discounted=true', '?release_year=2020']:
+            self.assertConstantQueries(reverse('games') + params, GameListView, 3)
+
+    def test_search(self):
+        self.assertConstantQueries(reverse('search') + '?q=game', SearchView, 2)
+
+    def test_game_detail(self):
+        game = Game.objects.get(product_id='1')
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('game_detail', args=[game.pk]), secure=True)
+        self.assertContains(response, '$60')
+
+    def test_index(self):
+        refresh_catalog()
+        # The stats row and the featured games
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('index'), secure=True)
+        self.assertContains(response, 'https://img/')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for title in ['The Witcher 3: Wild Hunt', 'Forza Horizon 5', 'Halo Infinite', 'witcher tales', '']:
+            Game.objects.create(title=title)
+
+    def setUp(self):
+        clear_caches()
+
+    def search(self, query):
+        return list(search_games(Game.objects.listed(), query).values_list('title', flat=True))
+
+    def test_substring_match_is_case_insensitive(self):
+        self.assertEqual(sorted(self.search('WITCHER')), ['The Witcher 3: Wild Hunt', 'witcher tales'])
+        self.assertEqual(self.search('horizon'), ['Forza Horizon 5'])
+
+    def test_search_view(self):
+        response = self.client.get(reverse('search') + '?q=halo', secure=True)
+        self.assertEqual([game.title for game in response.context['game_list']], ['Halo Infinite'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Trigram search requires PostgreSQL')
+    def test_typo_tolerance_and_ranking(self):
+        self.assertEqual(self.search('Halo Infinte'), ['Halo Infinite'])
+        self.assertEqual(self.search('witcher hunt')[0], 'The Witcher 3: Wild Hunt')
+
+
+class BestDealTest(PipelineTestCase):
+    async def test_pipeline_maintains_best_deal(self):
+        """Deal columns reflect all prices of a game after every flush."""
+        pipeline = await self.make_pipeline(batch_size=100)
+        await self.run_items(pipeline, [
+            make_item('1', base=80, current=60),
+            make_item('1', region='tr-TR', base=1000, current=500),
+            make_item('2', base=80, current=80),
+        ])
+
+        on_sale = await Game.objects.aget(product_id='1')
+        self.assertEqual(on_sale.max_discount_percentage, 50)
+        self.assertTrue(on_sale.is_on_sale_anywhere)
+        not_on_sale = await Game.objects.aget(product_id='2')
+        self.assertEqual(not_on_sale.max_discount_percentage, 0)
+        self.assertFalse(not_on_sale.is_on_sale_anywhere)
+
+        await self.run_items(pipeline, [
+            make_item('1', base=80, current=80),
+            make_item('1', region='tr-TR', base=1000, current=1000),
+        ])
+        ended = await Game.objects.aget(product_id='1')
+        self.assertEqual(ended.max_discount_percentage, 0)
+        self.assertFalse(ended.is_on_sale_anywhere)
+
+    def test_discount_filter_and_ordering_are_single_table(self):
+        """Discount filtering and ordering read Game columns only: no join and no DISTINCT."""
+        Game.objects.create(title='Small deal', max_discount_percentage=10, is_on_sale_anywhere=True)
+        Game.objects.create(title='Big deal', max_discount_percentage=75, is_on_sale_anywhere=True)
+        Game.objects.create(title='Full price')
+
+        view = GameListView()
+        view.setup(RequestFactory().get('/games/', {'discounted': 'true', 'ordering': 'discount'}))
+        queryset = view.get_queryset()
+
+        # Without the cheapest region subqueries, which are displayed but not filtered or ordered by
+        sql = str(queryset.values('pk').query).upper()
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('DISTINCT', sql)
+        self.assertEqual([game.title for game in queryset], ['Big deal', 'Small deal'])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CatalogCacheTest(PipelineTestCase):
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+
+    def get_index(self):
+        response = self.client.get(reverse('index'), secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_index_is_served_from_cache(self):
+        """A cached home page renders without touching the database."""
+        Game.objects.create(title='Cached Game', release_date='2020-01-01')
+        refresh_catalog()
+        first = self.get_index()
+
+        with self.assertNumQueries(0):
+            second = self.get_index()
+        self.assertEqual(first.content, second.content)
+        self.assertContains(second, 'Cached Game')
+
+    def test_bump_invalidates_pages_and_fragments(self):
+        """Changes show up once the catalog version is bumped, not before."""
+        game = Game.objects.create(title='Old Title', release_date='2020-01-01')
+        refresh_catalog()
+        self.get_index()
+        self.client.get(reverse('games'), secure=True)
+
+        Game.objects.filter(pk=game.pk).update(title='New Title')
+        refresh_catalog()
+        self.assertContains(self.get_index(), 'Old Title')
+        self.assertContains(self.client.get(reverse('games'), secure=True), 'Old Title')
+
+        bump_catalog_version()
+        self.assertContains(self.get_index(), 'New Title')
+        self.assertContains(self.client.get(reverse('games'), secure=True), 'New Title')
+
+    def test_model_writes_bump_version(self):
+        """Games, prices and images saved or deleted one at a time, as in the admin, start a new version once
+        committed."""
+        with self.captureOnCommitCallbacks(execute=True):
+            game = Game.objects.create(title='Game')
+        for write in [
+            lambda: game.save(),
+            lambda: GameImage.objects.create(game=game, image_type='box_art', url='https://img/box'),
+            lambda: game.delete(),
+        ]:
+            version = catalog_version()
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            self.assertNotEqual(catalog_version(), version)
+
+    def test_cascade_bumps_version_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            game = Game.objects.create(title='Game')
+            store = Store.objects.create(name='Xbox Store', base_url='https://www.xbox.com')
+            for region in Region.objects.all():
+                Price.objects.create(game=game, platform=Platform.objects.get(), region=region, store=store,
+                                     base_price=Decimal('60'), current_price=Decimal('60'))
+            GameImage.objects.create(game=game, image_type='box_art', url='https://img/box')
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            game.delete()
+        self.assertEqual(len(callbacks), 1)
+
+    def test_admin_edit_refreshes_home(self):
+        game = Game.objects.create(title='Old Title', release_date='2020-01-01')
+        refresh_catalog()
+        self.assertContains(self.get_index(), 'Old Title')
+
+        self.edit_in_admin(game, title='New Title')
+        self.assertContains(self.get_index(), 'New Title')
+
+    def test_admin_price_delete_refreshes_deals(self):
+        game = Game.objects.create(title='Game', release_date='2020-01-01')
+        store = Store.objects.create(name='Xbox Store', base_url='https://www.xbox.com')
+        price = Price.objects.create(game=game, platform=Platform.objects.get(), region=Region.objects.get(code='US'),
+                                     store=store, base_price=Decimal('80'), current_price=Decimal('60'))
+        game.refresh_from_db()
+        self.assertTrue(game.is_on_sale_anywhere)
+
+        self.edit_in_admin(game, **{
+            'prices-TOTAL_FORMS': '1', 'prices-INITIAL_FORMS': '1',
+            'prices-0-id': str(price.pk), 'prices-0-game': str(game.pk), 'prices-0-DELETE': 'on',
+        })
+        game.refresh_from_db()
+        self.assertEqual((game.max_discount_percentage, game.is_on_sale_anywhere), (0, False))
+
+    def test_admin_image_edit_refreshes_primary_image(self):
+        game = Game.objects.create(title='Game', release_date='2020-01-01')
+        self.edit_in_admin(game, **{
+            'images-TOTAL_FORMS': '1', 'images-0-game': str(game.pk), 'images-0-image_type': 'poster',
+            'images-0-url': 'https://img.example.com/poster',
+        })
+        game.refresh_from_db()
+        self.assertEqual(game.primary_image_url, 'https://img.example.com/poster')
+
+        image = GameImage.objects.get()
+        self.edit_in_admin(game, **{
+            'images-TOTAL_FORMS': '1', 'images-INITIAL_FORMS': '1', 'images-0-id': str(image.pk),
+            'images-0-game': str(game.pk), 'images-0-DELETE': 'on',
+        })
+        game.refresh_from_db()
+        self.assertEqual(game.primary_image_url, '')
+
+    def edit_in_admin(self, game, **data):
+        admin, _ = User.objects.get_or_create(username='admin', defaults={'is_staff': True, 'is_superuser': True})
+        self.client.force_login(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:games_game_change', args=[game.pk]), {
+                'title': game.title, 'description': '', 'release_date': '2020-01-01',
+                'prices-TOTAL_FORMS': '0', 'prices-INITIAL_FORMS': '0', 'images-TOTAL_FORMS': '0',
+                'images-INITIAL_FORMS': '0', **data,
+            }, secure=True)
+        self.assertEqual(response.status_code, 302)
+
+    async def test_close_spider_bumps_version(self):
+        """A crawl that wrote items starts a new catalog version, an empty one does not."""
+        pipeline = await self.make_pipeline(batch_size=100)
+        version = await sync_to_async(catalog_version)()
+
+        await pipeline._close_spider(self.spider)
+        self.assertEqual(await sync_to_async(catalog_version)(), version)
+
+        await pipeline.process_item(make_item('1'), self.spider)
+        await pipeline._close_spider(self.spider)
+        self.assertNotEqual(await sync_to_async(catalog_version)(), version)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CatalogRefreshTest(PipelineTestCase):
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+        self.store = Store.objects.create(name='Xbox Store', base_url='https://www.xbox.com')
+        self.platform = Platform.objects.get()
+
+    def create_game(self, title, release_date, discounts=()):
+        game = Game.objects.create(title=title, release_date=release_date, short_description=f'About {title}')
+        for region, current in zip(Region.objects.order_by('code'), discounts):
+            Price.objects.create(
+                game=game, platform=self.platform, region=region, store=self.store,
+                base_price=Decimal('100'), current_price=Decimal(current),
+            )
+        return game
+
+    def test_refresh(self):
+        for i in range(6):
+            self.create_game(f'Game {i}', f'202{i}-01-01', discounts=['50', str(90 - i)])
+        self.create_game('Future', '2999-01-01')
+        Game.objects.create(title='')
+
+        refresh_catalog()
+
+        stats = CatalogStats.objects.get()
+        self.assertEqual((stats.total_games, stats.total_regions, stats.total_platforms), (7, 2, 1))
+        latest = FeaturedGame.objects.filter(section=FeaturedGame.LATEST)
+        self.assertEqual([row.title for row in latest], ['Game 5', 'Game 4', 'Game 3', 'Game 2'])
+        self.assertEqual(latest[0].summary, 'About Game 5')
+        # Every game is 50% off in Turkey, its best deal
+        discounted = FeaturedGame.objects.filter(section=FeaturedGame.DISCOUNTED)
+        self.assertEqual(len(discounted), 4)
+        self.assertEqual(
+            (discounted[0].currency_symbol, discounted[0].current_price, discounted[0].discount_percentage),
+            ('₺', Decimal('50'), Decimal('50')),
+        )
+
+        # Refreshing again replaces the rows
+        Game.objects.filter(title='Game 5').delete()
+        refresh_catalog()
+        self.assertEqual(CatalogStats.objects.get().total_games, 6)
+        self.assertEqual(FeaturedGame.objects.filter(section=FeaturedGame.LATEST).first().title, 'Game 4')
+
+    def test_index(self):
+        game = self.create_game('Deal', '2020-01-01', discounts=['60'])
+        refresh_catalog()
+
+        response = self.client.get(reverse('index'), secure=True)
+        self.assertEqual(response.context['total_games'], 1)
+        self.assertContains(response, reverse('game_detail', args=[game.pk]), count=2)
+        self.assertContains(response, '-40%')
+        self.assertContains(response, '₺60.00')
+
+    async def test_close_spider_refreshes(self):
+        pipeline = await self.make_pipeline(batch_size=100)
+        await pipeline.process_item(make_item('1', title='Scraped'), self.spider)
+        await pipeline._close_spider(self.spider)
+
+        self.assertEqual((await CatalogStats.objects.aget()).total_games, 1)
+        self.assertEqual((await FeaturedGame.objects.aget()).title, 'Scraped')
+
+
+# The pages served by the async views, for AsyncViewsTest
+urlpatterns = page_urls(async_views)
+
+
+@override_settings(ROOT_URLCONF=__name__, CACHES=TEST_CACHES)
+class AsyncViewsTest(ViewQueryCountTest):
+    """The async views run the same queries as the sync views and render the same pages."""
+
+    def test_same_pages(self):
+        game = Game.objects.get(product_id='1')
+        urls = [
+            reverse('index'),
+            reverse('games'),
+            reverse('games') + '?ordering=title&page=2',
+            reverse('games') + '?ordering=discount&paginate=cursor',
+            reverse('game_detail', args=[game.pk]),
+            reverse('search') + '?q=game',
+            reverse('search'),
+        ]
+        for url in urls:
+            clear_caches()
+            response = self.client.get(url, secure=True)
+            clear_caches()
+            with override_settings(ROOT_URLCONF='Diffly.urls'):
+                expected = self.client.get(url, secure=True)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.content.decode(), expected.content.decode(), url)
+
+    async def test_async_client(self):
+        response = await self.async_client.get(reverse('games') + '?ordering=title', secure=True)
+        self.assertEqual([game.title for game in response.context['game_list']][:2], ['Game 0', 'Game 1'])
+
+        response = await self.async_client.get(reverse('game_detail', args=[0]), secure=True)
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get(reverse('games') + '?cursor=not-a-cursor', secure=True)
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(QUERY_PROFILING=True)
+    async def test_query_profiling(self):
+        with self.assertLogs('diffly.queries'):
+            response = await self.async_client.get(reverse('games'), secure=True)
+        self.assertIn('desc="3 queries"', response['Server-Timing'])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class KeysetPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Duplicate titles, discounts and release dates, and missing release dates, to exercise tie-breaking
+        for i in range(23):
+            Game.objects.create(
+                title=f'Game {i % 5}',
+                release_date=None if i % 4 == 0 else f'20{10 + i % 3}-01-01',
+                max_discount_percentage=i % 3 * 10,
+            )
+
+    def setUp(self):
+        clear_caches()
+
+    def titles_and_pks(self, response):
+        return [(game.title, game.pk) for game in response.context['game_list']]
+
+    def get(self, ordering, **params):
+        if ordering != '-release_date':
+            # The default ordering is redirected away
+            params['ordering'] = ordering
+        response = self.client.get(reverse('games'), params, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def walk(self, ordering):
+        """Follow the next cursors from the first page, checking the cost of every page."""
+        response = self.get(ordering, paginate='cursor')
+        rows = self.titles_and_pks(response)
+        while response.context['page_obj'].has_next():
+            cursor = response.context['page_obj'].next_cursor
+            # Games and prices, the count comes from the cache
+            with self.assertNumQueries(2):
+                response = self.get(ordering, cursor=cursor)
+            rows += self.titles_and_pks(response)
+        return rows
+
+    def test_cursor_pages_match_offset_pages(self):
+        """Walking all cursor pages yields the same rows in the same order as page numbers."""
+        for ordering in ORDERINGS:
+            with patch.object(GameListView, 'paginate_by', 100):
+                response = self.get(ordering)
+            expected = self.titles_and_pks(response)
+
+            with patch.object(GameListView, 'paginate_by', 4):
+                self.assertEqual(self.walk(ordering), expected, ordering)
+            self.assertEqual(len(expected), 23)
+
+    def test_invalid_cursor(self):
+        for cursor in ['not-a-cursor', 'WyJ4Il0', 'WyJ4IiwiMSJd']:
+            response = self.client.get(reverse('games'), {'ordering': 'release_date', 'cursor': cursor}, secure=True)
+            self.assertEqual(response.status_code, 404, cursor)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ApiTest(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i in range(5):
+            game = Game.objects.create(title=f'Halo {i}', product_id=str(i), release_date=f'202{i}-01-01')
+            Price.objects.create(game=game, platform=cls.platform, region=cls.us, store=cls.store,
+                                 base_price=Decimal('60'), current_price=Decimal('30' if i == 2 else '60'))
+            Price.objects.create(game=game, platform=cls.platform, region=cls.tr, store=cls.store,
+                                 base_price=Decimal('900'), current_price=Decimal('900'))
+        cls.game = Game.objects.get(product_id='2')
+
+    def setUp(self):
+        clear_caches()
+
+    def get(self, name, *args, params=None, **headers):
+        return self.client.get(reverse(name, args=args), params or {}, secure=True, headers=headers)
+
+    def test_list_follows_cursors(self):
+        response = self.get('api_games', params={'ordering': 'title', 'limit': 2})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        data = response.json()
+        self.assertEqual(data['count'], 5)
+        titles = [game['title'] for game in data['results']]
+        while data['next']:
+            data = self.client.get(data['next'], secure=True).json()
+            titles += [game['title'] for game in data['results']]
+        self.assertEqual(titles, [f'Halo {i}' for i in range(5)])
+        self.assertNotIn('title_lower', data['results'][0])
+
+    def test_list_filters(self):
+        data = self.get('api_games', params={'discounted': 'true'}).json()
+        self.assertEqual([game['product_id'] for game in data['results']], ['2'])
+        self.assertEqual(data['results'][0]['max_discount_percentage'], '50.00')
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.get('api_games', params={'limit': 'x'}).status_code, 400)
+        self.assertEqual(self.get('api_games', params={'cursor': 'bad'}).status_code, 400)
+
+    def test_search(self):
+        data = self.get('api_search', params={'q': 'halo 3'}).json()
+        self.assertEqual([game['title'] for game in data['results']], ['Halo 3'])
+
+    def test_detail_and_prices(self):
+        data = self.get('api_game_detail', self.game.pk).json()
+        self.assertEqual(data['title'], 'Halo 2')
+        self.assertEqual({price['region'] for price in data['prices']}, {'US', 'TR'})
+
+        data = self.get('api_game_prices', self.game.pk, params={'region': 'us'}).json()
+        self.assertEqual(len(data['prices']), 1)
+        self.assertEqual(data['prices'][0]['current_price'], '30.00')
+        self.assertTrue(data['prices'][0]['is_on_sale'])
+
+        self.assertEqual(self.get('api_game_detail', 999).status_code, 404)
+        self.assertEqual(self.get('api_game_prices', 999).status_code, 404)
+
+    def test_conditional_get(self):
+        """A matching If-None-Match costs the ETag query only, and a price change changes the ETag."""
+        for name, args, queries in [('api_games', [], 0), ('api_game_detail', [self.game.pk], 1)]:
+            response = self.get(name, *args)
+            etag = response['ETag']
+            self.assertIn('public', response['Cache-Control'])
+            self.assertIn('max-age=', response['Cache-Control'])
+
+            with self.assertNumQueries(queries):
+                cached = self.get(name, *args, if_none_match=etag)
+            self.assertEqual(cached.status_code, 304)
+            self.assertEqual(cached.content, b'')
+
+            price = Price.objects.filter(game=self.game).first()
+            price.current_price = price.current_price - 1
+            with self.captureOnCommitCallbacks(execute=True):
+                price.save()
+            self.assertEqual(self.get(name, *args, if_none_match=etag).status_code, 200)
+
+    def test_list_etag_follows_catalog_version(self):
+        """Bulk updates send no signals, the commands running them bump the version."""
+        etag = self.get('api_games', params={'ordering': 'price'})['ETag']
+        Game.objects.update(min_normalized_price=1)
+        self.assertEqual(self.get('api_games', params={'ordering': 'price'}, if_none_match=etag).status_code, 304)
+        bump_catalog_version()
+        self.assertEqual(self.get('api_games', params={'ordering': 'price'}, if_none_match=etag).status_code, 200)
+
+
+class ExportCommandTest(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i in range(5):
+            game = Game.objects.create(title=f'Game {i}', product_id=str(i))
+            GameImage.objects.create(game=game, image_type='box_art', url=f'https://img/{i}/box')
+            Price.objects.create(game=game, platform=cls.platform, region=cls.us, store=cls.store,
+                                 base_price=Decimal('60'), current_price=Decimal('45'))
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = Path(directory.name)
+
+    def export(self, *args, **options):
+        call_command('export', *args, output=str(self.output), chunk_size=2, stdout=StringIO(), **options)
+
+    def test_ndjson(self):
+        self.export('game', 'price')
+
+        games = [json.loads(line) for line in (self.output / 'game.ndjson').read_text().splitlines()]
+        self.assertEqual([game['title'] for game in games], [f'Game {i}' for i in range(5)])
+        prices = [json.loads(line) for line in (self.output / 'price.ndjson').read_text().splitlines()]
+        self.assertEqual(len(prices), 5)
+        self.assertEqual(prices[0]['current_price'], '45.00')
+        self.assertEqual(prices[0]['discount_percentage'], '25.00')
+
+    def test_gzipped_csv(self):
+        self.export(format='csv', gzip=True)
+
+        for table, count in [('game', 5), ('price', 5), ('region', 2), ('image', 5)]:
+            with gzip.open(self.output / f'{table}.csv.gz', 'rt', newline='') as file:
+                rows = list(csv.reader(file))
+            self.assertEqual(len(rows), count + 1, table)
+        self.assertIn('game_id', rows[0])
+
+    def test_since_watermark(self):
+        """Only rows changed at or after the watermark are exported."""
+        watermark = timezone.now()
+        Game.objects.filter(product_id='3').update(updated_at=watermark + timedelta(seconds=1))
+        stdout = StringIO()
+        call_command('export', 'game', 'image', output=str(self.output), since=watermark.isoformat(), stdout=stdout)
+
+        games = (self.output / 'game.ndjson').read_text().splitlines()
+        self.assertEqual([json.loads(line)['product_id'] for line in games], ['3'])
+        self.assertEqual(len((self.output / 'image.ndjson').read_text().splitlines()), 1)
+        self.assertIn('watermark', stdout.getvalue())
+
+        with self.assertRaises(CommandError):
+            self.export(since='yesterday')
+
+    def test_since_derived_columns(self):
+        """A game whose deal columns change with the price of another region is exported as changed, one whose
+        derived columns stay the same is not."""
+        Game.refresh_primary_images(Game.objects.values('pk'))
+        yesterday = timezone.now() - timedelta(days=1)
+        Game.objects.update(updated_at=yesterday)
+        game = Game.objects.get(product_id='3')
+        Price.objects.create(game=game, platform=self.platform, region=self.tr, store=self.store,
+                             base_price=Decimal('1000'), current_price=Decimal('250'))
+        Game.refresh_normalized_prices()
+        Game.refresh_primary_images(Game.objects.values('pk'))
+        self.export('game', since=(yesterday + timedelta(seconds=1)).isoformat())
+
+        games = [json.loads(line) for line in (self.output / 'game.ndjson').read_text().splitlines()]
+        self.assertEqual([(game['product_id'], game['max_discount_percentage']) for game in games], [('3', '75.00')])
+
+    def test_parquet(self):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            with self.assertRaisesMessage(CommandError, 'pyarrow'):
+                self.export('game', format='parquet')
+            return
+
+        self.export('game', 'price', format='parquet')
+        self.assertEqual(pq.read_table(self.output / 'game.parquet').num_rows, 5)
+        prices = pq.read_table(self.output / 'price.parquet').to_pydict()
+        self.assertEqual(prices['current_price'], [Decimal('45.00')] * 5)
+
+    @override_settings(PRICE_COMPARISON_CURRENCY='USD')
+    def test_normalized_prices(self):
+        price = Price.objects.first()
+        Price.objects.create(game=price.game, platform=self.platform, region=self.tr, store=self.store,
+                             base_price=Decimal('1800'), current_price=Decimal('1800'))
+        ExchangeRate.objects.create(currency_code='TRY', date='2025-01-01', rate=Decimal('40'))
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            with self.assertRaisesMessage(CommandError, 'numpy'):
+                self.export('price', normalize=True)
+            return
+
+        self.export('price', normalize=True)
+        prices = [json.loads(line) for line in (self.output / 'price.ndjson').read_text().splitlines()]
+        self.assertEqual([price['normalized_current_price'] for price in prices], [45.0] * 5 + [45.0])
+
+
+class GameFilterTest(CatalogTestCase):
+    # Parameters enabling each filter, for the query plan test
+    EXAMPLES = {
+        'discounted': {'discounted': 'true'},
+        'min_discount': {'min_discount': '50'},
+        'release_year': {'release_year': '2020'},
+        'released_after': {'released_after': '2021-06-01'},
+        'released_before': {'released_before': '2019-12-31'},
+        'region': {'region': 'TR', 'min_price': '100', 'max_price': '500'},
+        'publisher': {'publisher': 'Pub A'},
+        'developer': {'developer': 'Dev B'},
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        games = [
+            # title, release date, publisher, developer, US price, TR price
+            ('Old', '2019-05-01', 'Pub A', 'Dev A', ('20', '20'), ('300', '300')),
+            ('Start of 2020', '2020-01-01', 'Pub A', 'Dev B', ('60', '30'), ('600', '600')),
+            ('End of 2020', '2020-12-31', 'Pub B', 'Dev B', ('60', '60'), ('600', '150')),
+            ('New', '2022-01-01', 'Pub B', 'Dev A', ('60', '12'), None),
+        ]
+        for title, release_date, publisher, developer, *prices in games:
+            game = Game.objects.create(
+                title=title, release_date=release_date, publisher_name=publisher, developer_name=developer,
+            )
+            for region, price in zip([cls.us, cls.tr], prices):
+                if price:
+                    Price.objects.create(
+                        game=game, platform=cls.platform, region=region, store=cls.store,
+                        base_price=Decimal(price[0]), current_price=Decimal(price[1]),
+                    )
+
+    def titles(self, **params):
+        return sorted(Game.objects.filter(pk__in=filter_games(Game.objects.listed(), params)).values_list('title', flat=True))
+
+    def test_filters(self):
+        self.assertEqual(self.titles(discounted='true'), ['End of 2020', 'New', 'Start of 2020'])
+        self.assertEqual(self.titles(discounted='false'), ['Old'])
+        self.assertEqual(self.titles(min_discount='75'), ['End of 2020', 'New'])
+        self.assertEqual(self.titles(release_year='2020'), ['End of 2020', 'Start of 2020'])
+        self.assertEqual(self.titles(released_after='2020-06-01', released_before='2021-01-01'), ['End of 2020'])
+        self.assertEqual(self.titles(region='TR'), ['End of 2020', 'Old', 'Start of 2020'])
+        self.assertEqual(self.titles(region='TR', min_price='100', max_price='500'), ['End of 2020', 'Old'])
+        self.assertEqual(self.titles(region='US', max_price='20'), ['New', 'Old'])
+        self.assertEqual(self.titles(publisher='Pub A', developer='Dev B'), ['Start of 2020'])
+
+    def test_invalid_values_are_ignored(self):
+        everything = self.titles()
+        for params in [
+            {'discounted': 'maybe'}, {'min_discount': 'NaN'}, {'release_year': '20x0'}, {'release_year': '99999'},
+            {'released_after': '2020-13-01'},
+        ]:
+            self.assertEqual(self.titles(**params), everything, params)
+
+    def test_invalid_price_bound_keeps_the_region(self):
+        self.assertEqual(self.titles(region='TR', max_price='cheap'), ['End of 2020', 'Old', 'Start of 2020'])
+        self.assertEqual(self.titles(region='TR', min_price='200', max_price='NaN'), ['Old', 'Start of 2020'])
+
+    def test_filters_use_their_index(self):
+        self.assertEqual(set(self.EXAMPLES), {game_filter.params[0] for game_filter in FILTERS})
+        for game_filter in FILTERS:
+            queryset = filter_games(Game.objects.listed(), self.EXAMPLES[game_filter.params[0]])
+            self.assertIn(game_filter.index, queryset.explain(), game_filter.params[0])
+
+    def test_release_year_is_a_date_range(self):
+        sql = str(filter_games(Game.objects.all(), {'release_year': '2020'}).query)
+        self.assertIn('"release_date" >= 2020-01-01', sql)
+        self.assertIn('"release_date" < 2021-01-01', sql)
+
+    def test_empty_filters_are_redirected(self):
+        response = self.client.get(reverse('games'), {'min_discount': '', 'region': 'TR', 'max_price': ''}, secure=True)
+        self.assertRedirects(response, reverse('games') + '?region=TR', fetch_redirect_response=False)
+
+
+@override_settings(CACHES=TEST_CACHES, PRICE_COMPARISON_CURRENCY='USD', HOME_REGION='US')
+class PriceComparisonTest(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        regions = {
+            'US': cls.us,
+            'TR': cls.tr,
+            # No exchange rate
+            'DE': Region.objects.create(name='Germany', code='DE', currency_code='EUR', currency_symbol='€'),
+        }
+        ExchangeRate.objects.create(currency_code='TRY', date='2025-01-01', rate=Decimal('20'))
+        ExchangeRate.objects.create(currency_code='TRY', date='2025-06-01', rate=Decimal('40'))
+        games = [
+            ('Cheaper abroad', {'US': '60', 'TR': '1200', 'DE': '50'}),
+            ('Cheaper at home', {'US': '20', 'TR': '1000'}),
+            ('Not sold at home', {'TR': '400'}),
+        ]
+        for title, prices in games:
+            game = Game.objects.create(title=title)
+            for code, price in prices.items():
+                Price.objects.create(
+                    game=game, platform=cls.platform, region=regions[code], store=cls.store,
+                    base_price=Decimal(price), current_price=Decimal(price),
+                )
+
+    def setUp(self):
+        clear_caches()
+
+    def test_compare_prices(self):
+        game = Game.objects.get(title='Cheaper abroad')
+        with self.assertNumQueries(1):
+            comparison = compare_prices(game)
+            codes = [price.region.code for price in comparison.prices]
+
+        # The price without a rate is listed last, unconverted
+        self.assertEqual(codes, ['TR', 'US', 'DE'])
+        self.assertEqual(
+            [price.normalized_current_price for price in comparison.prices], [Decimal('30'), Decimal('60'), None]
+        )
+        self.assertEqual(comparison.cheapest.region.code, 'TR')
+        self.assertEqual(comparison.home.region.code, 'US')
+        self.assertEqual(comparison.savings, Decimal('30'))
+        self.assertEqual(comparison.savings_percentage, 50)
+
+    def test_savings_without_cheaper_or_home_region(self):
+        cheaper_at_home = compare_prices(Game.objects.get(title='Cheaper at home'))
+        self.assertEqual(cheaper_at_home.cheapest.region.code, 'US')
+        self.assertEqual(cheaper_at_home.savings, 0)
+
+        not_sold_at_home = compare_prices(Game.objects.get(title='Not sold at home'))
+        self.assertEqual(not_sold_at_home.cheapest.region.code, 'TR')
+        self.assertIsNone(not_sold_at_home.home)
+        self.assertIsNone(not_sold_at_home.savings)
+
+    def test_cheapest_region_of_a_page(self):
+        with self.assertNumQueries(1):
+            games = list(with_cheapest_region(Game.objects.order_by('title')))
+        self.assertEqual(
+            [(game.cheapest_region, game.cheapest_price, game.home_price) for game in games],
+            [('TR', Decimal('30'), Decimal('60')), ('US', Decimal('20'), Decimal('20')), ('TR', Decimal('10'), None)],
+        )
+
+    def test_dated_rates(self):
+        """Prices are normalized at the latest rates, or at the latest rates of a past date."""
+        prices = Price.objects.filter(game__title='Cheaper abroad', region__code='TR')
+        self.assertEqual(with_normalized_prices(prices).get().normalized_current_price, Decimal('30'))
+        self.assertEqual(with_normalized_prices(prices, on='2025-03-01').get().normalized_current_price, Decimal('60'))
+        self.assertIsNone(with_normalized_prices(prices, on='2024-12-31').get().normalized_current_price)
+        self.assertEqual(rates_on(), {'USD': 1, 'TRY': Decimal('40')})
+        self.assertEqual(rates_on('2025-03-01'), {'USD': 1, 'TRY': Decimal('20')})
+
+    def test_sort_by_cheapest(self):
+        Game.refresh_normalized_prices()
+        self.assertEqual(
+            list(Game.objects.order_by('min_normalized_price').values_list('title', 'min_normalized_price')),
+            [('Not sold at home', Decimal('10')), ('Cheaper at home', Decimal('20')), ('Cheaper abroad', Decimal('30'))],
+        )
+        view = GameListView()
+        view.setup(RequestFactory().get('/games/', {'ordering': 'price'}))
+        queryset = view.get_queryset()
+        self.assertIn('games_game_min_price_idx', queryset.explain())
+        self.assertEqual([game.title for game in queryset][0], 'Not sold at home')
+
+    def test_pages(self):
+        game = Game.objects.get(title='Cheaper abroad')
+        response = self.client.get(reverse('game_detail', args=[game.pk]), secure=True)
+        self.assertContains(response, '≈ 30.00 USD')
+        self.assertContains(response, 'Save 30.00 USD (50%) over United States')
+
+        response = self.client.get(reverse('games'), secure=True)
+        self.assertContains(response, '<span class="text-white font-semibold">TR</span>', count=2)
+
+
+@override_settings(CACHES=TEST_CACHES, PRICE_COMPARISON_CURRENCY='USD')
+class LoadExchangeRatesCommandTest(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.game = Game.objects.create(title='Game')
+        Price.objects.create(game=cls.game, platform=cls.platform, region=cls.tr, store=cls.store,
+                             base_price=Decimal('900'), current_price=Decimal('900'))
+
+    def setUp(self):
+        clear_caches()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write(self, name, content):
+        path = self.directory / name
+        path.write_text(content)
+        return str(path)
+
+    def test_load(self):
+        self.assertIsNone(Game.objects.get(pk=self.game.pk).min_normalized_price)
+        version = catalog_version()
+        csv_path = self.write('rates.csv', 'currency_code,date,rate\ntry,2025-01-01,30\nEUR,2025-01-01,0.9\n')
+        json_path = self.write('rates.json', json.dumps([{'currency_code': 'TRY', 'date': '2025-02-01', 'rate': '45'}]))
+        stdout = StringIO()
+        call_command('load_exchange_rates', csv_path, json_path, stdout=stdout)
+
+        self.assertIn('Loaded 3 rates of 2 currencies', stdout.getvalue())
+        self.assertEqual(ExchangeRate.objects.count(), 3)
+        self.assertEqual(Game.objects.get(pk=self.game.pk).min_normalized_price, Decimal('20'))
+        self.assertNotEqual(catalog_version(), version)
+
+        # Reloading a date replaces its rate
+        call_command('load_exchange_rates', self.write('fix.csv', 'currency_code,date,rate\nTRY,2025-02-01,36\n'),
+                     stdout=StringIO())
+        self.assertEqual(ExchangeRate.objects.count(), 3)
+        self.assertEqual(Game.objects.get(pk=self.game.pk).min_normalized_price, Decimal('25'))
+
+    def test_admin_edits_reprice_games(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='secret'))
+        version = catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:games_exchangerate_add'), {
+                'currency_code': 'TRY', 'date': '2025-01-01', 'rate': '30',
+            }, secure=True)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Game.objects.get(pk=self.game.pk).min_normalized_price, Decimal('30'))
+        self.assertNotEqual(catalog_version(), version)
+
+        rate = ExchangeRate.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:games_exchangerate_delete', args=[rate.pk]), {'post': 'yes'}, secure=True)
+        self.assertIsNone(Game.objects.get(pk=self.game.pk).min_normalized_price)
+
+    def test_invalid_files(self):
+        for name, content in [
+            ('missing.csv', 'currency_code,rate\nTRY,30\n'),
+            ('date.csv', 'currency_code,date,rate\nTRY,2025-13-01,30\n'),
+            ('rate.csv', 'currency_code,date,rate\nTRY,2025-01-01,-1\n'),
+            ('object.json', '{"TRY": 30}'),
+            ('rates.txt', 'TRY 30'),
+        ]:
+            with self.assertRaises(CommandError, msg=name):
+                call_command('load_exchange_rates', self.write(name, content), stdout=StringIO())
+        self.assertFalse(ExchangeRate.objects.exists())
+
+
+class PriceDropAlertTest(PipelineTestCase):
+    async def test_pipeline_records_drops(self):
+        """Lower current prices overwritten by a batch are recorded, new and higher prices are not."""
+        pipeline = await self.make_pipeline(batch_size=100)
+        await self.run_items(pipeline, [
+            make_item('1', base=80, current=80),
+            make_item('1', region='tr-TR', base=1000, current=1000),
+        ])
+        self.assertFalse(await PriceDropEvent.objects.aexists())
+
+        await self.run_items(pipeline, [
+            make_item('1', base=80, current=60),
+            make_item('1', region='tr-TR', base=1000, current=1200),
+            make_item('2', base=80, current=40),
+        ])
+        drop = await PriceDropEvent.objects.select_related('game', 'region').aget()
+        self.assertEqual(
+            (drop.game.product_id, drop.region.code, drop.previous_price, drop.current_price),
+            ('1', 'US', Decimal('80'), Decimal('60')),
+        )
+        self.assertEqual(pipeline.stats['en-US']['drops'], 1)
+
+        user = await User.objects.acreate(username='watcher')
+        await Watchlist.objects.acreate(user=user, game=drop.game, region=drop.region, threshold=Decimal('70'))
+        await pipeline._close_spider(self.spider)
+        notification = await NotificationOutbox.objects.aget()
+        self.assertEqual((notification.user_id, notification.event_id), (user.pk, drop.pk))
+
+    async def test_matching_failure_does_not_stop_the_refresh(self):
+        pipeline = await self.make_pipeline(batch_size=100)
+        version = await sync_to_async(catalog_version)()
+        await pipeline.process_item(make_item('1', title='Scraped'), self.spider)
+        with patch('scrapers.xbox.xbox.pipelines.match_price_drops', side_effect=DatabaseError('timeout')), \
+                self.assertLogs(self.spider.logger.logger, 'ERROR'):
+            await pipeline._close_spider(self.spider)
+
+        self.assertEqual((await FeaturedGame.objects.aget()).title, 'Scraped')
+        self.assertNotEqual(await sync_to_async(catalog_version)(), version)
+
+    def make_event(self, game, region, previous, current):
+        return PriceDropEvent.objects.create(
+            game=game, region=region, previous_price=Decimal(previous), current_price=Decimal(current),
+        )
+
+    def test_matching(self):
+        """Only the entries of the game and region whose threshold the drop crossed are notified, once."""
+        us, tr = Region.objects.get(code='US'), Region.objects.get(code='TR')
+        game, other = Game.objects.create(title='Watched'), Game.objects.create(title='Other')
+        watches = {}
+        for name, watch_game, region, threshold in [
+            ('crossed', game, us, '70'),
+            ('not reached', game, us, '50'),
+            ('already below', game, us, '90'),
+            ('other region', game, tr, '5000'),
+            ('other game', other, us, '70'),
+        ]:
+            user = User.objects.create_user(name)
+            watches[name] = Watchlist.objects.create(user=user, game=watch_game, region=region, threshold=threshold)
+        event = self.make_event(game, us, '80', '60')
+        self.make_event(game, tr, '1000', '900')
+
+        self.assertEqual(match_price_drops(batch_size=1), 1)
+        notification = NotificationOutbox.objects.get()
+        self.assertEqual((notification.watch, notification.event), (watches['crossed'], event))
+        self.assertFalse(PriceDropEvent.objects.filter(matched_at=None).exists())
+
+        # Matched events are not matched again
+        self.assertEqual(match_price_drops(), 0)
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+
+    def test_matching_uses_the_watch_index(self):
+        event = self.make_event(Game.objects.create(title='Watched'), Region.objects.get(code='US'), '80', '60')
+        self.assertIn('games_watchlist_match_idx', crossed_thresholds([event.pk]).explain())
+
+
+class ExplainViewsCommandTest(CatalogTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i in range(40):
+            game = Game.objects.create(title=f'Halo {i}', release_date=f'20{10 + i % 15}-01-01')
+            Price.objects.create(
+                game=game, platform=cls.platform, region=cls.us, store=cls.store,
+                base_price=Decimal('80'), current_price=Decimal('60' if i % 2 else '80'),
+            )
+        refresh_catalog()
+
+    def explain(self, *args):
+        stdout = StringIO()
+        call_command('explain_views', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_views_use_indexes(self):
+        output = self.explain('--fail')
+        self.assertIn('list ordering=title: games_game_title_lower_idx', output)
+        self.assertIn('list ordering=-title cursor: games_game_title_lower_idx', output)
+        self.assertIn('list ordering=release_date: games_game_release_idx', output)
+        self.assertIn('refresh discounted prices: games_price_on_sale_idx', output)
+        self.assertIn('No sequential scans on large tables', output)
+
+    def test_reports_seq_scans_and_missing_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX games_game_title_lower_idx')
+
+        output = self.explain()
+        self.assertIn('list ordering=title: no index, sort\n  seq scan on games_game', output)
+        self.assertIn('missing index games_game_title_lower_idx on games_game', output)
+        with self.assertRaisesMessage(CommandError, 'sequential scans or missing indexes'):
+            self.explain('--fail')
+
+
+@override_settings(CACHES=TEST_CACHES, QUERY_PROFILING=True, QUERY_PROFILING_THRESHOLD=2)
+class QueryProfilingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            Game.objects.create(title=f'Game {i}', release_date='2020-01-01')
+
+    def setUp(self):
+        clear_caches()
+
+    def server_timing(self, response):
+        return dict(
+            (part.split(';')[0].strip(), part) for part in response['Server-Timing'].split(',')
+        )
+
+    def test_server_timing_and_log(self):
+        with self.assertLogs('diffly.queries', 'INFO') as logs:
+            response = self.client.get(reverse('games'), secure=True)
+
+        timing = self.server_timing(response)
+        self.assertIn('desc="3 queries"', timing['db'])
+        self.assertIn('tpl;dur=', timing['tpl'])
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['queries'], 3)
+        self.assertTrue(entry['over_threshold'])
+        self.assertEqual(logs.records[0].levelname, 'WARNING')
+        self.assertGreater(entry['template_ms'], 0)
+
+    def test_duplicates_are_reported(self):
+        """Repeated statements, as in an N+1, are reported with their count."""
+        def view(request):
+            for game in Game.objects.all():
+                game.prices.first()
+            return HttpResponse()
+
+        with self.assertLogs('diffly.queries') as logs:
+            response = QueryProfilingMiddleware(view)(RequestFactory().get('/'))
+
+        self.assertIn('dup;desc="2 duplicated"', response['Server-Timing'])
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['queries'], 4)
+        self.assertEqual(entry['duplicates'][0]['count'], 3)
+
+    @override_settings(QUERY_PROFILING=False)
+    def test_header_toggle(self):
+        """The request header enables profiling for staff only."""
+        self.assertNotIn('Server-Timing', self.client.get(reverse('games'), secure=True))
+        headers = {'X-Profile-Queries': '1'}
+        self.assertNotIn('Server-Timing', self.client.get(reverse('games'), secure=True, headers=headers))
+
+        staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        with self.assertLogs('diffly.queries'):
+            response = self.client.get(reverse('games'), secure=True, headers=headers)
+        self.assertIn('Server-Timing', response)
@@ -1,11 +1,24 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import api, async_views, views
+
+
+def page_urls(pages):
+    """Routes of the HTML pages served by the ``pages`` views module."""
+    return [
+        path("", pages.index, name="index"),
+        path("games/", pages.GameListView.as_view(), name="games"),
+        path("games/<int:pk>/", pages.GameDetailView.as_view(), name="game_detail"),
+        path("search/", pages.SearchView.as_view(), name="search"),
+    ]
+
 
 urlpatterns = [
-    path("", views.index, name="index"),
-    path("games/", views.GameListView.as_view(), name="games"),
-    path("games/<int:pk>/", views.GameDetailView.as_view(), name="game_detail"),
-    path("search/", views.SearchView.as_view(), name="search"),
+    *page_urls(async_views if settings.ASYNC_VIEWS else views),
+    path("api/games/", api.game_list, name="api_games"),
+    path("api/games/<int:pk>/", api.game_detail, name="api_game_detail"),
+    path("api/games/<int:pk>/prices/", api.game_prices, name="api_game_prices"),
+    path("api/search/", api.game_search, name="api_search"),
     # path("about/", views.about, name="about"),
 ]
\ No newline at end of file
@@ -1,64 +1,38 @@
-from django.db.models import Prefetch, Q, F
+from django.conf import settings
+from django.core.paginator import InvalidPage
 from django.db.models.functions import Lower
-from django.shortcuts import render, redirect
-from django.utils import timezone
+from django.http import Http404
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
 from django.views import generic
 
-from apps.games.models import Game, Price, GameImage, Region, Platform
+from apps.games.cache import get_or_set
+from apps.games.catalog import home_context
+from apps.games.filters import FILTER_PARAMS, filter_games
+from apps.games.models import Game
+from apps.games.pagination import CachedCountPaginator, KeysetPaginator, SortKey, order_by_keys
+from apps.games.pricing import compare_prices, with_cheapest_region
+from apps.games.search import search_games
 
 
 def index(request):
-    latest_releases = Game.objects.exclude(
-        title__isnull=True
-    ).exclude(
-        title__exact=""
-    ).exclude(
-        release_date__exact=None
-    ).filter(
-     release_date__lte=timezone.now()
-    ).prefetch_related(
-        Prefetch(
-            'images',
-            queryset=GameImage.objects.filter(
-                image_type__in=['box_art', 'poster', 'hero_art']
-            )
-        )
-    ).order_by('-release_date')[:4]
-
-    discounted_games = Game.objects.exclude(
-        title__isnull=True
-    ).exclude(
-        title__exact=""
-    ).filter(
-        prices__is_on_sale=True,
-        prices__discount_percentage__gt=0
-    ).prefetch_related(
-        Prefetch(
-            'images',
-            queryset=GameImage.objects.filter(
-                image_type__in=['box_art', 'poster', 'hero_art']
-            )
-        ),
-        Prefetch(
-            'prices',
-            queryset=Price.objects.filter(
-                is_on_sale=True
-            ).select_related('region')
-        )
-    ).distinct().order_by('-prices__discount_percentage')[:4]
-
-    total_games = Game.objects.exclude(title__isnull=True).exclude(title__exact="").count()
-    total_regions = Region.objects.all().count()
-    total_platforms = Platform.objects.all().count()
-
-    context = {
-        'latest_releases': latest_releases,
-        'discounted_games': discounted_games,
-        'total_games': total_games,
-        'total_regions': total_regions,
-        'total_platforms': total_platforms,
-    }
-    return render(request, 'games/index.html', context)
+    return TemplateResponse(request, 'games/index.html', get_or_set('home', home_context))
+
+
+# Sort keys of the list orderings, all ending with the primary key so keyset pagination is stable
+ORDERINGS = {
+    'title': [SortKey('title_lower', expression=Lower('title')), SortKey('pk')],
+    '-title': [SortKey('title_lower', descending=True, expression=Lower('title')), SortKey('pk', descending=True)],
+    'discount': [SortKey('max_discount_percentage', descending=True), SortKey('pk')],
+    'release_date': [SortKey('release_date', nulls_last=True), SortKey('pk')],
+    '-release_date': [SortKey('release_date', descending=True, nulls_last=True), SortKey('pk')],
+    'price': [SortKey('min_normalized_price', nulls_last=True), SortKey('pk')],
+}
+
+
+def list_sort_keys(params):
+    """Sort keys of the ``ordering`` in the query ``params``, newest releases first by default."""
+    return ORDERINGS.get(params.get('ordering'), ORDERINGS['-release_date'])
 
 
 class GameListView(generic.ListView):
@@ -66,50 +40,25 @@ class GameListView(generic.ListView):
     template_name = 'games/game_list.html'
     context_object_name = 'game_list'
     paginate_by = 30
+    paginator_class = CachedCountPaginator
 
     def get_queryset(self):
-        qs = super().get_queryset().exclude(title__exact="").exclude(title__isnull=True)
-
-        # Filters
-        discounted = self.request.GET.get('discounted')
-        release_year = self.request.GET.get('release_year')
-
-        if discounted == 'true':
-            qs = qs.filter(prices__discount_percentage__gt=0, prices__is_on_sale=True)
-        elif discounted == 'false':
-            qs = qs.filter(Q(prices__is_on_sale=False) | Q(prices__isnull=True))
-
-        if release_year:
-            qs = qs.filter(release_date__year=release_year)
-
-        # Ordering
-        ordering = self.request.GET.get('ordering')
-
-        if ordering == 'title':
-            qs = qs.order_by(Lower('title'))
-        elif ordering == '-title':
-            qs = qs.order_by(Lower('title')).reverse()
-        elif ordering == 'discount':
-            qs = qs.order_by('-prices__discount_percentage')
-        elif ordering == 'release_date':
-            qs = qs.order_by(F('release_date').asc(nulls_last=True))
-        elif ordering == '-release_date' or not ordering:
-            qs = qs.order_by(F('release_date').desc(nulls_last=True))
-        else:
-            qs = qs.order_by(F('release_date').desc(nulls_last=True))
-
-        return qs.distinct()
+        qs = filter_games(with_cheapest_region(super().get_queryset().listed().with_prices()), self.request.GET)
+        self.sort_keys = list_sort_keys(self.request.GET)
+        return order_by_keys(qs, self.sort_keys)
 
     def get(self, request, *args, **kwargs):
+        return self.canonical_redirect(request) or super().get(request, *args, **kwargs)
+
+    def canonical_redirect(self, request):
+        """Redirect to the URL without empty filters and the default ordering, if it differs."""
         params = request.GET.copy()
         changed = False
 
-        if 'discounted' in params and not params['discounted']:
-            params.pop('discounted')
-            changed = True
-        if 'release_year' in params and not params['release_year']:
-            params.pop('release_year')
-            changed = True
+        for param in FILTER_PARAMS:
+            if param in params and not params[param]:
+                params.pop(param)
+                changed = True
         if 'ordering' in params and params['ordering'] == '-release_date':
             params.pop('ordering')
             changed = True
@@ -117,24 +66,52 @@ class GameListView(generic.ListView):
         if changed:
             qs = params.urlencode()
             return redirect(f"{request.path}?{qs}" if qs else request.path)
+        return None
 
-        return super().get(request, *args, **kwargs)
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['price_currency'] = settings.PRICE_COMPARISON_CURRENCY
+        return context
+
+    def keyset_requested(self):
+        return 'cursor' in self.request.GET or self.request.GET.get('paginate') == 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        """Use keyset pagination when a cursor is given or requested with ``paginate=cursor``."""
+        if not self.keyset_requested():
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = KeysetPaginator(queryset, self.sort_keys, page_size)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidPage as e:
+            raise Http404(str(e))
+        return paginator, page, page.object_list, page.has_other_pages()
 
 
 class GameDetailView(generic.DetailView):
-    model = Game
+    queryset = Game.objects.prefetch_related('images')
     template_name = 'games/game_detail.html'
 
+    def get_comparison(self):
+        return compare_prices(self.object)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['comparison'] = self.get_comparison()
+        return context
+
 
 class SearchView(generic.ListView):
     template_name = 'games/search.html'
     context_object_name = 'game_list'
     paginate_by = 30
+    paginator_class = CachedCountPaginator
 
     def get_queryset(self):
         query = self.request.GET.get("q")
         if query:
-            return Game.objects.filter(title__icontains=query).exclude(title__exact="").exclude(title__isnull=True)
+            return search_games(Game.objects.listed(), query)
         return Game.objects.none()
 
     def get_context_data(self, **kwargs):
@@ -144,4 +121,4 @@ class SearchView(generic.ListView):
 
 
 def about(request):
-    return render(request, 'games/about.html')
\ No newline at end of file
+    return TemplateResponse(request, 'games/about.html')
\ No newline at end of file
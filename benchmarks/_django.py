@@ -0,0 +1,43 @@
+"""Helpers for benchmarks that run against Django and a database."""
+import contextlib
+import os
+import time
+
+
+def setup():
+    """Configure Django with the project settings."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Diffly.settings')
+    import django
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database(keepdb=False):
+    """
+    Run the block against a throwaway test database created next to the configured one, so benchmark data
+    never touches real data.
+
+    :param keepdb: Keep the test database between runs, as ``manage.py test --keepdb`` does.
+    """
+    from django.db import connection
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def timed(func, *args, **kwargs):
+    """Run ``func`` and return its result and the elapsed time in milliseconds."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
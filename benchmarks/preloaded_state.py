@@ -0,0 +1,111 @@
+"""
+Micro-benchmark of the browse page ``window.__PRELOADED_STATE__`` extraction.
+
+Compares the previous non-greedy DOTALL regex over ``response.text`` with ``extract_preloaded_state``
+on synthetic pages of realistic size. Run from the repository root:
+
+    python -m benchmarks.preloaded_state
+    python -m benchmarks.preloaded_state --sizes 1 4 16 --json
+"""
+import argparse
+import json
+import re
+import statistics
+import sys
+import timeit
+
+from scrapers.xbox.xbox.spiders.game import extract_preloaded_state
+
+REGEX = re.compile(r'window\.__PRELOADED_STATE__ = ({.*?});', re.DOTALL)
+
+
+def regex_extract(body, encoding='utf-8'):
+    """The extraction used by GameSpider.parse before the streaming decoder."""
+    match = REGEX.search(body.decode(encoding))
+    return json.loads(match.group(1)) if match else None
+
+
+def regex_is_correct(body):
+    """Whether the regex extraction returns the same state as the streaming decoder."""
+    try:
+        return regex_extract(body) == extract_preloaded_state(body)
+    except json.JSONDecodeError:
+        return False
+
+
+def make_product(product_id, description):
+    return {
+        'productId': product_id,
+        'title': f'Game {product_id}',
+        'description': description,
+        'shortDescription': 'Short description',
+        'developerName': 'Developer',
+        'publisherName': 'Publisher',
+        'releaseDate': '2024-11-25T05:00:00.0000000Z',
+        'images': {
+            image_type: {'url': f'https://store-images.s-microsoft.com/{product_id}/{image_type}', 'width': 1080,
+                         'height': 1080}
+            for image_type in ('boxArt', 'poster', 'superHeroArt', 'logo')
+        },
+        'specificPrices': {'purchaseable': [{'listPrice': 59.99, 'msrp': 69.99}]},
+    }
+
+
+def make_page(size_mb, products=25, description='Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 20):
+    """Build a browse page of roughly ``size_mb`` megabytes with the preloaded state in the middle."""
+    state = {
+        'core2': {
+            'channels': {'channelData': {'BROWSE_CHANNELID=_FILTERS=ORDERBY=TITLE ASC': {
+                'data': {'products': [{'productId': f'9N{i:010d}'} for i in range(products)], 'encodedCT': 'CT'}
+            }}},
+            'products': {'productSummaries': {f'9N{i:010d}': make_product(f'9N{i:010d}', description) for i in range(products)}},
+        }
+    }
+    script = f'<script>window.__PRELOADED_STATE__ = {json.dumps(state)};</script>'
+    filler_block = '<div class="card"><a href="/en-US/games/store/x">Game</a><span>$59.99</span></div>\n'
+    filler = filler_block * max(1, int(size_mb * 1024 * 1024 - len(script)) // (2 * len(filler_block)))
+    return f'<html><head></head><body>{filler}{script}{filler}</body></html>'.encode('utf-8')
+
+
+def measure(func, body, repeat):
+    timings = timeit.repeat(lambda: func(body), number=1, repeat=repeat)
+    return {
+        'median_ms': statistics.median(timings) * 1000,
+        'min_ms': min(timings) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=float, nargs='+', default=[0.5, 2, 8], help='Page sizes in MB')
+    parser.add_argument('--repeat', type=int, default=20, help='Runs per measurement (default: 20)')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes:
+        body = make_page(size)
+        # Same page, but with a '};' inside the product descriptions as found in real store copy
+        tricky_body = make_page(size, description='Includes the {Season Pass}; and more. ' * 20)
+        results.append({
+            'size_mb': round(len(body) / 1024 / 1024, 2),
+            'regex': measure(regex_extract, body, args.repeat),
+            'raw_decode': measure(extract_preloaded_state, body, args.repeat),
+            'regex_correct': regex_is_correct(tricky_body),
+        })
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+
+    print(f"{'size MB':>8} {'regex ms':>10} {'raw_decode ms':>14} {'speedup':>8} {'regex correct':>14}")
+    for result in results:
+        regex_ms = result['regex']['median_ms']
+        decode_ms = result['raw_decode']['median_ms']
+        print(f"{result['size_mb']:>8} {regex_ms:>10.2f} {decode_ms:>14.2f} {regex_ms / decode_ms:>7.1f}x "
+              f"{str(result['regex_correct']):>14}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+End-to-end scrape throughput benchmark.
+
+Builds synthetic browse pages of 25 ``productSummaries`` (the Xbox Store page size) with the test fixtures,
+then runs them through ``GameSpider.parse`` / ``parse_api_response`` -> ``parse_item`` -> FingerprintPipeline
+-> ``DjangoModelPipeline.process_item`` against a throwaway test database, the way a crawl does: the first
+page of each region is HTML, the following ones are API responses. Every product is scraped in each region.
+
+Reports items/sec, database queries per item, p50/p99 per-item latency (spider callback plus pipeline,
+including the batch flushes) and peak RSS per catalog size. Run from the repository root with the usual
+database environment:
+
+    python -m benchmarks.scrape_throughput
+    python -m benchmarks.scrape_throughput --sizes 1000 10000 --json
+"""
+import argparse
+import asyncio
+import json
+import resource
+import sys
+import time
+
+from benchmarks import _django
+
+PAGE_SIZE = 25
+
+REGIONS = {
+    'en-US': ('United States', 'US', 'USD', '$'),
+    'tr-TR': ('Turkey', 'TR', 'TRY', '₺'),
+}
+
+
+class QueryCounter:
+    """Database execute wrapper counting queries."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def pages(start, count, region):
+    """Responses of one region's pagination chain for products ``start`` to ``start + count``."""
+    from scrapy.http import HtmlResponse, Request, TextResponse
+
+    from scrapers.xbox.xbox.tests.fixtures import BROWSE_URL, api_page, browse_page, product_summary
+
+    for offset in range(0, count, PAGE_SIZE):
+        summaries = [
+            product_summary(
+                f'9P{start + number:010d}',
+                list_price=round(10 + number % 50 * 0.8, 2),
+                msrp=round(10 + number % 50, 2),
+            )
+            for number in range(offset, min(offset + PAGE_SIZE, count))
+        ]
+        token = f'CT{start + offset + PAGE_SIZE}' if offset + PAGE_SIZE < count else None
+        meta = {'region': region}
+        if offset == 0:
+            url = BROWSE_URL.format(region=region)
+            yield 'parse', HtmlResponse(url=url, body=browse_page(summaries, token), encoding='utf-8',
+                                        request=Request(url, meta=meta))
+        else:
+            url = f'https://emerald.xboxservices.com/xboxcomfd/browse?locale={region}'
+            yield 'parse_api_response', TextResponse(url=url, body=api_page(summaries, token), encoding='utf-8',
+                                                     request=Request(url, method='POST', meta=meta))
+
+
+async def crawl(products, start, batch_size):
+    from asgiref.sync import sync_to_async
+    from django.db import connection
+    from scrapy import Request
+
+    from scrapers.xbox.xbox.pipelines import DjangoModelPipeline, FingerprintPipeline
+    from scrapers.xbox.xbox.spiders.game import GameSpider
+
+    spider = GameSpider(max_pages=products // PAGE_SIZE + 1, regions=list(REGIONS))
+    fingerprints = FingerprintPipeline()
+    pipeline = DjangoModelPipeline(batch_size=batch_size, flush_interval=3600)
+    await sync_to_async(pipeline.dimensions.warm)()
+
+    # The pipeline writes from the sync_to_async worker thread, which has its own connection
+    counter = QueryCounter()
+    await sync_to_async(lambda: connection.execute_wrappers.append(counter))()
+
+    latencies = []
+    for region in REGIONS:
+        for callback, response in pages(start, products, region):
+            results = getattr(spider, callback)(response)
+            while True:
+                item_start = time.perf_counter()
+                result = next(results, None)
+                if result is None:
+                    break
+                if isinstance(result, Request):
+                    continue
+                result = fingerprints.process_item(result, spider)
+                await pipeline.process_item(result, spider)
+                latencies.append((time.perf_counter() - item_start) * 1000)
+
+    flush_start = time.perf_counter()
+    await pipeline.flush(spider)
+    if latencies:
+        # The final flush belongs to the last item
+        latencies[-1] += (time.perf_counter() - flush_start) * 1000
+    # Building the synthetic responses is not part of the measured time
+    elapsed = sum(latencies) / 1000
+
+    await sync_to_async(lambda: connection.execute_wrappers.remove(counter))()
+    return latencies, elapsed, counter.count
+
+
+def setup_dimensions():
+    from apps.games.models import Platform, Region
+
+    Platform.objects.get_or_create(name='Xbox')
+    for locale, (name, code, currency_code, currency_symbol) in REGIONS.items():
+        Region.objects.update_or_create(code=code, defaults={
+            'name': name, 'locale': locale, 'currency_code': currency_code, 'currency_symbol': currency_symbol,
+        })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                        help='Products per run (default: 1k 10k 100k)')
+    parser.add_argument('--batch-size', type=int, default=500, help='DjangoModelPipeline batch size (default: 500)')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args(argv)
+
+    _django.setup()
+
+    results = []
+    with _django.test_database() as connection:
+        setup_dimensions()
+        start = 0
+        for products in args.sizes:
+            # New product ids for every run, so each one creates its games
+            latencies, elapsed, queries = asyncio.run(crawl(products, start, args.batch_size))
+            start += products
+            items = len(latencies)
+            results.append({
+                'products': products,
+                'items': items,
+                'backend': connection.vendor,
+                'batch_size': args.batch_size,
+                'seconds': round(elapsed, 3),
+                'items_per_sec': round(items / elapsed, 1),
+                'queries_per_item': round(queries / items, 3),
+                'p50_ms': round(_django.percentile(latencies, 50), 3),
+                'p99_ms': round(_django.percentile(latencies, 99), 3),
+                # ru_maxrss is in kilobytes on Linux and the peak of the whole process so far
+                'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            })
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+
+    print(f"{'products':>9} {'items':>8} {'items/s':>9} {'q/item':>7} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>7}  backend")
+    for result in results:
+        print(f"{result['products']:>9} {result['items']:>8} {result['items_per_sec']:>9.1f} "
+              f"{result['queries_per_item']:>7.3f} {result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f} "
+              f"{result['peak_rss_mb']:>7.1f}  {result['backend']}")
+
+
+if __name__ == '__main__':
+    main()
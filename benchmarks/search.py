@@ -0,0 +1,103 @@
+"""
+Search latency benchmark for SearchView.
+
+Fills a throwaway test database with synthetic games, then runs title searches (exact words and words with
+a typo) through ``search_games`` the way SearchView does: one count and one page of 30. Reports p50/p95/p99
+latency per catalog size. Run from the repository root with the usual database environment:
+
+    python -m benchmarks.search
+    python -m benchmarks.search --sizes 10000 100000 --queries 100 --json
+"""
+import argparse
+import json
+import random
+import sys
+
+from benchmarks import _django
+
+WORDS = [
+    'shadow', 'legend', 'racing', 'galaxy', 'kingdom', 'dragon', 'horizon', 'battle', 'frontier', 'empire',
+    'knight', 'rogue', 'pixel', 'zombie', 'survival', 'tactics', 'odyssey', 'chronicles', 'warfare', 'arena',
+    'forza', 'halo', 'gears', 'witcher', 'sniper', 'dungeon', 'simulator', 'farming', 'football', 'puzzle',
+    'crystal', 'midnight', 'neon', 'storm', 'iron', 'ancient', 'cyber', 'ocean', 'desert', 'winter',
+]
+
+
+def make_title(rng):
+    return ' '.join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(2, 4))) + f' {rng.randint(1, 9)}'
+
+
+def make_query(rng):
+    words = rng.sample(WORDS, rng.randint(1, 2))
+    if rng.random() < 0.3:
+        # Typo: drop one letter of the last word
+        word = words[-1]
+        position = rng.randrange(1, len(word))
+        words[-1] = word[:position] + word[position + 1:]
+    return ' '.join(words)
+
+
+def fill(connection, count, rng, chunk_size=10_000):
+    from apps.games.models import Game
+
+    while count > 0:
+        size = min(chunk_size, count)
+        Game.objects.bulk_create([Game(title=make_title(rng)) for _ in range(size)])
+        count -= size
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE games_game')
+
+
+def run_queries(queries):
+    from apps.games.models import Game
+    from apps.games.search import search_games
+
+    timings = []
+    for query in queries:
+        queryset = search_games(Game.objects.listed(), query)
+        _, count_ms = _django.timed(queryset.count)
+        _, page_ms = _django.timed(lambda: list(queryset[:30]))
+        timings.append(count_ms + page_ms)
+    return {
+        'p50_ms': _django.percentile(timings, 50),
+        'p95_ms': _django.percentile(timings, 95),
+        'p99_ms': _django.percentile(timings, 99),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help='Catalog sizes to measure (default: 10k 100k 1M)')
+    parser.add_argument('--queries', type=int, default=200, help='Searches per catalog size (default: 200)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args(argv)
+
+    _django.setup()
+    rng = random.Random(args.seed)
+    queries = [make_query(rng) for _ in range(args.queries)]
+
+    results = []
+    with _django.test_database() as connection:
+        size = 0
+        for target in sorted(args.sizes):
+            fill(connection, target - size, rng)
+            size = target
+            run_queries(queries[:10])  # warm up caches
+            results.append({'games': size, 'backend': connection.vendor, **run_queries(queries)})
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+
+    print(f"{'games':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  backend")
+    for result in results:
+        print(f"{result['games']:>10} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f}  "
+              f"{result['backend']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+Page load benchmark: sync views under gunicorn against async views under uvicorn.
+
+Fills a throwaway test database with synthetic games priced in two regions, then starts each server on the
+same database and drives it with concurrent keep-alive clients requesting a fixed mix of pages: home, game
+list pages and orderings, game details and searches. Reports requests/sec and p50/p99 latency per server.
+
+    gunicorn  Diffly.wsgi, sync workers, ASYNC_VIEWS off
+    uvicorn   Diffly.asgi, ASYNC_VIEWS on
+
+Both servers get the same number of worker processes. The servers connect to the test database on their
+own, so the configured database must be one they can reach (PostgreSQL). Run from the repository root with
+the usual database environment:
+
+    python -m benchmarks.views_load
+    python -m benchmarks.views_load --games 20000 --workers 4 --concurrency 64 --duration 30 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from decimal import Decimal
+
+from benchmarks import _django
+from benchmarks.search import WORDS, make_title
+
+HOST = '127.0.0.1'
+
+SERVERS = {
+    'gunicorn': lambda port, workers: [
+        sys.executable, '-m', 'gunicorn', 'benchmarks.views_load:wsgi', '--bind', f'{HOST}:{port}',
+        '--workers', str(workers), '--worker-class', 'sync', '--log-level', 'warning',
+    ],
+    'uvicorn': lambda port, workers: [
+        sys.executable, '-m', 'uvicorn', 'benchmarks.views_load:asgi', '--host', HOST, '--port', str(port),
+        '--workers', str(workers), '--no-access-log', '--log-level', 'warning',
+    ],
+}
+
+ASYNC_VIEWS = {'gunicorn': 'False', 'uvicorn': 'True'}
+
+
+def wsgi(environ, start_response):
+    """The project WSGI application, seen as served over HTTPS as it is behind the TLS proxy in production,
+    so SECURE_SSL_REDIRECT does not answer every request with a redirect."""
+    from Diffly.wsgi import application
+
+    environ['wsgi.url_scheme'] = 'https'
+    return application(environ, start_response)
+
+
+async def asgi(scope, receive, send):
+    """ASGI version of wsgi()."""
+    from Diffly.asgi import application
+
+    if scope['type'] == 'http':
+        scope = {**scope, 'scheme': 'https'}
+    await application(scope, receive, send)
+
+
+def fill(count, rng, chunk_size=5_000):
+    """Create ``count`` listed games, each priced in the US and Turkey, a third of them on sale."""
+    from apps.games.models import Game, Platform, Price, Region, Store
+
+    platform = Platform.objects.create(name='Xbox')
+    store = Store.objects.create(name='Xbox Store', base_url='https://www.xbox.com')
+    regions = [
+        Region.objects.create(name='United States', code='US', locale='en-US', currency_code='USD', currency_symbol='$'),
+        Region.objects.create(name='Turkey', code='TR', locale='tr-TR', currency_code='TRY', currency_symbol='₺'),
+    ]
+    for start in range(0, count, chunk_size):
+        games = Game.objects.bulk_create([
+            Game(
+                title=make_title(rng),
+                product_id=f'9P{number:010d}',
+                release_date=f'{rng.randint(2005, 2025)}-{rng.randint(1, 12):02d}-01',
+                primary_image_url=f'https://img/{number}/box',
+            )
+            for number in range(start, min(start + chunk_size, count))
+        ])
+        prices = []
+        for game in games:
+            base = Decimal(rng.choice(['19.99', '29.99', '59.99', '69.99']))
+            for region in regions:
+                price = Price(
+                    game=game, platform=platform, region=region, store=store, base_price=base,
+                    current_price=(base * Decimal('0.6')).quantize(Decimal('0.01')) if rng.random() < 1 / 3 else base,
+                )
+                price.update_sale_status()
+                prices.append(price)
+        Price.objects.bulk_create(prices)
+        Game.refresh_deals([game.pk for game in games])
+
+
+def page_mix(count, rng, size=1_000):
+    """Paths requested by the clients, in order."""
+    def path():
+        kind = rng.random()
+        if kind < 0.1:
+            return '/'
+        if kind < 0.4:
+            return f'/games/?page={rng.randint(1, 20)}'
+        if kind < 0.5:
+            return f'/games/?ordering={rng.choice(["title", "discount", "release_date"])}'
+        if kind < 0.85:
+            return f'/games/{rng.randint(1, count)}/'
+        return f'/search/?q={rng.choice(WORDS)}'
+    return [path() for _ in range(size)]
+
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response, return its status and whether the server keeps the connection open."""
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding') == 'chunked':
+        while size := int((await reader.readline()).split(b';')[0], 16):
+            await reader.readexactly(size + 2)
+        await reader.readline()
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def client(port, paths, offset, deadline, latencies, errors):
+    """Request ``paths`` in a loop on one keep-alive connection until ``deadline``."""
+    connection = None
+    index = offset
+    while time.perf_counter() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        start = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(HOST, port)
+            reader, writer = connection
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {HOST}\r\n\r\n'.encode())
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            errors.append(path)
+            connection = None
+            continue
+        if status == 200 or status == 404:
+            latencies.append((time.perf_counter() - start) * 1000)
+        else:
+            errors.append(path)
+        if not keep_alive:
+            writer.close()
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+async def load(port, paths, concurrency, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    step = len(paths) // concurrency or 1
+    await asyncio.gather(*[
+        client(port, paths, number * step, deadline, latencies, errors) for number in range(concurrency)
+    ])
+    return latencies, errors
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited with code {process.returncode}')
+        try:
+            with socket.create_connection((HOST, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server did not listen on port {port} within {timeout}s')
+
+
+def run_server(name, database, args, paths):
+    port = free_port()
+    env = {
+        **os.environ,
+        'DB_NAME': database,
+        'DEBUG': 'False',
+        'ALLOWED_HOSTS': HOST,
+        'ASYNC_VIEWS': ASYNC_VIEWS[name],
+        'QUERY_PROFILING': 'False',
+    }
+    process = subprocess.Popen(SERVERS[name](port, args.workers), env=env)
+    try:
+        wait_for(port, process)
+        # Warm up connections, caches and imports in every worker
+        asyncio.run(load(port, paths, args.concurrency, args.warmup))
+        latencies, errors = asyncio.run(load(port, paths, args.concurrency, args.duration))
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    return {
+        'server': name,
+        'workers': args.workers,
+        'concurrency': args.concurrency,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_sec': round(len(latencies) / args.duration, 1),
+        'p50_ms': round(_django.percentile(latencies, 50), 2) if latencies else None,
+        'p99_ms': round(_django.percentile(latencies, 99), 2) if latencies else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--games', type=int, default=10_000, help='Games in the catalog (default: 10k)')
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument('--workers', type=int, default=2, help='Worker processes per server (default: 2)')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent connections (default: 32)')
+    parser.add_argument('--duration', type=float, default=20, help='Measured seconds per server (default: 20)')
+    parser.add_argument('--warmup', type=float, default=3, help='Unmeasured seconds per server (default: 3)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args(argv)
+
+    _django.setup()
+    rng = random.Random(args.seed)
+
+    results = []
+    with _django.test_database() as connection:
+        if connection.vendor == 'sqlite':
+            parser.error('the servers need a database they can connect to, configure PostgreSQL')
+        fill(args.games, rng)
+        paths = page_mix(args.games, rng)
+        for name in args.servers:
+            results.append(run_server(name, connection.settings_dict['NAME'], args, paths))
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+
+    print(f"{'server':>9} {'workers':>7} {'conc':>5} {'requests':>9} {'errors':>6} {'req/s':>8} {'p50 ms':>8} "
+          f"{'p99 ms':>8}")
+    for result in results:
+        print(f"{result['server']:>9} {result['workers']:>7} {result['concurrency']:>5} {result['requests']:>9} "
+              f"{result['errors']:>6} {result['requests_per_sec']:>8.1f} {result['p50_ms'] or 0:>8.2f} "
+              f"{result['p99_ms'] or 0:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -22,3 +22,5 @@ class XboxItem(scrapy.Item):
 
     region = scrapy.Field()
 
+    fingerprint = scrapy.Field()
+
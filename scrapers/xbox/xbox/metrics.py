@@ -0,0 +1,338 @@
+"""
+Crawl instrumentation: latency histograms and gauges collected during a crawl, exposed through the Scrapy
+stats collector and written periodically to a Prometheus textfile and a JSON file.
+
+The CrawlMetricsExtension owns a CrawlMetrics registry and publishes it as ``crawler.metrics`` so other
+components can record into it. Components that run without the extension get NULL_METRICS.
+"""
+import bisect
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from scrapy import Request, signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+# Upper bounds in seconds, Prometheus style
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+LOCALE_PATTERN = re.compile(r'/[a-z]{2}-[a-z]{2}(?=/|$)', re.IGNORECASE)
+
+
+def endpoint(url):
+    """Metric label of a URL: host and path with the store locale masked, e.g. www.xbox.com/{locale}/games/browse."""
+    parsed = urlparse(url)
+    return parsed.netloc + LOCALE_PATTERN.sub('/{locale}', parsed.path)
+
+
+class Histogram:
+    """Cumulative histogram of observed values with fixed bucket bounds."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate of the ``q`` quantile: the upper bound of the bucket it falls in, or the largest value
+        observed for the overflow bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self):
+        """``(upper bound, cumulative count)`` pairs, ending with ``('+Inf', count)``."""
+        pairs = []
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            pairs.append((bound, seen))
+        pairs.append(('+Inf', self.count))
+        return pairs
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'p50': round(self.quantile(0.5), 6),
+            'p99': round(self.quantile(0.99), 6),
+            'max': round(self.max, 6),
+        }
+
+
+class CrawlMetrics:
+    """Registry of labelled histograms and gauges. Thread safe, the pipeline records from worker threads."""
+
+    def __init__(self, prefix='xbox'):
+        self.prefix = prefix
+        self.histograms = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name, value, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """Observe the duration of the block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[self.key(name, labels)] = value
+
+    def inc_gauge(self, name, amount=1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.gauges[key] = self.gauges.get(key, 0) + amount
+
+    @staticmethod
+    def label_string(labels, extra=()):
+        pairs = [*labels, *extra]
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+    def to_stats(self, stats):
+        """Copy summaries into a Scrapy stats collector as ``metrics/<name>[/<labels>]/<field>`` values."""
+        with self.lock:
+            for (name, labels), histogram in self.histograms.items():
+                path = '/'.join([f'metrics/{name}', *(str(value) for _, value in labels)])
+                for field, value in histogram.summary().items():
+                    stats.set_value(f'{path}/{field}', value)
+            for (name, labels), value in self.gauges.items():
+                stats.set_value('/'.join([f'metrics/{name}', *(str(value) for _, value in labels)]), value)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'histograms': [
+                    {'name': name, 'labels': dict(labels), **histogram.summary()}
+                    for (name, labels), histogram in sorted(self.histograms.items())
+                ],
+                'gauges': [
+                    {'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(self.gauges.items())
+                ],
+            }
+
+    def to_prometheus(self):
+        """Metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            typed = set()
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                metric = f'{self.prefix}_{name}'
+                if metric not in typed:
+                    lines.append(f'# TYPE {metric} histogram')
+                    typed.add(metric)
+                for bound, count in histogram.cumulative():
+                    lines.append(f'{metric}_bucket{self.label_string(labels, [("le", bound)])} {count}')
+                lines.append(f'{metric}_sum{self.label_string(labels)} {histogram.sum}')
+                lines.append(f'{metric}_count{self.label_string(labels)} {histogram.count}')
+            for (name, labels), value in sorted(self.gauges.items()):
+                metric = f'{self.prefix}_{name}'
+                if metric not in typed:
+                    lines.append(f'# TYPE {metric} gauge')
+                    typed.add(metric)
+                lines.append(f'{metric}{self.label_string(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class NullMetrics:
+    """Stand-in for CrawlMetrics when the extension is disabled."""
+
+    def observe(self, name, value, **labels):
+        pass
+
+    def timer(self, name, **labels):
+        return contextlib.nullcontext()
+
+    def set_gauge(self, name, value, **labels):
+        pass
+
+    def inc_gauge(self, name, amount=1, **labels):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+def crawler_metrics(crawler):
+    """The metrics registry of a crawler, or NULL_METRICS when the extension is not enabled."""
+    return getattr(crawler, 'metrics', None) or NULL_METRICS
+
+
+def write_atomic(path, content):
+    """Replace ``path`` with ``content`` at once, so readers never see a partial file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'.{path.name}.tmp')
+    tmp.write_text(content, encoding='utf-8')
+    os.replace(tmp, path)
+
+
+class CrawlMetricsExtension:
+    """
+    Records download latency and downloader wait time (delays and autothrottle) per endpoint, scheduler
+    queue depth, requests in the downloader and items in flight, and writes all metrics to the stats
+    collector and the configured files every ``METRICS_INTERVAL`` seconds and when the spider closes.
+
+    Settings: ``METRICS_ENABLED``, ``METRICS_INTERVAL``, ``METRICS_PROMETHEUS_FILE`` and ``METRICS_JSON_FILE``.
+    """
+
+    def __init__(self, crawler, interval=15.0, prometheus_file=None, json_file=None):
+        self.crawler = crawler
+        self.metrics = CrawlMetrics()
+        self.interval = interval
+        self.prometheus_file = prometheus_file
+        self.json_file = json_file
+        self.reached = {}
+        self.task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('METRICS_ENABLED'):
+            raise NotConfigured
+        extension = cls(
+            crawler,
+            interval=crawler.settings.getfloat('METRICS_INTERVAL', 15.0),
+            prometheus_file=crawler.settings.get('METRICS_PROMETHEUS_FILE'),
+            json_file=crawler.settings.get('METRICS_JSON_FILE'),
+        )
+        crawler.metrics = extension.metrics
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(extension.request_reached_downloader, signal=signals.request_reached_downloader)
+        crawler.signals.connect(extension.request_left_downloader, signal=signals.request_left_downloader)
+        crawler.signals.connect(extension.response_received, signal=signals.response_received)
+        crawler.signals.connect(extension.item_done, signal=signals.item_scraped)
+        crawler.signals.connect(extension.item_done, signal=signals.item_dropped)
+        crawler.signals.connect(extension.item_done, signal=signals.item_error)
+        return extension
+
+    def spider_opened(self, spider):
+        self.task = task.LoopingCall(self.write)
+        self.task.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.task and self.task.running:
+            self.task.stop()
+        self.write()
+
+    def request_reached_downloader(self, request, spider):
+        self.reached[id(request)] = time.perf_counter()
+
+    def request_left_downloader(self, request, spider):
+        reached = self.reached.pop(id(request), None)
+        if reached is None:
+            return
+        # Time in the downloader that was not spent downloading: slot delays and autothrottle
+        waited = time.perf_counter() - reached - request.meta.get('download_latency', 0)
+        self.metrics.observe('downloader_wait_seconds', max(waited, 0.0), endpoint=endpoint(request.url))
+
+    def response_received(self, response, request, spider):
+        latency = request.meta.get('download_latency')
+        if latency is not None:
+            self.metrics.observe('download_latency_seconds', latency, endpoint=endpoint(request.url))
+
+    def item_done(self, item, spider, *args, **kwargs):
+        self.metrics.inc_gauge('items_in_flight', -1)
+
+    def sample(self):
+        """Sample the engine queue gauges."""
+        engine = self.crawler.engine
+        if engine is None:
+            return
+        slot = getattr(engine, '_slot', None) or getattr(engine, 'slot', None)
+        if slot is not None and slot.scheduler is not None:
+            self.metrics.set_gauge('scheduler_queue_depth', len(slot.scheduler))
+        self.metrics.set_gauge('downloader_active_requests', len(engine.downloader.active))
+
+    def write(self):
+        self.sample()
+        self.metrics.to_stats(self.crawler.stats)
+        if self.prometheus_file:
+            write_atomic(self.prometheus_file, self.metrics.to_prometheus())
+        if self.json_file:
+            write_atomic(self.json_file, json.dumps(self.metrics.to_dict(), indent=2))
+
+
+class ParseTimingMiddleware:
+    """
+    Spider middleware timing the callbacks, per page and callback, excluding the time spent downstream
+    between two results. Items produced are counted in the ``items_in_flight`` gauge until they are
+    scraped, dropped or fail. Install it close to the spider (high order) so it times the callback alone.
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('METRICS_ENABLED'):
+            raise NotConfigured
+        return cls(crawler_metrics(crawler))
+
+    def callback_name(self, response):
+        callback = getattr(response.request, 'callback', None) if response.request is not None else None
+        return getattr(callback, '__name__', 'parse')
+
+    def count(self, result):
+        if not isinstance(result, Request):
+            self.metrics.inc_gauge('items_in_flight')
+
+    def process_spider_output(self, response, result, spider):
+        elapsed = 0.0
+        start = time.perf_counter()
+        for output in result:
+            elapsed += time.perf_counter() - start
+            self.count(output)
+            yield output
+            start = time.perf_counter()
+        elapsed += time.perf_counter() - start
+        self.metrics.observe('parse_seconds', elapsed, callback=self.callback_name(response))
+
+    async def process_spider_output_async(self, response, result, spider):
+        elapsed = 0.0
+        start = time.perf_counter()
+        async for output in result:
+            elapsed += time.perf_counter() - start
+            self.count(output)
+            yield output
+            start = time.perf_counter()
+        elapsed += time.perf_counter() - start
+        self.metrics.observe('parse_seconds', elapsed, callback=self.callback_name(response))
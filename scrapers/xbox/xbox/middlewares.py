@@ -3,7 +3,14 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import hashlib
+import json
+import zipfile
+
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
@@ -98,3 +105,106 @@ class XboxDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+def replay_key(request):
+    """
+    Archive key of a request: method, URL and, for browse API calls, the ``EncodedCT`` continuation token.
+    Per-request headers such as ``MS-CV`` are left out so a replayed crawl finds the recorded responses.
+    """
+    token = ''
+    if request.body:
+        try:
+            token = json.loads(request.body).get('EncodedCT') or ''
+        except (ValueError, AttributeError):
+            token = hashlib.sha1(request.body).hexdigest()
+    return hashlib.sha1(f'{request.method} {request.url} {token}'.encode()).hexdigest()
+
+
+def configure_replay(settings, mode, archive):
+    """
+    Set up crawler settings for recording to or replaying from ``archive``. Replayed crawls do not touch
+    the network, so pacing, throttling and robots.txt are switched off.
+
+    :param settings: Mutable Scrapy settings.
+    :param mode: 'record' or 'replay'.
+    :param archive: Path of the zip archive.
+    """
+    settings.set('XBOX_REPLAY_MODE', mode)
+    settings.set('XBOX_REPLAY_ARCHIVE', str(archive))
+    if mode == 'replay':
+        settings.set('DOWNLOAD_DELAY', 0)
+        settings.set('RANDOMIZE_DOWNLOAD_DELAY', False)
+        settings.set('AUTOTHROTTLE_ENABLED', False)
+        settings.set('ROBOTSTXT_OBEY', False)
+        settings.set('RETRY_ENABLED', False)
+
+
+class ReplayMiddleware:
+    """
+    Records responses to a compressed zip archive, or replays a crawl from it without network access.
+
+    Enabled with the ``XBOX_REPLAY_MODE`` setting ('record' or 'replay') and ``XBOX_REPLAY_ARCHIVE``. Every
+    response is stored as a ``<key>.json`` metadata entry and a ``<key>.body`` entry, keyed on
+    replay_key(). Responses are recorded after decompression, and replayed requests that are not in the
+    archive are ignored.
+    """
+
+    def __init__(self, mode, archive):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown replay mode: {mode}")
+        self.mode = mode
+        self.path = archive
+        if mode == 'record':
+            self.archive = zipfile.ZipFile(archive, 'a', compression=zipfile.ZIP_DEFLATED)
+        else:
+            self.archive = zipfile.ZipFile(archive, 'r')
+        self.keys = {name.rsplit('.', 1)[0] for name in self.archive.namelist()}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        mode = crawler.settings.get('XBOX_REPLAY_MODE')
+        if not mode:
+            raise NotConfigured
+        middleware = cls(mode, crawler.settings.get('XBOX_REPLAY_ARCHIVE', 'replay.zip'))
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def process_request(self, request, spider):
+        if self.mode != 'replay':
+            return None
+
+        key = replay_key(request)
+        if key not in self.keys:
+            spider.logger.warning(f"Not in replay archive: {request.method} {request.url}")
+            raise IgnoreRequest(f"Not in replay archive: {request.url}")
+
+        meta = json.loads(self.archive.read(f'{key}.json'))
+        body = self.archive.read(f'{key}.body')
+        headers = Headers(meta['headers'])
+        response_class = responsetypes.from_args(headers=headers, url=meta['url'], body=body)
+        return response_class(
+            url=meta['url'], status=meta['status'], headers=headers, body=body, request=request, flags=['replay'],
+        )
+
+    def process_response(self, request, response, spider):
+        if self.mode != 'record':
+            return response
+
+        key = replay_key(request)
+        if key not in self.keys:
+            # The body is already decoded by HttpCompressionMiddleware
+            headers = {
+                name.decode(): [value.decode('latin-1') for value in values]
+                for name, values in response.headers.items()
+                if name.lower() not in (b'content-encoding', b'content-length', b'set-cookie')
+            }
+            meta = {'url': response.url, 'status': response.status, 'headers': headers}
+            self.archive.writestr(f'{key}.json', json.dumps(meta))
+            self.archive.writestr(f'{key}.body', response.body)
+            self.keys.add(key)
+        return response
+
+    def spider_closed(self, spider):
+        self.archive.close()
+        spider.logger.info(f"Replay archive {self.path} closed ({self.mode}, {len(self.keys)} responses)")
@@ -1,42 +1,221 @@
+import hashlib
+import json
+import time
 from collections import defaultdict
 from datetime import timedelta
+from decimal import Decimal, InvalidOperation
 
 from asgiref.sync import sync_to_async
-from django.db import close_old_connections
+from django.db import close_old_connections, transaction
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from scrapy.exceptions import DropItem
+from scrapy.utils.defer import deferred_from_coro
 
+from apps.games.alerts import match_price_drops
+from apps.games.cache import bump_catalog_version
+from apps.games.catalog import refresh_catalog
 from apps.games.models import *
 
-REGION_MAP = {
-    "en-US": "US",
-    "tr-TR": "TR",
+from .metrics import NULL_METRICS, crawler_metrics
+
+IMAGE_TYPE_MAP = {
+    'boxArt': 'box_art',
+    'poster': 'poster',
+    'superHeroArt': 'hero_art',
+    'screenshot': 'screenshot',
+    'logo': 'logo',
 }
 
+GAME_UPDATE_FIELDS = [
+    'title',
+    'description',
+    'short_description',
+    'developer_name',
+    'publisher_name',
+    'release_date',
+    'updated_at',
+]
+
+FINGERPRINT_FIELDS = [
+    'game_title',
+    'game_description',
+    'game_short_description',
+    'game_developer_name',
+    'game_publisher_name',
+    'game_release_date',
+    'images',
+    'price_base',
+    'price_current',
+]
+
+
+def item_fingerprint(item):
+    """Return a stable SHA-256 hex digest of the metadata, images and price of an item."""
+    payload = {field: item.get(field) for field in FINGERPRINT_FIELDS}
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def valid_price(value):
+    """Whether ``value`` is a finite, non-negative amount."""
+    try:
+        price = Decimal(str(value))
+    except InvalidOperation:
+        return False
+    return price.is_finite() and price >= 0
+
+
+class FingerprintPipeline:
+    """Pipeline that stamps each item with a content fingerprint. When the spider runs in incremental mode,
+    items whose fingerprint matches the one stored by a previous crawl are dropped before any database write."""
+
+    def __init__(self, crawler_stats=None):
+        self.fingerprints = {}
+        self.crawler_stats = crawler_stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def open_spider(self, spider):
+        """Load the stored fingerprints for incremental crawls."""
+        if getattr(spider, 'incremental', False):
+            return deferred_from_coro(sync_to_async(self.load_fingerprints)())
+
+    def load_fingerprints(self):
+        self.fingerprints = {
+            (product_id, region): digest
+            for product_id, region, digest in ProductFingerprint.objects.values_list('product_id', 'region', 'digest')
+        }
+
+    def process_item(self, item, spider):
+        item['fingerprint'] = item_fingerprint(item)
+
+        key = (item.get('product_id'), item.get('region'))
+        if getattr(spider, 'incremental', False) and self.fingerprints.get(key) == item['fingerprint']:
+            if self.crawler_stats:
+                self.crawler_stats.inc_value('fingerprint/unchanged')
+            raise DropItem(f"Unchanged item {key[0]} - {key[1]}", log_level='DEBUG')
+
+        return item
+
+
+class DimensionCache:
+    """In-process cache of the Platform, Region and Store rows shared by all items of a crawl. The cache is
+    warmed once when the spider opens; a missing row is created on first use and added to the cache."""
+
+    def __init__(self):
+        self.platforms = {}
+        self.regions = {}
+        self.region_map = {}
+        self.stores = {}
+
+    def warm(self):
+        """Load all platforms, regions and stores with one query per table. The store locale to region code
+        map is derived from the regions."""
+        self.platforms = {platform.name: platform for platform in Platform.objects.all()}
+        self.regions = {region.code: region for region in Region.objects.all()}
+        self.region_map = {region.locale: region.code for region in self.regions.values() if region.locale}
+        self.stores = {store.name: store for store in Store.objects.all()}
+
+    def platform(self, name):
+        if name not in self.platforms:
+            self.platforms[name], _ = Platform.objects.get_or_create(name=name)
+        return self.platforms[name]
+
+    def region(self, code):
+        if code not in self.regions:
+            self.regions[code], _ = Region.objects.get_or_create(code=code, defaults={'name': code})
+        return self.regions[code]
+
+    def store(self, region, region_code, platform):
+        """Return the Xbox store of a region, creating it for the given platform if needed."""
+        name = f'Xbox Store {region_code}'
+        if name not in self.stores:
+            store, created = Store.objects.get_or_create(
+                name=name,
+                defaults={
+                    'base_url': f'https://www.xbox.com/{region}',
+                }
+            )
+            if created:
+                store.platforms.add(platform)
+            self.stores[name] = store
+        return self.stores[name]
+
+
+def region_stats():
+    """Created and updated counters of a crawl or a batch, per region."""
+    return defaultdict(
+        lambda: {
+            'games': {'crt': 0, 'upd': 0},
+            'prices': {'crt': 0, 'upd': 0},
+            'drops': 0,
+            'images': 0
+        }
+    )
+
+
+def merge_stats(total, stats):
+    """Add the counters of ``stats`` to ``total``."""
+    for region, data in stats.items():
+        for model in ('games', 'prices'):
+            for key, value in data[model].items():
+                total[region][model][key] += value
+        total[region]['drops'] += data['drops']
+        total[region]['images'] += data['images']
+
 
 class DjangoModelPipeline:
     """Pipeline that saves scraped items into the Django database. Including games, platforms, images,
-    and prices. Track statistics for created and updated records per region."""
+    and prices. Track statistics for created and updated records per region.
 
-    def __init__(self):
-        """Initialize stats counters for tracking create/update operations."""
-        self.stats = defaultdict(
-            lambda: {
-                'games': {'crt': 0, 'upd': 0},
-                'prices': {'crt': 0, 'upd': 0},
-                'images': 0
-            }
+    Items are buffered and written in batches with bulk upserts. A batch is flushed when it reaches
+    ``DJANGO_PIPELINE_BATCH_SIZE`` items, when ``DJANGO_PIPELINE_FLUSH_INTERVAL`` seconds have passed since
+    the last flush, and when the spider closes."""
+
+    def __init__(self, batch_size=500, flush_interval=30.0, metrics=NULL_METRICS, crawler_stats=None):
+        """Initialize stats counters for tracking create/update operations and the item buffer."""
+        self.stats = region_stats()
+        self.crawler_stats = crawler_stats
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = float(flush_interval)
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self.dimensions = DimensionCache()
+        self.metrics = metrics
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            batch_size=crawler.settings.getint('DJANGO_PIPELINE_BATCH_SIZE', 500),
+            flush_interval=crawler.settings.getfloat('DJANGO_PIPELINE_FLUSH_INTERVAL', 30.0),
+            metrics=crawler_metrics(crawler),
+            crawler_stats=crawler.stats,
         )
 
+    def open_spider(self, spider):
+        """Warm the platform, region and store cache before the first item arrives."""
+        return deferred_from_coro(sync_to_async(self.dimensions.warm)())
+
     async def process_item(self, item, spider):
-        """Process each scraped item asynchronously, persist it to the database, update related models, and record
-        statistics."""
+        """Validate and normalize each scraped item, then add it to the write buffer. The buffer is flushed
+        to the database once it is full or the flush interval has elapsed."""
         product_id = item.get('product_id')
         region = item.get('region')
-        region_code = REGION_MAP.get(region)
+        region_code = self.dimensions.region_map.get(region)
         if not region_code:
             raise DropItem(f"Invalid region code {region} - {product_id}")
+        if not product_id:
+            raise DropItem(f"Missing product id - {item.get('game_title')}")
+        if region == 'en-US' and item.get('game_title') is None:
+            raise DropItem(f"Missing title for game {product_id}")
+        if "price_base" in item and not (valid_price(item['price_base']) and valid_price(item.get('price_current'))):
+            # Keep the game but not its price, so one bad price cannot fail the whole batch
+            spider.logger.warning(f"Invalid price for {product_id} in {region}, skipping it")
+            del item['price_base']
+            item.pop('price_current', None)
 
         # spider.logger.info(f"Saving item: {product_id}({item.get('game_title')}) from {region}")
 
@@ -46,99 +225,235 @@ class DjangoModelPipeline:
             if release_date > max_valid_date:
                 release_date = None
 
+        self.buffer.append((item, region_code, release_date))
+        self.metrics.set_gauge('pipeline_buffered_items', len(self.buffer))
+
+        if len(self.buffer) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            await self.flush(spider)
+
+        return item
+
+    async def flush(self, spider):
+        """Write all buffered items to the database in a single batch."""
+        batch, self.buffer = self.buffer, []
+        self.last_flush = time.monotonic()
+        self.metrics.set_gauge('pipeline_buffered_items', 0)
+        if not batch:
+            return
+
         try:
-            # Update game's metadata for the US region only
-            game, created = await sync_to_async(Game.objects.update_or_create)(
-                product_id=product_id,
-                defaults={
-                    'title': item.get('game_title'),
-                    'description': item.get('game_description'),
-                    'short_description': item.get('game_short_description'),
-                    'developer_name': item.get('game_developer_name'),
-                    'publisher_name': item.get('game_publisher_name'),
-                    'release_date': release_date,
-                } if region == 'en-US' else None,
-            )
+            with self.metrics.timer('db_batch_seconds'):
+                await sync_to_async(self.write_batch)(batch)
         except Exception as e:
-            raise DropItem(f"Failed to create/get game {product_id}: {e}")
-        else:
-            if created:
-                self.stats[region]['games']['crt'] += 1
-            else:
-                self.stats[region]['games']['upd'] += 1
+            spider.logger.error(f"Failed to write batch of {len(batch)} items: {e}")
+            if self.crawler_stats:
+                self.crawler_stats.inc_value('pipeline/failed_items', len(batch))
 
-        platform = await sync_to_async(Platform.objects.get)(name='Xbox')
-        await sync_to_async(GamePlatform.objects.get_or_create)(
-            platform=platform,
-            game=game,
-        )
+    def write_batch(self, batch):
+        """Persist a batch of ``(item, region_code, release_date)`` tuples with one bulk upsert per model.
+
+        Game metadata and images are only taken from the US region. Created/updated counters are computed
+        against the rows that existed before the batch, in item order, so they match what per-item writes
+        would have reported. They are added to the crawl stats once the batch is committed."""
+        product_ids = {item['product_id'] for item, _, _ in batch}
+
+        # Resolve lookup rows before the transaction so a rolled back batch never leaves missing rows in the cache
+        platform = self.dimensions.platform('Xbox')
+        for item, region_code, _ in batch:
+            if "price_base" in item:
+                self.dimensions.region(region_code)
+                self.dimensions.store(item['region'], region_code, platform)
+
+        stats = region_stats()
+        with transaction.atomic():
+            known_games = set(Game.objects.filter(product_id__in=product_ids).values_list('product_id', flat=True))
+            existing_games = set(known_games)
+
+            games = {}
+            for item, _, release_date in batch:
+                product_id = item['product_id']
+                region = item['region']
+                if product_id in known_games:
+                    stats[region]['games']['upd'] += 1
+                else:
+                    stats[region]['games']['crt'] += 1
+                    known_games.add(product_id)
+
+                # Update game's metadata for the US region only
+                if region == 'en-US':
+                    games[product_id] = Game(
+                        product_id=product_id,
+                        title=item.get('game_title'),
+                        description=item.get('game_description') or '',
+                        short_description=item.get('game_short_description'),
+                        developer_name=item.get('game_developer_name'),
+                        publisher_name=item.get('game_publisher_name'),
+                        release_date=release_date,
+                    )
+
+            with self.metrics.timer('db_write_seconds', model='Game'):
+                if games:
+                    Game.objects.bulk_create(
+                        games.values(),
+                        update_conflicts=True,
+                        unique_fields=['product_id'],
+                        update_fields=GAME_UPDATE_FIELDS,
+                    )
+                placeholders = [
+                    Game(product_id=product_id) for product_id in product_ids - existing_games - games.keys()
+                ]
+                if placeholders:
+                    Game.objects.bulk_create(placeholders, ignore_conflicts=True)
+
+            game_ids = dict(Game.objects.filter(product_id__in=product_ids).values_list('product_id', 'id'))
 
-        if 'images' in item and item['images'] and region == 'en-US':
-            for image_type, data in item.get('images', {}).items():
-                match image_type:
-                    case 'boxArt':
-                        image_type = 'box_art'
-                    case 'poster':
-                        image_type = 'poster'
-                    case 'superHeroArt':
-                        image_type = 'hero_art'
-                    case 'screenshot':
-                        image_type = 'screenshot'
-                    case 'logo':
-                        image_type = 'logo'
-                    case _:
+            with self.metrics.timer('db_write_seconds', model='GamePlatform'):
+                GamePlatform.objects.bulk_create(
+                    [GamePlatform(platform=platform, game_id=game_id) for game_id in game_ids.values()],
+                    ignore_conflicts=True,
+                )
+
+            images = {}
+            for item, _, _ in batch:
+                if item['region'] != 'en-US' or not item.get('images'):
+                    continue
+                game_id = game_ids[item['product_id']]
+                for image_type, data in item['images'].items():
+                    image_type = IMAGE_TYPE_MAP.get(image_type)
+                    if not image_type:
                         continue
-                try:
-                    await sync_to_async(GameImage.objects.update_or_create)(
-                        game=game,
+                    images[(game_id, image_type)] = GameImage(
+                        game_id=game_id,
                         image_type=image_type,
-                        defaults={
-                            'url': data['url'],
-                            'width': data['width'],
-                            'height': data['height'],
-                        }
+                        url=data['url'],
+                        width=data['width'],
+                        height=data['height'],
                     )
-                except Exception as e:
-                    spider.logger.error(f"Failed to create/update image for {product_id}: {e}")
-                else:
-                    self.stats[region]['images'] += 1
+                    stats[item['region']]['images'] += 1
 
-        if "price_base" in item and "region" in item:
-            price_region = await sync_to_async(Region.objects.get)(code=region_code)
-            store, created = await sync_to_async(Store.objects.get_or_create)(
-                name=f'Xbox Store {region_code}',
-                defaults={
-                    'base_url': f'https://www.xbox.com/{region}',
-                }
-            )
-            if created:
-                await sync_to_async(store.platforms.add)(platform)
-                # store.platforms.add(platform)
+            if images:
+                with self.metrics.timer('db_write_seconds', model='GameImage'):
+                    GameImage.objects.bulk_create(
+                        images.values(),
+                        update_conflicts=True,
+                        unique_fields=['game', 'image_type'],
+                        update_fields=['url', 'width', 'height'],
+                    )
+                    Game.refresh_primary_images({game_id for game_id, _ in images})
 
-            try:
-                price, created = await sync_to_async(Price.objects.update_or_create)(
-                    game=game,
-                    platform=platform,
-                    region=price_region,
-                    store=store,
-                    defaults={
-                        'base_price': item.get('price_base'),
-                        'current_price': item.get('price_current'),
-                        'last_updated': timezone.now(),
-                    }
+            self.write_prices(batch, game_ids, platform, stats)
+
+            fingerprints = {
+                (item['product_id'], item['region']): ProductFingerprint(
+                    product_id=item['product_id'],
+                    region=item['region'],
+                    digest=item['fingerprint'],
                 )
-            except Exception as e:
-                spider.logger.error(f"Failed to create/update price for {product_id}: {e}")
+                for item, _, _ in batch if item.get('fingerprint')
+            }
+            if fingerprints:
+                with self.metrics.timer('db_write_seconds', model='ProductFingerprint'):
+                    ProductFingerprint.objects.bulk_create(
+                        fingerprints.values(),
+                        update_conflicts=True,
+                        unique_fields=['product_id', 'region'],
+                        update_fields=['digest', 'updated_at'],
+                    )
+
+        merge_stats(self.stats, stats)
+
+    def write_prices(self, batch, game_ids, platform, stats):
+        """Bulk upsert the prices of a batch, one row per (game, platform, region, store). A price history
+        row is appended for every price that is new or whose base or current price changed, and a price drop
+        event for every current price lower than the one it overwrites. Counts go to the batch ``stats``."""
+        priced = [(item, region_code) for item, region_code, _ in batch if "price_base" in item and "region" in item]
+        if not priced:
+            return
+
+        known_prices = {
+            (game_id, region_id, store_id): (base_price, current_price)
+            for game_id, region_id, store_id, base_price, current_price in Price.objects.filter(
+                game_id__in=game_ids.values(),
+                platform=platform,
+            ).values_list('game_id', 'region_id', 'store_id', 'base_price', 'current_price')
+        }
+
+        now = timezone.now()
+        prices = {}
+        history = []
+        drops = []
+        for item, region_code in priced:
+            region = item['region']
+            price = Price(
+                game_id=game_ids[item['product_id']],
+                platform=platform,
+                region=self.dimensions.region(region_code),
+                store=self.dimensions.store(region, region_code, platform),
+                base_price=Decimal(str(item.get('price_base'))),
+                current_price=Decimal(str(item.get('price_current'))),
+                last_updated=now,
+            )
+            price.update_sale_status()
+
+            key = (price.game_id, price.region_id, price.store_id)
+            if key in known_prices:
+                stats[region]['prices']['upd'] += 1
             else:
-                if created:
-                    self.stats[region]['prices']['crt'] += 1
-                else:
-                    self.stats[region]['prices']['upd'] += 1
+                stats[region]['prices']['crt'] += 1
 
-        return item
+            observed = (price.base_price, price.current_price)
+            previous = known_prices.get(key)
+            if previous is not None and price.current_price < previous[1]:
+                stats[region]['drops'] += 1
+                drops.append(
+                    PriceDropEvent(
+                        game_id=price.game_id,
+                        region=price.region,
+                        previous_price=previous[1],
+                        current_price=price.current_price,
+                        detected_at=now,
+                    )
+                )
+            if previous != observed:
+                history.append(
+                    PriceHistory(
+                        game_id=price.game_id,
+                        platform=platform,
+                        region=price.region,
+                        store=price.store,
+                        base_price=price.base_price,
+                        current_price=price.current_price,
+                        discount_percentage=price.discount_percentage,
+                        observed_at=now,
+                    )
+                )
+            known_prices[key] = observed
+            prices[key] = price
+
+        with self.metrics.timer('db_write_seconds', model='Price'):
+            if prices:
+                Price.objects.bulk_create(
+                    prices.values(),
+                    update_conflicts=True,
+                    unique_fields=['game', 'platform', 'region', 'store'],
+                    update_fields=['base_price', 'current_price', 'discount_percentage', 'is_on_sale', 'last_updated'],
+                )
+            Game.refresh_deals({game_id for game_id, _, _ in prices})
+        if history:
+            with self.metrics.timer('db_write_seconds', model='PriceHistory'):
+                PriceHistory.objects.bulk_create(history)
+        if drops:
+            with self.metrics.timer('db_write_seconds', model='PriceDropEvent'):
+                PriceDropEvent.objects.bulk_create(drops)
 
     def close_spider(self, spider):
-        """Log a summary of statistics and close database connection after the spider finishes."""
+        """Flush the remaining buffer, log a summary of statistics, invalidate the site caches and close database
+        connection."""
+        return deferred_from_coro(self._close_spider(spider))
+
+    async def _close_spider(self, spider):
+        await self.flush(spider)
+
         for region, data in self.stats.items():
             spider.logger.info(
                 f'''
@@ -147,8 +462,20 @@ class DjangoModelPipeline:
                 Games updated: {data['games']['upd']}
                 Prices created: {data['prices']['crt']}
                 Prices updated: {data['prices']['upd']}
+                Price drops: {data['drops']}
                 Images: {data['images']}
                 ---------------------------------------
                 '''
             )
-        close_old_connections()
+
+        if self.stats:
+            await sync_to_async(refresh_catalog)()
+            await sync_to_async(bump_catalog_version)()
+            # Unmatched events stay queued for the next crawl
+            try:
+                notifications = await sync_to_async(match_price_drops)()
+            except Exception as e:
+                spider.logger.error(f"Failed to match price drops: {e}")
+            else:
+                spider.logger.info(f'Queued {notifications} price drop notifications')
+        await sync_to_async(close_old_connections)()
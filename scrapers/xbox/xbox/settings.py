@@ -15,16 +15,44 @@ SPIDER_MODULES = ["xbox.spiders"]
 NEWSPIDER_MODULE = "xbox.spiders"
 
 ITEM_PIPELINES = {
+    "xbox.pipelines.FingerprintPipeline": 200,
     "xbox.pipelines.DjangoModelPipeline": 300,
 }
 
+DOWNLOADER_MIDDLEWARES = {
+    "xbox.middlewares.ReplayMiddleware": 50,
+}
+
+SPIDER_MIDDLEWARES = {
+    "xbox.metrics.ParseTimingMiddleware": 950,
+}
+
+EXTENSIONS = {
+    "xbox.metrics.CrawlMetricsExtension": 500,
+}
+
+# Crawl metrics (see xbox.metrics), written to the stats and these files every METRICS_INTERVAL seconds
+METRICS_ENABLED = True
+METRICS_INTERVAL = 15
+METRICS_PROMETHEUS_FILE = "metrics/xbox.prom"
+METRICS_JSON_FILE = "metrics/xbox.json"
+
+# Record responses to, or replay a crawl from, a zip archive: 'record', 'replay' or None (see ReplayMiddleware)
+XBOX_REPLAY_MODE = None
+XBOX_REPLAY_ARCHIVE = "replay.zip"
+
+# Batched database writes
+DJANGO_PIPELINE_BATCH_SIZE = 500
+DJANGO_PIPELINE_FLUSH_INTERVAL = 30
+
 ADDONS = {}
 
 # Obey robots.txt rules
 ROBOTSTXT_OBEY = True
 
-# Request pacing
-CONCURRENT_REQUESTS = 4
+# Request pacing. Every region has its own download slot (see GameSpider.download_slot), so the per-domain
+# limits, DOWNLOAD_DELAY and autothrottle apply to each region and CONCURRENT_REQUESTS caps the whole crawl.
+CONCURRENT_REQUESTS = 16
 CONCURRENT_REQUESTS_PER_DOMAIN = 2
 DOWNLOAD_DELAY = 2.5
 RANDOMIZE_DOWNLOAD_DELAY = True
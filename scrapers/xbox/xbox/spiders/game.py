@@ -5,24 +5,67 @@ import scrapy
 
 from ..items import XboxItem
 
+PRELOADED_STATE_MARKER = b'window.__PRELOADED_STATE__'
+
+_json_decoder = json.JSONDecoder()
+
+
+def extract_preloaded_state(body, encoding='utf-8'):
+    """
+    Extract the ``window.__PRELOADED_STATE__`` object from a browse page.
+
+    The assignment marker is searched in the raw body, then only the script that follows it is decoded
+    and exactly one JSON object is consumed with ``json.JSONDecoder.raw_decode``. Unlike a non-greedy
+    regex, this does not stop at a ``};`` inside a string and does not need the whole page as text.
+
+    :param body: Raw response body.
+    :param encoding: Encoding of the body. Defaults to utf-8.
+    :return: The decoded state, or None if the page has no preloaded state.
+    :raises json.JSONDecodeError: If the preloaded state is not valid JSON.
+    """
+    marker = body.find(PRELOADED_STATE_MARKER)
+    if marker == -1:
+        return None
+
+    start = body.find(b'=', marker + len(PRELOADED_STATE_MARKER))
+    if start == -1:
+        return None
+    end = body.find(b'</script>', start)
+    if end == -1:
+        end = len(body)
+
+    script = str(memoryview(body)[start + 1:end], encoding)
+    state, _ = _json_decoder.raw_decode(script, json.decoder.WHITESPACE.match(script).end())
+    return state
+
 
 class GameSpider(scrapy.Spider):
-    """Scrapes games from Xbox Store across multiple regions, handling pagination via API."""
+    """Scrapes games from Xbox Store across multiple regions, handling pagination via API.
+
+    Each region is an independent pagination chain with its own download slot, so regions are crawled in
+    parallel with separate concurrency and autothrottle state."""
     name = "game"
     allowed_domains = ["www.xbox.com", "xboxservices.com"]
     regions = ["en-US", "tr-TR"]
 
-    def __init__(self, max_pages=3, *args, **kwargs):
+    def __init__(self, max_pages=3, incremental=False, regions=None, *args, **kwargs):
         """
         Initializes the GameSpider.
 
         :param max_pages: Maximum number of pages to scrap. Defaults to 3.
+        :param incremental: Skip items whose content did not change since the last crawl. Defaults to False.
+        :param regions: Store locales to crawl, as a list or a comma-separated string. Defaults to en-US and tr-TR.
         :param args: Variable length argument list.
         :param kwargs: Arbitrary keyword arguments.
         """
         super(GameSpider, self).__init__(*args, **kwargs)
 
         self.max_pages = int(max_pages)
+        self.incremental = incremental in (True, 'true', 'True', '1', 1)
+        if isinstance(regions, str):
+            regions = [region.strip() for region in regions.split(',') if region.strip()]
+        if regions:
+            self.regions = list(regions)
         self.pages_scraped = {region: 0 for region in self.regions}
 
         self.base_api_url = "https://emerald.xboxservices.com/xboxcomfd/browse?locale="
@@ -37,9 +80,20 @@ class GameSpider(scrapy.Spider):
             yield scrapy.Request(
                 url=f"https://www.xbox.com/{region}/games/browse?orderby=Title+Asc&PlayWith=XboxSeriesX%7CS%2CXboxOne",
                 callback=self.parse,
-                meta={"region": region},
+                meta={"region": region, "download_slot": self.download_slot(region)},
             )
 
+    @staticmethod
+    def download_slot(region):
+        """
+        Return the downloader slot of a region. Requests of a region share one slot, so the pacing settings
+        and autothrottle apply per region instead of per domain.
+
+        :param region: The region code for the request.
+        :return: Slot name.
+        """
+        return f"xbox-{region}"
+
     def parse(self, response):
         """
         Parse the initial HTML response, extract game data, and yields items or next page requests.
@@ -60,9 +114,12 @@ class GameSpider(scrapy.Spider):
             else:
                 region = "en-US"
 
-        script_pattern = r'window\.__PRELOADED_STATE__ = ({.*?});'
-        match = re.search(script_pattern, response.text, re.DOTALL)
-        if not match:
+        try:
+            preloaded_data = extract_preloaded_state(response.body, response.encoding)
+        except (json.decoder.JSONDecodeError, UnicodeDecodeError) as e:
+            self.logger.error(f"Error decoding preloaded state: {e}")
+            return
+        if preloaded_data is None:
             self.logger.warning(f"Could not find preloaded state for region {region}")
             return
 
@@ -73,12 +130,6 @@ class GameSpider(scrapy.Spider):
         else:
             self.logger.info(f"Processing page {self.pages_scraped[region]}/{self.max_pages} for region {region}")
 
-        try:
-            preloaded_data = json.loads(match.group(1))
-        except json.decoder.JSONDecodeError as e:
-            self.logger.error(f"Error decoding preloaded state: {e}")
-            return
-
         products = preloaded_data.get('core2', {}).get('products', {}).get('productSummaries', {})
         channel_data = preloaded_data.get('core2', {}).get('channels', {}).get('channelData', {})
 
@@ -121,7 +172,7 @@ class GameSpider(scrapy.Spider):
             headers={'MS-CV': ms_cv},
             body=json.dumps(body),
             callback=self.parse_api_response,
-            meta={'region': region},
+            meta={'region': region, 'download_slot': self.download_slot(region)},
         )
 
     def parse_api_response(self, response):
@@ -0,0 +1,77 @@
+"""Builders for Xbox Store browse pages and browse API responses, shared by the tests and benchmarks."""
+import json
+
+CHANNEL_KEY = 'BROWSE_CHANNELID=_FILTERS=ORDERBY=TITLE ASC&PLAYWITH=XBOXONE,XBOXSERIESX|S'
+
+BROWSE_URL = 'https://www.xbox.com/{region}/games/browse?orderby=Title+Asc&PlayWith=XboxSeriesX%7CS%2CXboxOne'
+
+
+def product_summary(product_id, title=None, release_date='2024-11-25T05:00:00.0000000Z', list_price=89.99,
+                    msrp=89.99, **fields):
+    """
+    A ``productSummaries`` entry. Text fields default to values derived from the product id, e.g.
+    "Game 1", "Desc 1", "Dev 1".
+
+    :param fields: Extra or overridden keys of the summary.
+    """
+    summary = {
+        'description': f'Desc {product_id}',
+        'developerName': f'Dev {product_id}',
+        'images': {
+            'boxArt': {'url': f'game/{product_id}/boxArt', 'width': 2160, 'height': 2160},
+        },
+        'productId': product_id,
+        'publisherName': f'Pub {product_id}',
+        'releaseDate': release_date,
+        'shortDescription': f'Short desc {product_id}',
+        'specificPrices': {
+            'purchaseable': [
+                {'listPrice': list_price, 'msrp': msrp},
+            ],
+        },
+        'title': title or f'Game {product_id}',
+    }
+    summary.update(fields)
+    return summary
+
+
+def browse_page(summaries, encoded_ct=None):
+    """HTML of a browse page whose preloaded state lists ``summaries``, continued by ``encoded_ct``."""
+    state = {
+        'core2': {
+            'channels': {
+                'channelData': {
+                    CHANNEL_KEY: {
+                        'data': {
+                            'products': [{'productId': summary['productId']} for summary in summaries],
+                            'encodedCT': encoded_ct,
+                        },
+                    },
+                },
+            },
+            'products': {
+                'productSummaries': {summary['productId']: summary for summary in summaries},
+            },
+        },
+    }
+    return f"""
+<html>
+<head>
+    <script>
+    window.__PRELOADED_STATE__ = {json.dumps(state, indent=4)};
+    </script>
+</head>
+<body>
+</body>
+</html>
+"""
+
+
+def api_page(summaries, encoded_ct=None):
+    """Body of a browse API response listing ``summaries``, continued by ``encoded_ct``."""
+    return json.dumps({
+        'productSummaries': summaries,
+        'channels': {
+            CHANNEL_KEY: {'encodedCT': encoded_ct},
+        },
+    })
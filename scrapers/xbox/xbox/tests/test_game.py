@@ -1,3 +1,4 @@
+import asyncio
 import json
 import unittest
 from unittest.mock import Mock
@@ -6,79 +7,19 @@ from scrapy import Request
 from scrapy.http import HtmlResponse
 
 from ..items import XboxItem
-from ..spiders.game import GameSpider
+from ..spiders.game import GameSpider, extract_preloaded_state
+from .fixtures import BROWSE_URL, api_page, browse_page, product_summary
 
 
 class GameSpiderTest(unittest.TestCase):
     def setUp(self):
         self.spider = GameSpider()
-        self.example_html = """
-    <html>
-<head>
-    <script>
-    window.__PRELOADED_STATE__ = {
-        "core2": {
-            "channels": {
-                "channelData": {
-                    "BROWSE_CHANNELID=_FILTERS=ORDERBY=TITLE ASC&PLAYWITH=XBOXONE,XBOXSERIESX|S": {
-                        "data": {
-                            "products": [
-                                {"productId": "1"},
-                                {"productId": "2"}
-                            ],
-                            "encodedCT": "TOKEN1"
-                        }
-                    }
-                }
-            },
-            "products": {
-                "productSummaries": {
-                    "1": {
-                        "description": "Desc 1",
-                        "developerName": "Dev 1",
-                        "images": {
-                            "boxArt": {"url": "game/1/boxArt", "width": 2160, "height": 2160}
-                        },
-                        "productId": "1",
-                        "publisherName": "Pub 1",
-                        "releaseDate": "2024-11-25T05:00:00.0000000Z",
-                        "shortDescription": "Short desc 1",
-                        "specificPrices": {
-                            "purchaseable": [
-                                {"listPrice": 89.99, "msrp": 89.99}
-                            ]
-                        },
-                        "title": "Game 1"
-                    },
-                    "2": {
-                        "description": "Desc 2",
-                        "developerName": "Dev 2",
-                        "images": {
-                            "boxArt": {"url": "game/2/boxArt", "width": 2160, "height": 2160}
-                        },
-                        "productId": "2",
-                        "publisherName": "Pub 2",
-                        "releaseDate": "2020-07-16T00:00:00.0000000Z",
-                        "shortDescription": "Short desc 2",
-                        "specificPrices": {
-                            "purchaseable": [
-                                {"listPrice": 60, "msrp": 80}
-                            ]
-                        },
-                        "title": "Game 2"
-                    }
-                }
-            }
-        }
-    };
-</script>
-</head>
-<body>
-</body>
-</html>
-        """
+        self.example_html = browse_page([
+            product_summary('1', release_date='2024-11-25T05:00:00.0000000Z', list_price=89.99, msrp=89.99),
+            product_summary('2', release_date='2020-07-16T00:00:00.0000000Z', list_price=60, msrp=80),
+        ], encoded_ct='TOKEN1')
         self.response = HtmlResponse(
-            url="https://www.xbox.com/en-US/games/browse?orderby=Title+Asc&PlayWith=XboxSeriesX%7CS%2CXboxOne",
+            url=BROWSE_URL.format(region='en-US'),
             body=self.example_html,
             encoding="utf-8",
         )
@@ -248,18 +189,8 @@ class GameSpiderTest(unittest.TestCase):
         """Test that pagination stops when max_pages limit is reached."""
         spider = GameSpider(max_pages=1)
         spider.pages_scraped['en-US'] = 1  # Max
-        api_response_body = {
-            'productSummaries': [],
-            'channels': {
-                'BROWSE_CHANNELID=_FILTERS=ORDERBY=TITLE ASC&PLAYWITH=XBOXONE,XBOXSERIESX|S':
-                    {
-                        'encodedCT': 'next_ct'
-                    }
-            }
-        }
-
         response = Mock()
-        response.text = json.dumps(api_response_body)
+        response.text = api_page([], encoded_ct='next_ct')
         response.meta = {'region': 'en-US'}
 
         results = list(spider.parse_api_response(response))
@@ -267,6 +198,50 @@ class GameSpiderTest(unittest.TestCase):
         api_requests = [r for r in results if isinstance(r, Request)]
         self.assertEqual(len(api_requests), 0)
 
+    def test_incremental_argument(self):
+        """Test that the incremental flag accepts command line strings and defaults to off."""
+        self.assertFalse(self.spider.incremental)
+        self.assertTrue(GameSpider(incremental='true').incremental)
+        self.assertFalse(GameSpider(incremental='false').incremental)
+
+    def test_extract_preloaded_state_ignores_terminator_inside_strings(self):
+        """Test that the extractor consumes the whole object when a string contains '};'."""
+        body = (
+            '<script>window.__PRELOADED_STATE__ = {"a": {"text": "ends with };"}, "b": 2};'
+            'window.other = {};</script>'
+        ).encode('utf-8')
+
+        state = extract_preloaded_state(body)
+
+        self.assertEqual(state, {'a': {'text': 'ends with };'}, 'b': 2})
+
+    def test_extract_preloaded_state_without_marker(self):
+        """Test that the extractor returns None when the page has no preloaded state."""
+        self.assertIsNone(extract_preloaded_state(b'<html><script>window.other = {};</script></html>'))
+
+    def test_extract_preloaded_state_decodes_page_encoding(self):
+        """Test that non-ASCII titles are decoded with the response encoding."""
+        body = '<script>window.__PRELOADED_STATE__ = {"title": "Pokémon"};</script>'.encode('latin-1')
+
+        self.assertEqual(extract_preloaded_state(body, 'latin-1'), {'title': 'Pokémon'})
+
+    def test_regions_argument(self):
+        """Test that regions can be passed as a list or a comma-separated string."""
+        self.assertEqual(GameSpider(regions='en-US, de-DE').regions, ['en-US', 'de-DE'])
+        self.assertEqual(GameSpider(regions=['ja-JP']).pages_scraped, {'ja-JP': 0})
+        self.assertEqual(self.spider.regions, ['en-US', 'tr-TR'])
+
+    def test_requests_use_region_download_slot(self):
+        """Test that every region gets its own download slot for start and pagination requests."""
+        async def collect():
+            return [request async for request in GameSpider(regions='en-US,tr-TR').start()]
+
+        start_requests = asyncio.run(collect())
+        self.assertEqual([r.meta['download_slot'] for r in start_requests], ['xbox-en-US', 'xbox-tr-TR'])
+
+        request = self.spider.create_api_request('ct', 'tr-TR')
+        self.assertEqual(request.meta['download_slot'], 'xbox-tr-TR')
+
 
 if __name__ == '__main__':
     unittest.main()
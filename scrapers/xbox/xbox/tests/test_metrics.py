@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from scrapy import Request
+from scrapy.http import TextResponse
+from scrapy.statscollectors import StatsCollector
+
+from ..metrics import (
+    NULL_METRICS, CrawlMetrics, CrawlMetricsExtension, Histogram, ParseTimingMiddleware, crawler_metrics, endpoint,
+)
+from ..spiders.game import GameSpider
+
+
+class HistogramTest(unittest.TestCase):
+    def test_quantiles_and_buckets(self):
+        histogram = Histogram(buckets=(0.1, 1, 10))
+        for value in [0.05] * 50 + [0.5] * 49 + [20]:
+            histogram.observe(value)
+
+        self.assertEqual(histogram.count, 100)
+        self.assertEqual(histogram.quantile(0.5), 0.1)
+        self.assertEqual(histogram.quantile(0.99), 1)
+        self.assertEqual(histogram.quantile(1), 20)
+        self.assertEqual(histogram.cumulative(), [(0.1, 50), (1, 99), (10, 99), ('+Inf', 100)])
+
+    def test_empty(self):
+        self.assertEqual(Histogram().summary()['p99'], 0.0)
+
+
+class CrawlMetricsTest(unittest.TestCase):
+    def test_endpoint_masks_locale(self):
+        self.assertEqual(endpoint('https://www.xbox.com/tr-TR/games/browse?x=1'), 'www.xbox.com/{locale}/games/browse')
+        self.assertEqual(
+            endpoint('https://emerald.xboxservices.com/xboxcomfd/browse?locale=en-US'),
+            'emerald.xboxservices.com/xboxcomfd/browse',
+        )
+
+    def test_prometheus_format(self):
+        metrics = CrawlMetrics()
+        with metrics.timer('db_write_seconds', model='Price'):
+            pass
+        metrics.set_gauge('scheduler_queue_depth', 3)
+
+        text = metrics.to_prometheus()
+        self.assertIn('# TYPE xbox_db_write_seconds histogram', text)
+        self.assertIn('xbox_db_write_seconds_bucket{model="Price",le="+Inf"} 1', text)
+        self.assertIn('xbox_db_write_seconds_count{model="Price"} 1', text)
+        self.assertIn('# TYPE xbox_scheduler_queue_depth gauge\nxbox_scheduler_queue_depth 3', text)
+
+    def test_null_metrics_without_extension(self):
+        self.assertIs(crawler_metrics(Mock(spec=[])), NULL_METRICS)
+        with NULL_METRICS.timer('anything'):
+            NULL_METRICS.observe('anything', 1)
+
+
+class ParseTimingMiddlewareTest(unittest.TestCase):
+    def test_times_callback_and_counts_items(self):
+        metrics = CrawlMetrics()
+        middleware = ParseTimingMiddleware(metrics)
+        spider = GameSpider()
+        request = Request('https://www.xbox.com/en-US/games/browse', callback=spider.parse)
+        response = TextResponse(url=request.url, body=b'', request=request)
+
+        results = list(middleware.process_spider_output(response, iter([{'a': 1}, {'b': 2}, Request('https://x')]), spider))
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual(metrics.histograms[('parse_seconds', (('callback', 'parse'),))].count, 1)
+        self.assertEqual(metrics.gauges[('items_in_flight', ())], 2)
+
+
+class CrawlMetricsExtensionTest(unittest.TestCase):
+    def test_write_sinks_and_stats(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        crawler = Mock(engine=None, stats=StatsCollector(Mock()))
+        extension = CrawlMetricsExtension(
+            crawler,
+            prometheus_file=os.path.join(directory.name, 'out', 'xbox.prom'),
+            json_file=os.path.join(directory.name, 'out', 'xbox.json'),
+        )
+        request = Request('https://www.xbox.com/en-US/games/browse', meta={'download_latency': 0.2})
+        extension.response_received(None, request, None)
+
+        extension.write()
+
+        with open(os.path.join(directory.name, 'out', 'xbox.prom')) as file:
+            self.assertIn('xbox_download_latency_seconds_count{endpoint="www.xbox.com/{locale}/games/browse"} 1', file.read())
+        with open(os.path.join(directory.name, 'out', 'xbox.json')) as file:
+            self.assertEqual(json.load(file)['histograms'][0]['p50'], 0.2)
+        self.assertEqual(
+            crawler.stats.get_value('metrics/download_latency_seconds/www.xbox.com/{locale}/games/browse/count'), 1
+        )
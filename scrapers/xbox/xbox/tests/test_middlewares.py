@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+import unittest
+
+from scrapy import Request
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import HtmlResponse, TextResponse
+from scrapy.settings import Settings
+
+from ..middlewares import ReplayMiddleware, configure_replay, replay_key
+from ..spiders.game import GameSpider
+
+
+class ReplayMiddlewareTest(unittest.TestCase):
+    def setUp(self):
+        self.spider = GameSpider()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.archive = os.path.join(directory.name, 'replay.zip')
+
+    def record(self, responses):
+        recorder = ReplayMiddleware('record', self.archive)
+        for response in responses:
+            self.assertIs(recorder.process_response(response.request, response, self.spider), response)
+        recorder.spider_closed(self.spider)
+
+    def test_record_and_replay(self):
+        """Recorded pages and API responses are replayed with their URL, status, headers and body."""
+        page_request = Request('https://www.xbox.com/en-US/games/browse')
+        page = HtmlResponse(
+            url=page_request.url,
+            body='<html>ü</html>'.encode('utf-8'),
+            headers={'Content-Type': 'text/html; charset=utf-8'},
+            request=page_request,
+        )
+        api_request = self.spider.create_api_request('TOKEN1', 'en-US')
+        api = TextResponse(
+            url=api_request.url,
+            body=b'{"productSummaries": []}',
+            headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip'},
+            request=api_request,
+        )
+        self.record([page, api])
+
+        player = ReplayMiddleware('replay', self.archive)
+        replayed_page = player.process_request(page.request, self.spider)
+        self.assertIsInstance(replayed_page, HtmlResponse)
+        self.assertEqual(replayed_page.text, '<html>ü</html>')
+        self.assertEqual(replayed_page.status, 200)
+
+        # A new request for the same token has another MS-CV header but the same key
+        replayed_api = player.process_request(self.spider.create_api_request('TOKEN1', 'en-US'), self.spider)
+        self.assertEqual(json.loads(replayed_api.text), {'productSummaries': []})
+        self.assertNotIn(b'Content-Encoding', replayed_api.headers)
+        self.assertIn('replay', replayed_api.flags)
+
+        with self.assertRaises(IgnoreRequest):
+            player.process_request(self.spider.create_api_request('TOKEN2', 'en-US'), self.spider)
+
+    def test_key_depends_on_continuation_token(self):
+        first = self.spider.create_api_request('TOKEN1', 'en-US')
+        again = self.spider.create_api_request('TOKEN1', 'en-US')
+        other = self.spider.create_api_request('TOKEN2', 'en-US')
+        self.assertNotEqual(first.headers['MS-CV'], again.headers['MS-CV'])
+        self.assertEqual(replay_key(first), replay_key(again))
+        self.assertNotEqual(replay_key(first), replay_key(other))
+
+    def test_recording_appends_to_archive(self):
+        request = self.spider.create_api_request('TOKEN1', 'en-US')
+        self.record([TextResponse(url=request.url, body=b'{}', request=request)])
+        request = self.spider.create_api_request('TOKEN2', 'en-US')
+        self.record([TextResponse(url=request.url, body=b'{}', request=request)])
+
+        self.assertEqual(len(ReplayMiddleware('replay', self.archive).keys), 2)
+
+    def test_configure_replay_disables_pacing(self):
+        settings = Settings({'DOWNLOAD_DELAY': 2.5, 'AUTOTHROTTLE_ENABLED': True, 'ROBOTSTXT_OBEY': True})
+        configure_replay(settings, 'replay', self.archive)
+
+        self.assertEqual(settings.get('XBOX_REPLAY_MODE'), 'replay')
+        self.assertEqual(settings.getfloat('DOWNLOAD_DELAY'), 0)
+        self.assertFalse(settings.getbool('AUTOTHROTTLE_ENABLED'))
+        self.assertFalse(settings.getbool('ROBOTSTXT_OBEY'))
@@ -5,19 +5,44 @@ from pathlib import Path
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.project import get_project_settings
 
+from apps.games.models import Region
 from scrapers.base import BaseScraper
+from scrapers.xbox.xbox.middlewares import configure_replay
 from scrapers.xbox.xbox.spiders.game import GameSpider
 
 
 class XboxGamesScraper(BaseScraper):
     """Scraper wrapper for Xbox games using GameSider"""
 
-    def run(self, max_pages=3, **kwargs):
+    def run(self, max_pages=3, incremental=False, regions=None, record=None, replay=None, **kwargs):
+        """
+        Crawl the Xbox Store.
+
+        :param max_pages: Maximum number of pages to scrape per region.
+        :param incremental: Skip products that did not change since the last crawl.
+        :param regions: Store locales to crawl. Defaults to all regions in the database.
+        :param record: Path of a zip archive to record the responses to.
+        :param replay: Path of a zip archive recorded earlier to replay the crawl from, without network access.
+        """
+        if not regions:
+            regions = self.default_regions()
+
         xbox_scraper_path = str(Path(__file__).parent.parent.absolute())
         if xbox_scraper_path not in sys.path:
             sys.path.append(xbox_scraper_path)
         os.environ['SCRAPY_SETTINGS_MODULE'] = 'xbox.settings'
 
-        process = CrawlerProcess(get_project_settings())
-        process.crawl(GameSpider, max_pages=max_pages)
-        process.start()
\ No newline at end of file
+        settings = get_project_settings()
+        if record:
+            configure_replay(settings, 'record', record)
+        elif replay:
+            configure_replay(settings, 'replay', replay)
+
+        process = CrawlerProcess(settings)
+        process.crawl(GameSpider, max_pages=max_pages, incremental=incremental, regions=regions)
+        process.start()
+
+    @staticmethod
+    def default_regions():
+        """Store locales of all regions in the database, or None to use the spider defaults."""
+        return list(Region.objects.exclude(locale='').order_by('code').values_list('locale', flat=True)) or None